@@ -0,0 +1,159 @@
+import asyncio
+import math
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# What a read found in the cache
+HIT = "hit"          # Fresh: serve it
+REFRESH = "refresh"  # Serve it, and reload it in the background (XFetch said "early", or it is stale)
+MISS = "miss"        # Nothing usable: the caller has to wait for a load
+
+
+class _CacheAside:
+    """
+    The cache policy both loaders share. An entry is (value, delta, fresh_until):
+    delta is how long the last load took. Redis keeps the key for
+    ttl + stale_ttl seconds:
+
+        |<---------- ttl: fresh ---------->|<-- stale_ttl: stale -->| gone
+                   XFetch may refresh early ^   served, refreshed    ^ miss
+
+    XFetch (Vattani et al., "Optimal Probabilistic Cache Stampede
+    Prevention"): a read at `now` refreshes early if
+
+        now - delta * beta * ln(random()) >= fresh_until
+
+    -ln(random()) is exponential, so the chance rises smoothly as expiry
+    nears, and sooner for values that are slow to load (large delta). Under
+    load, ONE early reader refreshes the key before it ever expires.
+    """
+
+    def __init__(self, redis, load, ttl, stale_ttl=0.0, beta=1.0, prefix="cache"):
+        self.redis = redis
+        self.load = load
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.beta = beta  # > 1 refreshes earlier, 0 turns XFetch off
+        self.prefix = prefix
+        self.stats = {"hits": 0, "stale_hits": 0, "early_refreshes": 0, "misses": 0,
+                      "loads": 0, "coalesced": 0, "load_errors": 0}
+
+    def _check(self, key, now):
+        """(HIT / REFRESH / MISS, value)"""
+        entry = self.redis.get(f"{self.prefix}:{key}")
+        if entry is None:
+            self.stats["misses"] += 1
+            return MISS, None
+        value, delta, fresh_until = entry
+        if now >= fresh_until:
+            self.stats["stale_hits"] += 1
+            return REFRESH, value
+        if self.beta and now - delta * self.beta * math.log(1.0 - random.random()) >= fresh_until:
+            self.stats["early_refreshes"] += 1
+            return REFRESH, value
+        self.stats["hits"] += 1
+        return HIT, value
+
+    def _store(self, key, value, delta):
+        fresh_until = time.time() + self.ttl
+        self.redis.set(f"{self.prefix}:{key}", (value, delta, fresh_until), ex=self.ttl + self.stale_ttl)
+
+
+class CacheLoader(_CacheAside):
+    """
+    Cache-aside for threads. Concurrent misses on one key are coalesced
+    ("single flight"): the first thread loads, the others wait on its Future
+    and get the same value (or exception). Refreshes run on a small pool
+    while readers keep getting the current value.
+    """
+
+    def __init__(self, redis, load, ttl, stale_ttl=0.0, beta=1.0, prefix="cache", refresh_workers=4):
+        super().__init__(redis, load, ttl, stale_ttl, beta, prefix)
+        self._lock = threading.Lock()  # Guards _inflight, and MockRedis, which is not thread-safe
+        self._inflight = {}            # key -> Future of its running load
+        self._refresher = ThreadPoolExecutor(refresh_workers, thread_name_prefix="cache-refresh")
+
+    def get(self, key):
+        with self._lock:
+            state, value = self._check(key, time.time())
+            if state == HIT:
+                return value
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            elif state == MISS:
+                self.stats["coalesced"] += 1
+        if state == REFRESH:
+            if leader:
+                self._refresher.submit(self._run_load, key, future)
+            return value
+        if leader:
+            self._run_load(key, future)
+        return future.result()
+
+    def _run_load(self, key, future):
+        start = time.perf_counter()
+        try:
+            value = self.load(key)
+        except BaseException as e:
+            with self._lock:
+                self.stats["load_errors"] += 1
+                del self._inflight[key]
+            future.set_exception(e)  # Waiters see the error; a stale value, if any, stays cached
+            return
+        with self._lock:
+            self.stats["loads"] += 1
+            self._store(key, value, time.perf_counter() - start)
+            del self._inflight[key]
+        future.set_result(value)
+
+    def close(self):
+        self._refresher.shutdown(wait=True)
+
+
+class AsyncCacheLoader(_CacheAside):
+    """
+    The same for asyncio: `load` is a coroutine function, each load is one
+    Task, and coalesced readers await that Task. No locks: MockRedis calls
+    never yield, so each check-then-act runs uninterrupted.
+    """
+
+    def __init__(self, redis, load, ttl, stale_ttl=0.0, beta=1.0, prefix="cache"):
+        super().__init__(redis, load, ttl, stale_ttl, beta, prefix)
+        self._inflight = {}  # key -> Task of its running load
+
+    async def get(self, key):
+        state, value = self._check(key, time.time())
+        if state == HIT:
+            return value
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.create_task(self._run_load(key))
+            task.add_done_callback(_retrieve)
+        elif state == MISS:
+            self.stats["coalesced"] += 1
+        if state == REFRESH:
+            return value
+        return await asyncio.shield(task)  # One waiter being cancelled must not cancel everyone's load
+
+    async def _run_load(self, key):
+        start = time.perf_counter()
+        try:
+            value = await self.load(key)
+        except BaseException:
+            self.stats["load_errors"] += 1
+            raise
+        finally:
+            del self._inflight[key]
+        self.stats["loads"] += 1
+        self._store(key, value, time.perf_counter() - start)
+        return value
+
+
+def _retrieve(task):
+    """A background refresh may fail with nobody awaiting it: mark its exception seen (the stale value stays)."""
+    if not task.cancelled():
+        task.exception()
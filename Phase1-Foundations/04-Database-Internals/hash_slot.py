@@ -0,0 +1,36 @@
+CLUSTER_SLOTS = 16384  # Redis Cluster's key space: slot = CRC16(key) mod 16384
+
+
+def _crc16_table():
+    table = []
+    for byte in range(256):
+        crc = byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021 if crc & 0x8000 else crc << 1) & 0xFFFF
+        table.append(crc)
+    return table
+
+
+CRC16_TABLE = _crc16_table()  # CRC16-CCITT (XMODEM), the variant Redis uses
+
+
+def crc16(data):
+    crc = 0
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFF) ^ CRC16_TABLE[(crc >> 8) ^ byte]
+    return crc
+
+
+def key_slot(key):
+    """
+    The slot a key lives in. If the key has a non-empty {hashtag}, only the
+    tag is hashed, so "{user:1}:cart" and "{user:1}:orders" always share a
+    slot (and a node), and multi-key commands on them keep working.
+    """
+    data = key if isinstance(key, bytes) else str(key).encode("utf-8", "surrogateescape")
+    start = data.find(b"{")
+    if start >= 0:
+        end = data.find(b"}", start + 1)
+        if end > start + 1:
+            data = data[start + 1:end]
+    return crc16(data) % CLUSTER_SLOTS
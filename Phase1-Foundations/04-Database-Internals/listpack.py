@@ -0,0 +1,225 @@
+import bisect
+import sys
+from array import array
+
+from redis_persistence import decode_value, encode_value
+
+# Redis's small-collection encodings. A few members do not need a dict and a
+# skiplist: one flat buffer, searched linearly, is faster to build and a
+# fraction of the memory. Every change rewrites the buffer, which is O(n), so
+# MockRedis converts a collection to the full structure past a size threshold.
+
+
+def _pack(values):
+    out = bytearray()
+    for value in values:
+        encode_value(value, out)
+    return bytes(out)  # bytes, not bytearray: no spare capacity
+
+
+def _unpack(data, count):
+    values = []
+    pos = 0
+    for _ in range(count):
+        value, pos = decode_value(data, pos)
+        values.append(value)
+    return values
+
+
+class _Listpack:
+    """(key, value) pairs flattened into one bytes object: k, v, k, v..."""
+    __slots__ = ("data", "length")
+    encoding = "listpack"
+
+    def __init__(self):
+        self.data = b""
+        self.length = 0
+
+    @property
+    def nbytes(self):
+        return sys.getsizeof(self) + sys.getsizeof(self.data)
+
+    def __len__(self):
+        return self.length
+
+    def items(self):
+        """[(key, value)] in stored order."""
+        flat = _unpack(self.data, 2 * self.length)
+        return list(zip(flat[::2], flat[1::2]))
+
+    def _find(self, key):
+        """key's value, or None: decodes pairs only until the match, like a listpack's linear scan."""
+        data = self.data
+        pos = 0
+        for _ in range(self.length):
+            k, pos = decode_value(data, pos)
+            value, pos = decode_value(data, pos)
+            if k == key:
+                return value
+        return None
+
+    def _store(self, pairs):
+        self.data = _pack(x for pair in pairs for x in pair)
+        self.length = len(pairs)
+
+
+class ListpackZSet(_Listpack):
+    """
+    A small zset: member, score, member, score... in (score, member) order,
+    packed into one bytes object. Same interface as SortedSet; every
+    operation decodes the buffer, so all of them are O(n).
+    """
+    __slots__ = ()
+
+    def __contains__(self, member):
+        return self._find(member) is not None
+
+    def score(self, member):
+        return self._find(member)
+
+    def add(self, member, score):
+        """Adds or re-scores member. Returns True if it is new."""
+        pairs = self.items()
+        for i, (m, old) in enumerate(pairs):
+            if m == member:
+                if old == score:
+                    return False
+                del pairs[i]
+                break
+        else:
+            old = None
+        bisect.insort(pairs, (member, score), key=lambda pair: (pair[1], pair[0]))
+        self._store(pairs)
+        return old is None
+
+    def remove(self, member):
+        """Returns True if member was there."""
+        pairs = self.items()
+        for i, (m, _) in enumerate(pairs):
+            if m == member:
+                del pairs[i]
+                self._store(pairs)
+                return True
+        return False
+
+    def rank(self, member, reverse=False):
+        for i, (m, _) in enumerate(self.items()):
+            if m == member:
+                return self.length - 1 - i if reverse else i
+        return None
+
+    def range_by_rank(self, start, stop, reverse=False):
+        """Like SortedSet.range_by_rank."""
+        pairs = self.items()
+        if reverse:
+            pairs.reverse()
+        n = len(pairs)
+        if start < 0:
+            start += n
+        if stop < 0:
+            stop += n
+        return pairs[max(start, 0):stop + 1] if stop >= 0 else []
+
+    def range_by_score(self, min_score, max_score, offset=0, count=None):
+        """Like SortedSet.range_by_score."""
+        found = [pair for pair in self.items() if min_score <= pair[1] <= max_score][offset:]
+        return found if count is None else found[:count]
+
+
+class ListpackHash(_Listpack):
+    """
+    A small hash: field, value, field, value... in insertion order, packed
+    into one bytes object. Dict-like (get, [], pop, in, len, items), so
+    MockRedis treats it and a real dict the same way.
+    """
+    __slots__ = ()
+
+    def __contains__(self, field):
+        return self._find(field) is not None
+
+    def get(self, field, default=None):
+        value = self._find(field)
+        return default if value is None else value
+
+    def set(self, field, value):
+        """fields[field] = value in one decode and one encode. Returns True if field is new."""
+        pairs = self.items()
+        for i, (f, _) in enumerate(pairs):
+            if f == field:
+                pairs[i] = (field, value)
+                new = False
+                break
+        else:
+            pairs.append((field, value))
+            new = True
+        self._store(pairs)
+        return new
+
+    def __setitem__(self, field, value):
+        self.set(field, value)
+
+    def pop(self, field, default=None):
+        pairs = self.items()
+        for i, (f, value) in enumerate(pairs):
+            if f == field:
+                del pairs[i]
+                self._store(pairs)
+                return value
+        return default
+
+
+INTSET_TYPECODES = ("h", "i", "q")  # int16, int32, int64: the narrowest that fits every member
+INTSET_LIMITS = {t: 2 ** (array(t).itemsize * 8 - 1) for t in INTSET_TYPECODES}
+
+
+def _fits(typecode, value):
+    limit = INTSET_LIMITS[typecode]
+    return -limit <= value < limit
+
+
+def intset_member(value):
+    """Whether value can live in an IntSet: an int (not bool) that fits in 64 bits."""
+    return type(value) is int and _fits("q", value)
+
+
+class IntSet:
+    """
+    A small set of integers: a sorted array, binary-searched. Starts with
+    2-byte slots and upgrades the whole array to 4 or 8 bytes the first
+    time a member needs it, like Redis's intset. Set-like (add, discard,
+    in, len, iteration).
+    """
+    __slots__ = ("members",)
+    encoding = "intset"
+
+    def __init__(self):
+        self.members = array("h")
+
+    @property
+    def nbytes(self):
+        return sys.getsizeof(self) + sys.getsizeof(self.members)
+
+    def __len__(self):
+        return len(self.members)
+
+    def __iter__(self):
+        return iter(self.members)
+
+    def __contains__(self, value):
+        if not intset_member(value):
+            return False
+        i = bisect.bisect_left(self.members, value)
+        return i < len(self.members) and self.members[i] == value
+
+    def add(self, value):
+        """value must satisfy intset_member."""
+        if not _fits(self.members.typecode, value):
+            typecode = next(t for t in INTSET_TYPECODES if _fits(t, value))
+            self.members = array(typecode, self.members)
+        i = bisect.bisect_left(self.members, value)
+        if i == len(self.members) or self.members[i] != value:
+            self.members.insert(i, value)
+
+    def discard(self, value):
+        if value in self:
+            del self.members[bisect.bisect_left(self.members, value)]
@@ -0,0 +1,143 @@
+import itertools
+import math
+import time
+
+CLOCK_RESOLUTION = 1e-6  # Unix times near 1.7e9 only carry ~0.2 us of precision; ignore differences below this
+
+
+class FixedWindowLimiter:
+    """
+    INCR a counter per client per window; EXPIRE it with the window.
+    O(1) state, but "limit per window" is not "limit per any `window`
+    seconds": a client can send `limit` at the end of one window and
+    `limit` more at the start of the next, 2x the limit in a blink.
+    """
+
+    def __init__(self, redis, limit, window, prefix="rl:fixed"):
+        self.redis = redis
+        self.limit = limit
+        self.window = window
+        self.prefix = prefix
+
+    def allow(self, client, now=None):
+        now = time.time() if now is None else now
+        key = f"{self.prefix}:{client}:{int(now // self.window)}"  # A new key per window: old ones just expire
+        count = self.redis.incr(key)
+        if count == 1:
+            self.redis.expire(key, self.window)
+        return count <= self.limit
+
+
+class SlidingWindowLogLimiter:
+    """
+    A sorted set per client of the times of its allowed requests: drop those
+    older than `window`, allow if fewer than `limit` are left. Exact, but
+    O(limit) state per client.
+    """
+
+    def __init__(self, redis, limit, window, prefix="rl:log"):
+        self.redis = redis
+        self.limit = limit
+        self.window = window
+        self.prefix = prefix
+        self._ids = itertools.count()  # Members must be unique even when timestamps collide
+
+    def allow(self, client, now=None):
+        now = time.time() if now is None else now
+        key = f"{self.prefix}:{client}"
+        self.redis.zremrangebyscore(key, -math.inf, now - self.window)
+        if self.redis.zcard(key) >= self.limit:
+            return False
+        self.redis.zadd(key, next(self._ids), now)
+        self.redis.expire(key, self.window)
+        return True
+
+
+class SlidingWindowCounterLimiter:
+    """
+    Two fixed-window counters, weighted: the previous window counts for the
+    share of it still inside the sliding window. O(1) state; assumes the
+    previous window's requests were spread evenly, so it is approximate.
+    """
+
+    def __init__(self, redis, limit, window, prefix="rl:counter"):
+        self.redis = redis
+        self.limit = limit
+        self.window = window
+        self.prefix = prefix
+
+    def allow(self, client, now=None):
+        now = time.time() if now is None else now
+        index, elapsed = divmod(now, self.window)
+        current = f"{self.prefix}:{client}:{int(index)}"
+        previous = self.redis.get(f"{self.prefix}:{client}:{int(index) - 1}") or 0
+        estimate = previous * (1 - elapsed / self.window) + (self.redis.get(current) or 0)
+        if estimate >= self.limit:
+            return False
+        if self.redis.incr(current) == 1:
+            self.redis.expire(current, 2 * self.window)  # Still needed as "previous" during the next window
+        return True
+
+
+class TokenBucketLimiter:
+    """
+    A bucket of `limit` tokens refilled at limit/window per second; a request
+    takes one. State: tokens left + when they were counted, refilled lazily
+    on the next request. The key expires once the bucket would be full
+    again, since a missing key means exactly that.
+    """
+
+    def __init__(self, redis, limit, window, prefix="rl:bucket"):
+        self.redis = redis
+        self.limit = limit
+        self.rate = limit / window
+        self.prefix = prefix
+
+    def allow(self, client, now=None):
+        now = time.time() if now is None else now
+        key = f"{self.prefix}:{client}"
+        state = self.redis.get(key)
+        tokens = self.limit
+        if state is not None:
+            left, counted_at = state.split()
+            tokens = min(self.limit, float(left) + (now - float(counted_at)) * self.rate)
+        if tokens < 1:
+            return False
+        tokens -= 1
+        self.redis.set(key, f"{tokens} {now}", ex=(self.limit - tokens) / self.rate)
+        return True
+
+
+class GCRALimiter:
+    """
+    Generic Cell Rate Algorithm: requests are due one every window/limit
+    seconds; the state is ONE number, the "theoretical arrival time" (TAT)
+    when the client will have caught up. A request is allowed if it does not
+    push the TAT more than `window` past now. Same behavior as the token
+    bucket (burst of `limit`, then limit/window per second) with half the
+    state and no refill arithmetic.
+    """
+
+    def __init__(self, redis, limit, window, prefix="rl:gcra"):
+        self.redis = redis
+        self.window = window
+        self.interval = window / limit  # Emission interval: one request's share of the window
+        self.prefix = prefix
+
+    def allow(self, client, now=None):
+        now = time.time() if now is None else now
+        key = f"{self.prefix}:{client}"
+        tat = max(self.redis.get(key) or now, now) + self.interval
+        if tat - now > self.window + CLOCK_RESOLUTION:
+            return False
+        self.redis.set(key, tat, ex=tat - now)  # Once TAT has passed, no state == the same state
+        return True
+
+
+LIMITERS = {
+    "fixed window": FixedWindowLimiter,
+    "sliding log": SlidingWindowLogLimiter,
+    "sliding counter": SlidingWindowCounterLimiter,
+    "token bucket": TokenBucketLimiter,
+    "gcra": GCRALimiter,
+}
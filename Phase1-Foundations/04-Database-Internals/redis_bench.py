@@ -0,0 +1,782 @@
+import argparse
+import asyncio
+import itertools
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from cache_loader import AsyncCacheLoader
+from rate_limiter import LIMITERS
+from redis_cluster import ClusterClient, start_cluster, stop_cluster
+from redis_demo import HZ, MAXMEMORY_POLICIES, MockRedis, OutOfMemoryError
+from redis_server import DEFAULT_PORT, RedisClient, positive_int
+
+# redis-benchmark style tests: the command each request sends (keys drawn from the keyspace)
+SERVER_TESTS = {
+    "ping": lambda key: ("PING",),
+    "set": lambda key: ("SET", f"key:{key}", "xxx"),
+    "get": lambda key: ("GET", f"key:{key}"),
+    "incr": lambda key: ("INCR", f"counter:{key}"),
+    "zadd": lambda key: ("ZADD", "myzset", str(key), f"element:{key}"),
+    "zrevrange": lambda key: ("ZREVRANGE", "myzset", "0", "9"),
+    "mset": lambda key: ("MSET", *itertools.chain.from_iterable((f"key:{key + i}", "xxx") for i in range(10))),
+    "mget": lambda key: ("MGET", *(f"key:{key + i}" for i in range(10))),
+}
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+
+def sort_on_read_zrevrange(members, start, end):
+    """The old MockRedis.zrevrange: sort the whole member dict on every call."""
+    sorted_items = sorted(members.items(), key=lambda x: x[1], reverse=True)
+    return sorted_items[start:end + 1]
+
+
+def bench_zset(num_members, reads, old_reads):
+    """Leaderboard ops on a num_members board: skiplist SortedSet vs the old dict + sort-on-read."""
+    scores = [random.randrange(10**9) for _ in range(num_members)]
+    players = [f"player:{i}" for i in range(num_members)]
+    probes = random.sample(players, min(reads, num_members))
+
+    # Old path: the dict makes writes cheap, but every ranked read sorts everything
+    members = {}
+    start = time.perf_counter()
+    for player, score in zip(players, scores):
+        members[player] = score
+    old_add = (time.perf_counter() - start) / num_members
+    start = time.perf_counter()
+    for _ in range(old_reads):
+        sort_on_read_zrevrange(members, 0, 9)
+    old_top10 = (time.perf_counter() - start) / old_reads
+    start = time.perf_counter()
+    for player in probes[:old_reads]:
+        [m for m, _ in sort_on_read_zrevrange(members, 0, len(members) - 1)].index(player)
+    old_rank = (time.perf_counter() - start) / old_reads
+
+    redis = MockRedis(hz=0)
+    start = time.perf_counter()
+    for player, score in zip(players, scores):
+        redis.zadd("board", player, score)
+    new_add = (time.perf_counter() - start) / num_members
+
+    def timed(op):
+        start = time.perf_counter()
+        for player in probes:
+            op(player)
+        return (time.perf_counter() - start) / len(probes)
+
+    return {
+        "old": {"zadd": old_add, "top10": old_top10, "rank": old_rank},
+        "new": {
+            "zadd": new_add,
+            "top10": timed(lambda p: redis.zrevrange("board", 0, 9)),
+            "rank": timed(lambda p: redis.zrevrank("board", p)),
+            "zincrby": timed(lambda p: redis.zincrby("board", p, 100)),
+            "rangebyscore": timed(lambda p: redis.zrangebyscore("board", 5 * 10**8, 10**9, count=10)),
+            "zrem": timed(lambda p: redis.zrem("board", p)),
+        },
+    }
+
+
+ENCODING_THRESHOLDS = ("zset_max_listpack_entries", "hash_max_listpack_entries", "set_max_intset_entries")
+ENCODING_WORKLOADS = {
+    # kind: (fill one key, read one key)
+    "zset": (lambda r, key: r.zadd(key, "alice", 310, "bob", 120, "carol", 250, "dave", 90, "erin", 180),
+             lambda r, key: r.zrevrange(key, 0, 2)),
+    # Per-key values, like real user records: constant strings would be shared by every key's dict
+    "hash": (lambda r, key: r.hset(key, "name", f"user {key[5:]}", "email", f"u{key[5:]}@example.com",
+                                   "visits", int(key[5:]) % 1000, "plan", "free", "country", "nl"),
+             lambda r, key: r.hget(key, "email")),
+    "set": (lambda r, key: r.sadd(key, 1001, 1002, 1003, 1004, 1005),
+            lambda r, key: r.sismember(key, 1003)),
+}
+
+
+def bench_encoding(kind, num_keys, compact, traced_keys):
+    """
+    num_keys small collections of one kind, in the compact encodings or (compact=False) always the full ones.
+    tracemalloc's own bookkeeping per allocation would not fit 10^6 skiplists in RAM, so the traced
+    bytes/key come from the first traced_keys of them (the cost per key does not depend on how many).
+    """
+    fill, read = ENCODING_WORKLOADS[kind]
+    keys = [f"{kind}:{i:09d}" for i in range(num_keys)]
+
+    def build():
+        redis = MockRedis(hz=0)
+        if not compact:
+            for name in ENCODING_THRESHOLDS:
+                setattr(redis, name, 0)
+        return redis
+
+    # Timed without tracemalloc, which slows every allocation down
+    redis = build()
+    start = time.perf_counter()
+    for key in keys:
+        fill(redis, key)
+    filled = time.perf_counter()
+    for key in keys:
+        read(redis, key)
+    done = time.perf_counter()
+    encoding = redis.object_encoding(keys[0])
+    used_memory = redis.used_memory
+    del redis
+
+    tracemalloc.start()
+    redis = build()
+    before = tracemalloc.get_traced_memory()[0]
+    for key in keys[:traced_keys]:
+        fill(redis, key)
+    traced = (tracemalloc.get_traced_memory()[0] - before) / min(num_keys, traced_keys)
+    tracemalloc.stop()
+    return {"encoding": encoding, "bytes_per_key": traced, "used_memory_per_key": used_memory / num_keys,
+            "writes_per_sec": num_keys / (filled - start), "reads_per_sec": num_keys / (done - filled)}
+
+
+def bench_expiry_memory(num_keys):
+    """Bytes per key for plain keys vs keys with a TTL (the expiry index's overhead)."""
+    result = {}
+    for name, ex in (("no ttl", None), ("ttl", 3600)):
+        tracemalloc.start()
+        redis = MockRedis(hz=0)
+        before = tracemalloc.get_traced_memory()[0]
+        for i in range(num_keys):
+            redis.set(f"session:{i:09d}", "x", ex=ex)
+        result[name] = (tracemalloc.get_traced_memory()[0] - before) / num_keys
+        tracemalloc.stop()
+        del redis
+    return result
+
+
+def bench_expiry(num_keys, hz, duration, ttl=1.0, volatile_ratio=0.9):
+    """
+    Loads num_keys (volatile_ratio of them with a TTL of about ttl seconds), waits
+    until those have expired, then reads ONLY the persistent keys for `duration`.
+    Lazy expiry never sees the expired keys again; only the active cycle frees them.
+    """
+    redis = MockRedis(hz=hz)
+    persistent = []
+    for i in range(num_keys):
+        key = f"session:{i:09d}"
+        if random.random() < volatile_ratio:
+            redis.set(key, "x", ex=ttl * random.uniform(0.5, 1.5))
+        else:
+            redis.set(key, "x")
+            persistent.append(key)
+    time.sleep(ttl * 1.5)
+    loaded = redis.dbsize()
+    base = dict(redis.stats)  # Cycles that already ran while loading don't count
+
+    samples = []
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        key = random.choice(persistent)
+        start = time.perf_counter()
+        redis.get(key)
+        samples.append(time.perf_counter() - start)
+    return {
+        "loaded": loaded,
+        "remaining": redis.dbsize(),
+        "expired_active": redis.stats["expired_keys_active"] - base["expired_keys_active"],
+        "cycles": redis.stats["expire_cycles"] - base["expire_cycles"],
+        "time_cap_reached": redis.stats["expire_time_cap_reached"] - base["expire_time_cap_reached"],
+        "cycle_cpu": (redis.stats["expire_cycle_seconds"] - base["expire_cycle_seconds"]) / duration,
+        "ops_per_sec": len(samples) / duration,
+        "latency_us": {p: percentile(samples, p) * 1e6 for p in (50, 99, 99.9, 100)},
+    }
+
+
+def bench_eviction(policy, keyspace, requests, cache_ratio, samples=5, zipf_s=1.0, phases=4):
+    """
+    A cache in front of a database: GET a Zipf-distributed key, SET it (1h TTL)
+    on a miss. maxmemory fits cache_ratio of the keyspace, so the policy decides
+    which keys survive; the hit rate says how well it guessed. The hot keys
+    change `phases` times, so a policy also has to forget.
+    """
+    value = "x" * 100
+    probe = MockRedis(hz=0)
+    probe.set(f"key:{keyspace}", value, ex=3600)
+    maxmemory = int(probe.used_memory * keyspace * cache_ratio)
+
+    redis = MockRedis(hz=0, maxmemory=maxmemory, maxmemory_policy=policy, maxmemory_samples=samples)
+    weights = list(itertools.accumulate(1 / (rank + 1) ** zipf_s for rank in range(keyspace)))
+    ids = list(range(keyspace))
+    workload = []
+    for _ in range(phases):
+        random.shuffle(ids)  # A new set of hot keys, unrelated to key names or the last phase
+        workload += random.choices(ids, cum_weights=weights, k=requests // phases)
+
+    refused = 0
+    samples_s = []
+    for i in workload:
+        key = f"key:{i}"
+        start = time.perf_counter()
+        if redis.get(key) is None:
+            try:
+                redis.set(key, value, ex=3600 * random.uniform(0.5, 1.5))
+            except OutOfMemoryError:
+                refused += 1
+        samples_s.append(time.perf_counter() - start)
+    info = redis.info()
+    return {
+        "hit_rate": info["hit_rate"],
+        "evicted": info["evicted_keys"],
+        "refused": refused,
+        "keys": info["keys"],
+        "used_mb": info["used_memory"] / 2**20,
+        "maxmemory_mb": maxmemory / 2**20,
+        "ops_per_sec": len(samples_s) / sum(samples_s),
+        "latency_us": {p: percentile(samples_s, p) * 1e6 for p in (50, 99, 99.9)},
+    }
+
+
+def bench_aof_writes(appendfsync, duration, value_size=100):
+    """SETs for `duration` seconds with the AOF off (None) or under one appendfsync policy."""
+    directory = tempfile.mkdtemp(prefix="redis_bench_")
+    try:
+        redis = MockRedis(hz=0, dir=directory, appendonly=appendfsync is not None,
+                          appendfsync=appendfsync or "no", save=())
+        value = "x" * value_size
+        samples = []
+        end = time.perf_counter() + duration
+        i = 0
+        while time.perf_counter() < end:
+            start = time.perf_counter()
+            redis.set(f"key:{i}", value)
+            samples.append(time.perf_counter() - start)
+            i += 1
+        aof = redis.aof.stats if redis.aof is not None else {"fsyncs": 0, "bytes": 0}
+        redis.close()
+        return {
+            "ops_per_sec": len(samples) / sum(samples),
+            "fsyncs": aof["fsyncs"],
+            "aof_mb": aof["bytes"] / 2**20,
+            "latency_us": {p: percentile(samples, p) * 1e6 for p in (50, 99, 99.9, 100)},
+        }
+    finally:
+        shutil.rmtree(directory)
+
+
+BATCH_MODES = ("per-key", "mset/mget", "pipeline")
+
+
+def bench_batching(mode, num_keys, batch, appendfsync=None, value_size=100):
+    """Writes then reads num_keys keys: one call per key, MSET/MGET of `batch` keys, or pipelines of `batch` SET/GETs."""
+    directory = tempfile.mkdtemp(prefix="redis_bench_") if appendfsync else None
+    try:
+        redis = MockRedis(hz=HZ, dir=directory, appendonly=appendfsync is not None, appendfsync=appendfsync or "no",
+                          save=())
+        keys = [f"key:{i}" for i in range(num_keys)]
+        value = "x" * value_size
+        chunks = [keys[i:i + batch] for i in range(0, num_keys, batch)]
+        start = time.perf_counter()
+        if mode == "per-key":
+            for key in keys:
+                redis.set(key, value)
+        elif mode == "mset/mget":
+            for chunk in chunks:
+                redis.mset(dict.fromkeys(chunk, value))
+        else:
+            for chunk in chunks:
+                pipe = redis.pipeline()
+                for key in chunk:
+                    pipe.set(key, value)
+                pipe.execute()
+        written = time.perf_counter()
+        if mode == "per-key":
+            for key in keys:
+                redis.get(key)
+        elif mode == "mset/mget":
+            for chunk in chunks:
+                redis.mget(*chunk)
+        else:
+            for chunk in chunks:
+                pipe = redis.pipeline()
+                for key in chunk:
+                    pipe.get(key)
+                pipe.execute()
+        read = time.perf_counter()
+        fsyncs = redis.aof.stats["fsyncs"] if redis.aof is not None else 0
+        redis.close()
+        return {"writes_per_sec": num_keys / (written - start), "reads_per_sec": num_keys / (read - written),
+                "fsyncs": fsyncs}
+    finally:
+        if directory is not None:
+            shutil.rmtree(directory)
+
+
+async def _batching_over_network(host, port, mode, num_keys, batch, value_size):
+    conn = await RedisClient.connect(host, port)
+    try:
+        keys = [f"key:{i}" for i in range(num_keys)]
+        value = "x" * value_size
+        chunks = [keys[i:i + batch] for i in range(0, num_keys, batch)]
+        start = time.perf_counter()
+        if mode == "per-key":
+            for key in keys:
+                await conn.execute("SET", key, value)  # One round trip each
+        elif mode == "mset/mget":
+            for chunk in chunks:
+                await conn.execute("MSET", *itertools.chain.from_iterable((key, value) for key in chunk))
+        else:
+            for chunk in chunks:
+                await conn.execute_many([("SET", key, value) for key in chunk])
+        written = time.perf_counter()
+        if mode == "per-key":
+            for key in keys:
+                await conn.execute("GET", key)
+        elif mode == "mset/mget":
+            for chunk in chunks:
+                await conn.execute("MGET", *chunk)
+        else:
+            for chunk in chunks:
+                await conn.execute_many([("GET", key) for key in chunk])
+        read = time.perf_counter()
+        await conn.execute("DEL", *keys[:batch])  # Keep the runs apart: the next one starts from missing keys
+        return {"writes_per_sec": num_keys / (written - start), "reads_per_sec": num_keys / (read - written)}
+    finally:
+        await conn.close()
+
+
+def bench_batching_server(host, port, mode, num_keys, batch, value_size=100):
+    """The same over RESP through redis_server.py, from one client: here every call is a round trip."""
+    return asyncio.run(_batching_over_network(host, port, mode, num_keys, batch, value_size))
+
+
+async def _cluster_load(nodes, clients, duration, pipeline, keyspace):
+    """One load process: `clients` smart clients, each sending pipelines of half SETs, half GETs."""
+    done = []
+
+    async def client():
+        conn = await ClusterClient.connect(nodes)
+        rng = random.Random()
+        stop = time.perf_counter() + duration
+        try:
+            while time.perf_counter() < stop:
+                batch = [("SET", f"key:{rng.randrange(keyspace)}", "xxx") if rng.random() < 0.5 else
+                         ("GET", f"key:{rng.randrange(keyspace)}") for _ in range(pipeline)]
+                await conn.execute_many(batch)
+                done.append(pipeline)
+        finally:
+            await conn.close()
+
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return sum(done)
+
+
+def _cluster_load_process(job):
+    return asyncio.run(_cluster_load(*job))
+
+
+def bench_cluster(workers, load_processes, clients, duration, pipeline, keyspace):
+    """Ops/s of a `workers`-node cluster, driven by load_processes processes (so the load is not one core either)."""
+    processes, nodes = start_cluster(workers)
+    try:
+        with multiprocessing.Pool(load_processes) as pool:
+            ops = pool.map(_cluster_load_process, [(nodes, clients, duration, pipeline, keyspace)] * load_processes)
+        return {"ops_per_sec": sum(ops) / duration}
+    finally:
+        stop_cluster(processes)
+
+
+def bench_restart(num_keys, value_size=100):
+    """
+    Writes num_keys strings (half with a TTL) twice, like a cache refreshed
+    once, and a leaderboard of num_keys / 10 members, all through the AOF.
+    Then times three restarts: replaying the whole log, loading it after
+    BGREWRITEAOF (base snapshot + empty log), and loading dump.rdb alone.
+    """
+    directory = tempfile.mkdtemp(prefix="redis_bench_")
+    files = lambda: sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory)) / 2**20
+    try:
+        redis = MockRedis(hz=0, dir=directory, appendonly=True, appendfsync="no", save=())
+        value = "x" * value_size
+        for _ in range(2):
+            for i in range(num_keys):
+                redis.set(f"key:{i}", value, ex=3600 if i % 2 else None)
+        for i in range(num_keys // 10):
+            redis.zadd("leaderboard", f"player:{i}", random.random())
+        redis.close()
+        del redis  # Each restart loads into an empty process, not next to the old dataset
+        results = {}
+
+        redis = MockRedis(hz=0, dir=directory, appendonly=True, save=())
+        results["aof log"] = (redis.stats["loading_seconds"], files())
+        start = time.perf_counter()
+        redis.bgrewriteaof()
+        fork_us = redis.stats["latest_fork_usec"]
+        redis.wait_for_background()
+        rewrite = time.perf_counter() - start
+        redis.close()
+        del redis
+
+        redis = MockRedis(hz=0, dir=directory, appendonly=True, save=())
+        results["aof rewritten"] = (redis.stats["loading_seconds"], files())
+        redis.save()
+        redis.close()
+        del redis
+        for name in os.listdir(directory):
+            if name != "dump.rdb":
+                os.remove(os.path.join(directory, name))
+
+        redis = MockRedis(hz=0, dir=directory, save=())
+        results["rdb"] = (redis.stats["loading_seconds"], files())
+        assert redis.dbsize() == num_keys + 1
+        return {"restarts": results, "fork_us": fork_us, "rewrite_seconds": rewrite}
+    finally:
+        shutil.rmtree(directory)
+
+
+def bench_limiter_accuracy(name, clients, limit, window, windows=10, load=2.0):
+    """
+    Simulated time: every client offers `load` x its limit for `windows`
+    windows; half send steadily, half in bursts of up to 2 x limit at once.
+    Then checks each client's allowed requests against the promise "at most
+    `limit` in ANY `window` seconds".
+    """
+    redis = MockRedis(hz=0)  # Keys outlive the simulated clock; expiry is not what is measured here
+    limiter = LIMITERS[name](redis, limit, window)
+    start = time.time() // window * window
+    end = start + windows * window
+    requests = []
+    for client in range(clients):
+        bursty = client % 2
+        mean_burst = limit + 0.5 if bursty else 1
+        t = start + random.uniform(0, window)
+        while t < end:
+            requests += [(t, client)] * (random.randint(1, 2 * limit) if bursty else 1)
+            t += random.expovariate(load * limit / window / mean_burst)
+    requests.sort()
+
+    allowed = {}
+    for t, client in requests:
+        if limiter.allow(client, now=t):
+            allowed.setdefault(client, []).append(t)
+    peaks = []
+    for times in allowed.values():
+        first, peak = 0, 0
+        for last, t in enumerate(times):  # Most allowed in any window ending at t
+            while times[first] <= t - window:
+                first += 1
+            peak = max(peak, last - first + 1)
+        peaks.append(peak)
+    return {
+        "offered": len(requests),
+        "allowed": sum(len(times) for times in allowed.values()),
+        "ideal": clients * limit * windows,  # Perfectly spread, the most the promise lets through
+        "over_limit": sum(peak > limit for peak in peaks) / clients,
+        "worst_peak": max(peaks) / limit,
+    }
+
+
+def bench_limiter_throughput(name, num_ips, checks, limit, window):
+    """Real time: `checks` requests from IPs drawn out of num_ips. Expiry keeps only recent clients in memory."""
+    redis = MockRedis(hz=HZ)
+    limiter = LIMITERS[name](redis, limit, window)
+    pool = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(num_ips)]
+    workload = [pool[random.randrange(num_ips)] for _ in range(checks)]
+    del pool
+    peak_keys, peak_memory = 0, 0
+    start = time.perf_counter()
+    for i, ip in enumerate(workload):
+        limiter.allow(ip)
+        if i % 10_000 == 0:
+            peak_keys, peak_memory = max(peak_keys, redis.dbsize()), max(peak_memory, redis.used_memory)
+    elapsed = time.perf_counter() - start
+    return {"checks_per_sec": checks / elapsed, "peak_keys": peak_keys, "peak_mb": peak_memory / 2**20}
+
+
+STAMPEDE_STRATEGIES = ("naive", "single-flight", "single-flight + xfetch", "single-flight + swr")
+
+
+async def _herd(strategy, herd, db_latency, db_connections, ttl, duration):
+    """
+    `herd` clients hammer ONE hot key that expires every `ttl` seconds. A load
+    takes db_latency once it gets one of db_connections; the rest queue.
+    """
+    redis = MockRedis(hz=HZ)
+    db = {"calls": 0, "active": 0, "peak": 0}
+    pool = asyncio.Semaphore(db_connections)
+
+    async def load(key):
+        db["calls"] += 1
+        db["active"] += 1
+        db["peak"] = max(db["peak"], db["active"])
+        try:
+            async with pool:
+                await asyncio.sleep(db_latency * random.uniform(0.8, 1.2))
+            return f"value of {key}"
+        finally:
+            db["active"] -= 1
+
+    async def naive_get(key):
+        value = redis.get(key)
+        if value is None:  # Every client that misses goes to the DB
+            value = await load(key)
+            redis.set(key, value, ex=ttl)
+        return value
+
+    loader = None
+    if strategy != "naive":
+        loader = AsyncCacheLoader(redis, load, ttl, stale_ttl=ttl if strategy.endswith("swr") else 0,
+                                  beta=1.0 if strategy.endswith("xfetch") else 0)
+    get = naive_get if loader is None else loader.get
+    await get("hot")  # Warm: measure the herds at expiry, not the cold start
+    latencies = []
+    stop = time.perf_counter() + duration
+
+    async def client():
+        await asyncio.sleep(random.uniform(0, 0.01))
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            await get("hot")
+            latencies.append(time.perf_counter() - start)
+            await asyncio.sleep(random.uniform(0, 0.02))  # Think time
+
+    await asyncio.gather(*(client() for _ in range(herd)))
+    return {
+        "requests": len(latencies),
+        "db_calls": db["calls"],
+        "peak_db": db["peak"],
+        "latency_ms": {p: percentile(latencies, p) * 1000 for p in (50, 99, 99.9, 100)},
+    }
+
+
+def bench_stampede(strategy, herd, db_latency, db_connections, ttl, duration):
+    return asyncio.run(_herd(strategy, herd, db_latency, db_connections, ttl, duration))
+
+
+def start_server(port):
+    """Runs redis_server.py in its own process (its own GIL) and waits until it accepts connections."""
+    server = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "redis_server.py"),
+                               "--port", str(port)], stdout=subprocess.DEVNULL)
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return server
+        except OSError:
+            time.sleep(0.05)
+    server.kill()
+    raise RuntimeError("redis_server.py did not start")
+
+
+async def _load(host, port, test, clients, requests, pipeline, keyspace):
+    """Like redis-benchmark: `clients` connections, each sending `pipeline` commands per round trip."""
+    make = SERVER_TESTS[test]
+    latencies = []
+    per_client = requests // clients
+
+    async def client():
+        conn = await RedisClient.connect(host, port)
+        rng = random.Random()
+        try:
+            for _ in range(0, per_client, pipeline):
+                batch = [make(rng.randrange(keyspace)) for _ in range(pipeline)]
+                start = time.perf_counter()
+                await conn.execute_many(batch)
+                latencies.extend([time.perf_counter() - start] * pipeline)  # Each command waited the whole trip
+        finally:
+            await conn.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return time.perf_counter() - start, latencies
+
+
+def bench_server(host, port, test, clients, requests, pipeline, keyspace):
+    elapsed, latencies = asyncio.run(_load(host, port, test, clients, requests, pipeline, keyspace))
+    return {
+        "ops_per_sec": len(latencies) / elapsed,
+        "latency_ms": {p: percentile(latencies, p) * 1000 for p in (50, 95, 99, 99.9, 100)},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MockRedis benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10**6])
+    parser.add_argument("--duration", type=float, default=3.0, help="Seconds each timed workload runs")
+    parser.add_argument("--hz", type=int, nargs="+", default=[0, 10, 100], help="Cron rates (0 = lazy expiry only)")
+    parser.add_argument("--reads", type=int, default=10_000)
+    parser.add_argument("--old-reads", type=int, default=5, help="The sort-on-read path is slow; sample less")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="Load-test a running server (default: start one)")
+    parser.add_argument("--tests", default="ping,set,get,incr,zadd,zrevrange", help=f"Of: {','.join(SERVER_TESTS)}")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=100_000)
+    parser.add_argument("--pipeline", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("--keyspace", type=int, default=100_000)
+    parser.add_argument("--policies", nargs="+", choices=MAXMEMORY_POLICIES,
+                        default=["noeviction", "allkeys-lru", "allkeys-lfu", "volatile-ttl"])
+    parser.add_argument("--cache-ratio", type=float, default=0.1, help="Share of the keyspace maxmemory fits")
+    parser.add_argument("--samples", type=positive_int, nargs="+", default=[5], help="maxmemory-samples values to try")
+    parser.add_argument("--limit", type=int, default=10, help="Rate limit: requests per --window")
+    parser.add_argument("--window", type=float, default=1.0, help="Rate limit window, seconds")
+    parser.add_argument("--ips", type=int, nargs="+", default=[10**6], help="Distinct client IPs")
+    parser.add_argument("--checks", type=int, default=10**6, help="Rate limit checks per run")
+    parser.add_argument("--batch", type=int, nargs="+", default=[10, 100, 1000], help="Keys per MSET/MGET/pipeline")
+    parser.add_argument("--fsync-keys", type=int, default=10_000, help="Keys written under appendfsync always")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Cluster sizes to try")
+    parser.add_argument("--load-processes", type=int, default=4, help="Client processes driving the cluster")
+    parser.add_argument("--traced-keys", type=int, default=100_000, help="Keys tracemalloc measures per run")
+    parser.add_argument("--herd", type=int, nargs="+", default=[1000], help="Concurrent clients on one hot key")
+    parser.add_argument("--db-latency", type=float, default=0.05, help="Seconds a simulated DB load takes")
+    parser.add_argument("--db-connections", type=int, default=10, help="Loads the simulated DB serves at once")
+    parser.add_argument("--ttl", type=float, default=1.0, help="Cache TTL, seconds")
+    parser.add_argument("--bench", choices=["expiry", "zset", "server", "eviction", "persistence", "ratelimit",
+                                            "stampede", "batch", "cluster", "encoding"],
+                        default="expiry")
+    args = parser.parse_args()
+
+    if args.bench == "expiry":
+        print("--- ⏳ Expiry: Lazy Only vs Lazy + Active Cycle (90% volatile keys, ~1s TTL) ---")
+        for size in args.sizes:
+            memory = bench_expiry_memory(size)
+            print(f"{size:>10,} keys | {memory['no ttl']:6.1f} bytes/key without TTL, "
+                  f"{memory['ttl']:6.1f} with (expiry index: +{memory['ttl'] - memory['no ttl']:.1f})")
+            for hz in args.hz:
+                r = bench_expiry(size, hz, args.duration)
+                lat = r["latency_us"]
+                freed = (r["loaded"] - r["remaining"]) * memory["ttl"] / 2**20
+                print(f"{size:>10,} keys | {'lazy only' if not hz else f'hz {hz}':>9} | {r['remaining']:>9,} of "
+                      f"{r['loaded']:,} keys left after {args.duration}s ({freed:6.1f} MB freed) | "
+                      f"{r['cycles']:>4} cycles, {r['cycle_cpu']:5.1%} CPU, {r['time_cap_reached']:>3} hit the cap | "
+                      f"GET {r['ops_per_sec']:>9,.0f} ops/s  p50 {lat[50]:5.2f} p99 {lat[99]:5.2f} "
+                      f"p99.9 {lat[99.9]:6.2f} max {lat[100]:8.1f} us")
+
+    if args.bench == "zset":
+        print("--- 🏆 Sorted Sets: Skiplist vs Sort-on-Read (per-op microseconds) ---")
+        for size in args.sizes:
+            r = bench_zset(size, args.reads, args.old_reads)
+            old, new = r["old"], r["new"]
+            print(f"{size:>10,} members | sort-on-read | zadd {old['zadd'] * 1e6:6.2f} | "
+                  f"top-10 {old['top10'] * 1e6:12,.1f} | rank {old['rank'] * 1e6:12,.1f}")
+            print(f"{size:>10,} members |     skiplist | zadd {new['zadd'] * 1e6:6.2f} | "
+                  f"top-10 {new['top10'] * 1e6:12,.1f} | rank {new['rank'] * 1e6:12,.1f} | "
+                  f"zincrby {new['zincrby'] * 1e6:6.2f} | rangebyscore(10) {new['rangebyscore'] * 1e6:6.2f} | "
+                  f"zrem {new['zrem'] * 1e6:6.2f}")
+
+    if args.bench == "server":
+        server = None if args.port else start_server(DEFAULT_PORT + 1)
+        port = args.port or DEFAULT_PORT + 1
+        print(f"--- 🛰️  RESP Load Test: {args.host}:{port}, {args.clients} clients, {args.requests:,} requests ---")
+        try:
+            for pipeline in args.pipeline:
+                for test in args.tests.split(","):
+                    r = bench_server(args.host, port, test, args.clients, args.requests, pipeline, args.keyspace)
+                    lat = r["latency_ms"]
+                    print(f"{test.upper():>10} | pipeline {pipeline:>3} | {r['ops_per_sec']:>9,.0f} ops/s | "
+                          f"p50 {lat[50]:6.2f} p95 {lat[95]:6.2f} p99 {lat[99]:6.2f} p99.9 {lat[99.9]:6.2f} "
+                          f"max {lat[100]:7.2f} ms")
+        finally:
+            if server is not None:
+                server.terminate()
+
+    if args.bench == "eviction":
+        print(f"--- 🧹 Eviction: Zipf GETs + SET on miss, {args.keyspace:,} keys, "
+              f"maxmemory = {args.cache_ratio:.0%} of them, {args.requests:,} requests ---")
+        for samples in args.samples:
+            for policy in args.policies:
+                r = bench_eviction(policy, args.keyspace, args.requests, args.cache_ratio, samples)
+                lat = r["latency_us"]
+                print(f"{policy:>12} | samples {samples:>2} | hit rate {r['hit_rate']:6.1%} | "
+                      f"{r['evicted']:>9,} evicted, {r['refused']:>9,} OOM | {r['keys']:>8,} keys, "
+                      f"{r['used_mb']:6.1f} of {r['maxmemory_mb']:6.1f} MB | {r['ops_per_sec']:>9,.0f} ops/s "
+                      f"p50 {lat[50]:5.2f} p99 {lat[99]:6.2f} p99.9 {lat[99.9]:6.2f} us")
+
+    if args.bench == "persistence":
+        print(f"--- 💾 Persistence: SET throughput per appendfsync policy ({args.duration}s each) ---")
+        for policy in [None, "no", "everysec", "always"]:
+            r = bench_aof_writes(policy, args.duration)
+            lat = r["latency_us"]
+            print(f"{'aof off' if policy is None else policy:>9} | {r['ops_per_sec']:>9,.0f} SET/s | "
+                  f"{r['fsyncs']:>6,} fsyncs, {r['aof_mb']:6.1f} MB logged | p50 {lat[50]:6.2f} p99 {lat[99]:7.2f} "
+                  f"p99.9 {lat[99.9]:8.2f} max {lat[100]:9.1f} us")
+        print("\n--- 🔁 Persistence: Restart Time ---")
+        for size in args.sizes:
+            r = bench_restart(size)
+            print(f"{size:>10,} keys | BGREWRITEAOF: fork {r['fork_us'] / 1000:6.1f} ms, "
+                  f"child done in {r['rewrite_seconds']:5.2f}s")
+            for name, (seconds, mb) in r["restarts"].items():
+                print(f"{size:>10,} keys | {name:>13} | {mb:7.1f} MB on disk | restart {seconds:6.2f}s")
+
+    if args.bench == "ratelimit":
+        print(f"--- 🚦 Rate Limiters: Accuracy (1,000 clients offering 2x a limit of {args.limit} per window, "
+              f"half in bursts, 10 windows) ---")
+        for name in LIMITERS:
+            r = bench_limiter_accuracy(name, 1000, args.limit, args.window)
+            print(f"{name:>15} | {r['allowed']:>7,} of {r['offered']:>7,} allowed ({r['allowed'] / r['ideal']:5.1%} of "
+                  f"ideal) | {r['over_limit']:6.1%} of clients over the limit in some window, worst "
+                  f"{r['worst_peak']:4.1f}x")
+        print(f"\n--- 🚦 Rate Limiters: Throughput ({args.checks:,} checks, {args.limit} per {args.window}s) ---")
+        for num_ips in args.ips:
+            for name in LIMITERS:
+                r = bench_limiter_throughput(name, num_ips, args.checks, args.limit, args.window)
+                print(f"{num_ips:>10,} IPs | {name:>15} | {r['checks_per_sec']:>9,.0f} checks/s | "
+                      f"peak {r['peak_keys']:>9,} keys, {r['peak_mb']:7.1f} MB")
+
+    if args.bench == "stampede":
+        print(f"--- 🐃 Cache Stampede: one hot key, TTL {args.ttl}s, DB load {args.db_latency * 1000:.0f} ms on "
+              f"{args.db_connections} connections, {args.duration}s each ---")
+        for herd in args.herd:
+            for strategy in STAMPEDE_STRATEGIES:
+                r = bench_stampede(strategy, herd, args.db_latency, args.db_connections, args.ttl,
+                                   args.duration)
+                lat = r["latency_ms"]
+                print(f"{herd:>6,} clients | {strategy:>22} | {r['requests']:>8,} requests | {r['db_calls']:>6,} DB calls, "
+                      f"peak {r['peak_db']:>5,} in flight | p50 {lat[50]:6.2f} p99 {lat[99]:6.2f} "
+                      f"p99.9 {lat[99.9]:6.2f} max {lat[100]:6.2f} ms")
+
+    if args.bench == "batch":
+        for size, appendfsync in [(size, None) for size in args.sizes] + [(args.fsync_keys, "always")]:
+            print(f"--- 📦 Batching: {size:,} keys, "
+                  f"{'AOF off' if appendfsync is None else 'appendfsync ' + appendfsync} ---")
+            for mode in BATCH_MODES:
+                for batch in [1] if mode == "per-key" else args.batch:
+                    r = bench_batching(mode, size, batch, appendfsync)
+                    print(f"{mode:>10} | batch {batch:>5,} | SET {r['writes_per_sec']:>11,.0f} keys/s | "
+                          f"GET {r['reads_per_sec']:>11,.0f} keys/s | {r['fsyncs']:>7,} fsyncs")
+        server = None if args.port else start_server(DEFAULT_PORT + 1)
+        port = args.port or DEFAULT_PORT + 1
+        try:
+            for size in args.sizes:
+                print(f"--- 📦 Batching over RESP: {size:,} keys, one client, {args.host}:{port} ---")
+                for mode in BATCH_MODES:
+                    for batch in [1] if mode == "per-key" else args.batch:
+                        r = bench_batching_server(args.host, port, mode, size, batch)
+                        print(f"{mode:>10} | batch {batch:>5,} | SET {r['writes_per_sec']:>11,.0f} keys/s | "
+                              f"GET {r['reads_per_sec']:>11,.0f} keys/s")
+        finally:
+            if server is not None:
+                server.terminate()
+
+    if args.bench == "cluster":
+        print(f"--- 🧩 Cluster Scaling: {args.load_processes} load processes x {args.clients} clients, "
+              f"50% SET / 50% GET over {args.keyspace:,} keys, {args.duration}s each, {os.cpu_count()} CPUs ---")
+        for pipeline in args.pipeline:
+            base = None
+            for workers in args.workers:
+                r = bench_cluster(workers, args.load_processes, args.clients, args.duration, pipeline, args.keyspace)
+                base = base or r["ops_per_sec"]
+                print(f"{workers:>3} workers | pipeline {pipeline:>3} | {r['ops_per_sec']:>9,.0f} ops/s | "
+                      f"{r['ops_per_sec'] / base:4.2f}x")
+
+    if args.bench == "encoding":
+        print("--- 🗜️  Small Collections: Full Structures vs Listpack/Intset (5 members per key) ---")
+        for size in args.sizes:
+            for kind in ENCODING_WORKLOADS:
+                full, small = (bench_encoding(kind, size, compact, args.traced_keys) for compact in (False, True))
+                for r in (full, small):
+                    print(f"{size:>10,} {kind:>4} keys | {r['encoding']:>9} | {r['bytes_per_key']:6.0f} bytes/key "
+                          f"(used_memory {r['used_memory_per_key']:5.0f}) | write {r['writes_per_sec']:>9,.0f} keys/s | "
+                          f"read {r['reads_per_sec']:>9,.0f} keys/s")
+                print(f"{size:>10,} {kind:>4} keys | {full['bytes_per_key'] / small['bytes_per_key']:.1f}x smaller")
@@ -0,0 +1,433 @@
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from hash_slot import CLUSTER_SLOTS, key_slot
+from redis_demo import HZ, MockRedis
+from redis_server import (INCOMPLETE, OK, READ_SIZE, CommandError, RedisClient, RedisServer, ReplyError,
+                          encode_command, encode_reply, parse_reply, _int)
+
+CLUSTER_PORT = 7000         # First node's port; node i listens on CLUSTER_PORT + i
+MAX_REDIRECTS = 16          # Like redis-py: a command bounced more often than this gives up
+MIGRATE_BATCH = 100         # Keys per CLUSTER GETKEYSINSLOT / MIGRATE round while resharding
+
+# Where a command's keys are: (first arg index, last (-1 = the rest), step), like Redis's command table
+KEY_SPECS = {name: (1, 1, 1) for name in (
+    "GET", "SET", "INCR", "EXPIRE", "TTL", "PTTL", "PERSIST", "DUMP", "RESTORE", "ZADD", "ZINCRBY", "ZREM", "ZSCORE",
+    "ZCARD", "ZRANK", "ZREVRANK", "ZRANGE", "ZREVRANGE", "ZRANGEBYSCORE", "ZREMRANGEBYSCORE", "HSET", "HGET", "HDEL",
+    "HGETALL", "HLEN", "HEXISTS", "HINCRBY", "SADD", "SREM", "SISMEMBER", "SMEMBERS", "SCARD")}
+KEY_SPECS.update({"MGET": (1, -1, 1), "DEL": (1, -1, 1), "EXISTS": (1, -1, 1), "MSET": (1, -1, 2),
+                  "OBJECT": (2, 2, 1)})
+
+
+def command_keys(args):
+    """The keys a command (name first) touches; [] for keyless commands like PING."""
+    spec = KEY_SPECS.get(args[0].upper())
+    if spec is None:
+        return []
+    first, last, step = spec
+    return args[first:len(args) if last < 0 else last + 1:step]
+
+
+def slot_layout(nodes):
+    """The initial slot map: 16384 slots split into len(nodes) contiguous ranges, in order."""
+    return [nodes[slot * len(nodes) // CLUSTER_SLOTS] for slot in range(CLUSTER_SLOTS)]
+
+
+def slot_ranges(slots):
+    """[(first slot, last slot, node)] runs of the slot map, as CLUSTER SLOTS reports them."""
+    ranges = []
+    for slot, node in enumerate(slots):
+        if ranges and ranges[-1][2] == node:
+            ranges[-1][1] = slot
+        else:
+            ranges.append([slot, slot, node])
+    return [tuple(r) for r in ranges]
+
+
+def _address(node):
+    host, port = node.rsplit(":", 1)
+    return host, int(port)
+
+
+# --- A node: RedisServer that only serves the slots it owns ---
+
+class ClusterNode(RedisServer):
+    """
+    One shard. Every node knows the whole slot map (the launcher gives them
+    the same initial layout; CLUSTER SETSLOT ... NODE updates it, standing in
+    for Redis's gossip). A command for a slot owned elsewhere gets
+    "-MOVED slot host:port". While a slot migrates away, keys already moved
+    get "-ASK slot host:port": the client retries there once, after ASKING,
+    without updating its map.
+    """
+
+    def __init__(self, nodes, db=None, host="127.0.0.1", port=CLUSTER_PORT, hz=HZ):
+        super().__init__(db if db is not None else MockRedis(hz=0, cluster=True), host, port, hz)
+        self.node = f"{host}:{port}"
+        self.slots = slot_layout(nodes)
+        self.migrating = {}  # slot -> node it is moving to
+        self.importing = {}  # slot -> node it is moving from
+        self._migrate_sockets = {}  # node -> blocking connection MIGRATE reuses
+        self.commands = {**self.commands, **CLUSTER_COMMANDS}
+        self.stats.update({"moved": 0, "ask": 0})
+
+    def execute(self, args, conn=None):
+        name = args[0].upper()
+        if name == "ASKING":
+            if conn is not None:
+                conn.asking = True
+            return OK
+        asking = conn is not None and conn.asking
+        if asking:
+            conn.asking = False  # Good for one command only
+        keys = command_keys(args)
+        if keys:
+            redirect = self._route(keys, asking)
+            if redirect is not None:
+                return redirect
+        return super().execute(args, conn)
+
+    def _route(self, keys, asking):
+        """None if this node serves the keys now, else the error reply that sends the client elsewhere."""
+        slot = key_slot(keys[0])
+        if any(key_slot(key) != slot for key in keys[1:]):
+            return b"-CROSSSLOT Keys in request don't hash to the same slot\r\n"
+        owner = self.slots[slot]
+        if owner == self.node:
+            target = self.migrating.get(slot)
+            if target is None:
+                return None
+            present = sum(self.db.exists(key) for key in keys)
+            if present == len(keys):
+                return None
+            if present:
+                return b"-TRYAGAIN Multiple keys request during rehashing of slot\r\n"
+            self.stats["ask"] += 1
+            return b"-ASK %d %s\r\n" % (slot, target.encode())  # Not here (any more): it is, or will be, there
+        if asking and slot in self.importing:
+            return None
+        self.stats["moved"] += 1
+        return b"-MOVED %d %s\r\n" % (slot, owner.encode())
+
+    def migrate(self, node, keys, timeout):
+        """
+        Moves keys to node: DUMP here, ASKING + RESTORE ... REPLACE there,
+        then DEL here. Blocking, like Redis's MIGRATE: no command runs in
+        between, so no write can slip in and be lost.
+        """
+        present = [(key, self.db.dump(key), self.db.pttl(key)) for key in keys]
+        present = [(key, payload, ttl) for key, payload, ttl in present if payload is not None]
+        if not present:
+            return b"+NOKEY\r\n"
+        commands = []
+        for key, payload, ttl in present:
+            commands += [("ASKING",), ("RESTORE", key, max(ttl, 0), payload, "REPLACE")]
+        try:
+            replies = self._migrate_request(node, commands, timeout)
+        except OSError as e:
+            self._migrate_sockets.pop(node, None)
+            raise CommandError(f"IOERR error or timeout writing to target instance: {e}") from None
+        for reply in replies:
+            if isinstance(reply, ReplyError):
+                raise CommandError(f"Target instance replied with error: {reply}")
+        self.db.mdel(*(key for key, _, _ in present))
+        return OK
+
+    def _migrate_request(self, node, commands, timeout):
+        sock = self._migrate_sockets.get(node)
+        if sock is None:
+            sock = self._migrate_sockets[node] = socket.create_connection(_address(node), timeout=timeout)
+        sock.settimeout(timeout)
+        sock.sendall(b"".join(encode_command(*c) for c in commands))
+        buf, replies, pos = bytearray(), [], 0
+        while len(replies) < len(commands):
+            data = sock.recv(READ_SIZE)
+            if not data:
+                raise ConnectionError("target closed the connection")
+            buf += data
+            with memoryview(buf) as view:
+                while len(replies) < len(commands):
+                    reply, pos = parse_reply(buf, view, pos, len(buf))
+                    if reply is INCOMPLETE:
+                        break
+                    replies.append(reply)
+        return replies
+
+
+def cmd_cluster(node, args):
+    sub = args[0].upper()
+    if sub == "KEYSLOT" and len(args) == 2:
+        return encode_reply(key_slot(args[1]))
+    if sub == "MYID" and len(args) == 1:
+        return encode_reply(node.node)
+    if sub == "SLOTS" and len(args) == 1:
+        return encode_reply([[first, last, [*_address(owner)]] for first, last, owner in slot_ranges(node.slots)])
+    if sub == "COUNTKEYSINSLOT" and len(args) == 2:
+        return encode_reply(node.db.count_keys_in_slot(_slot(args[1])))
+    if sub == "GETKEYSINSLOT" and len(args) == 3:
+        return encode_reply(node.db.keys_in_slot(_slot(args[1]), _int(args[2])))
+    if sub == "SETSLOT" and len(args) in (3, 4):
+        slot, state = _slot(args[1]), args[2].upper()
+        if state == "STABLE" and len(args) == 3:
+            node.migrating.pop(slot, None)
+            node.importing.pop(slot, None)
+            return OK
+        if len(args) == 4:
+            target = args[3]
+            if state == "MIGRATING":
+                if node.slots[slot] != node.node:
+                    raise CommandError(f"I'm not the owner of hash slot {slot}")
+                node.migrating[slot] = target
+                return OK
+            if state == "IMPORTING":
+                node.importing[slot] = target
+                return OK
+            if state == "NODE":
+                node.slots[slot] = target
+                node.migrating.pop(slot, None)
+                node.importing.pop(slot, None)
+                return OK
+    raise CommandError(f"unknown or malformed CLUSTER subcommand '{args[0]}'")
+
+
+def _slot(value):
+    slot = _int(value)
+    if not 0 <= slot < CLUSTER_SLOTS:
+        raise CommandError("Invalid or out of range slot")
+    return slot
+
+
+def cmd_migrate(node, args):
+    """MIGRATE host port key|"" db timeout [COPY] [REPLACE] [KEYS key ...]"""
+    host, port, key, _, timeout, *options = args
+    keys = [key]
+    upper = [option.upper() for option in options]
+    if "KEYS" in upper:
+        if key:
+            raise CommandError("syntax error")
+        keys = options[upper.index("KEYS") + 1:]
+    return node.migrate(f"{host}:{port}", keys, max(_int(timeout), 1) / 1000)
+
+
+CLUSTER_COMMANDS = {
+    "CLUSTER": (cmd_cluster, -2),
+    "MIGRATE": (cmd_migrate, -6),
+}
+
+
+# --- The smart client ---
+
+class ClusterClient:
+    """
+    Keeps the slot map (from CLUSTER SLOTS) and one connection per node, so
+    most commands go straight to the right node. -MOVED updates the map and
+    retries there; -ASK retries once on the importing node after ASKING;
+    -TRYAGAIN waits a moment. Pipelines are split per node and sent to all
+    nodes at once. Like RedisClient, one per task: calls must not overlap.
+    """
+
+    def __init__(self, startup_nodes):
+        self.startup_nodes = list(startup_nodes)
+        self.slots = [None] * CLUSTER_SLOTS
+        self._conns = {}
+        self.stats = {"moved": 0, "ask": 0, "tryagain": 0, "map_refreshes": 0}
+
+    @classmethod
+    async def connect(cls, startup_nodes):
+        client = cls(startup_nodes)
+        await client.refresh_slots()
+        return client
+
+    async def _conn(self, node):
+        conn = self._conns.get(node)
+        if conn is None:
+            conn = self._conns[node] = await RedisClient.connect(*_address(node))
+        return conn
+
+    async def refresh_slots(self):
+        """Fetches the whole slot map from the first node that answers."""
+        for node in list(self._conns) + self.startup_nodes:
+            try:
+                ranges = await (await self._conn(node)).execute("CLUSTER", "SLOTS")
+            except OSError:
+                continue
+            for first, last, (host, port) in ranges:
+                self.slots[first:last + 1] = [f"{host}:{port}"] * (last - first + 1)
+            self.stats["map_refreshes"] += 1
+            return
+        raise ConnectionError("no cluster node answered")
+
+    def node_for(self, args):
+        keys = command_keys(args)
+        return self.slots[key_slot(keys[0])] if keys else self.startup_nodes[0]
+
+    async def execute(self, *args):
+        reply = (await self.execute_many([args]))[0]
+        if isinstance(reply, ReplyError):
+            raise reply
+        return reply
+
+    async def execute_many(self, commands):
+        """Pipelines commands across the cluster; replies in order. Error replies are returned, not raised."""
+        replies = [None] * len(commands)
+        tryagain = self.stats["tryagain"]
+        pending = {i: self.node_for(command) for i, command in enumerate(commands)}
+        asking = set()  # Indexes to send with ASKING in front
+        for _ in range(MAX_REDIRECTS):
+            if self.stats["tryagain"] > tryagain:
+                await asyncio.sleep(0.01)  # A multi-key command hit a half-migrated slot: let MIGRATE finish
+            tryagain = self.stats["tryagain"]
+            by_node = {}
+            for i, node in pending.items():
+                by_node.setdefault(node, []).append(i)
+            batches = await asyncio.gather(*(self._send(node, [(i, commands[i], i in asking) for i in indexes])
+                                             for node, indexes in by_node.items()))
+            pending, asking = {}, set()
+            for batch in batches:
+                for i, reply in batch:
+                    redirect = str(reply).split() if isinstance(reply, ReplyError) else None
+                    if redirect and redirect[0] == "MOVED":
+                        self.slots[int(redirect[1])] = redirect[2]  # The slot lives there now
+                        self.stats["moved"] += 1
+                        pending[i] = redirect[2]
+                    elif redirect and redirect[0] == "ASK":
+                        self.stats["ask"] += 1  # Just this key, just this once: the map stays
+                        pending[i] = redirect[2]
+                        asking.add(i)
+                    elif redirect and redirect[0] == "TRYAGAIN":
+                        self.stats["tryagain"] += 1
+                        pending[i] = self.node_for(commands[i])
+                    else:
+                        replies[i] = reply
+            if not pending:
+                return replies
+        for i in pending:
+            replies[i] = ReplyError(f"CLUSTERDOWN too many redirections for {commands[i][0]}")
+        return replies
+
+    async def _send(self, node, batch):
+        """[(index, command, asking)] -> [(index, reply)], as one pipeline to node."""
+        wire = []
+        for _, command, asking in batch:
+            if asking:
+                wire.append(("ASKING",))
+            wire.append(command)
+        replies = iter(await (await self._conn(node)).execute_many(wire))
+        result = []
+        for i, _, asking in batch:
+            if asking:
+                next(replies)  # +OK of ASKING
+            result.append((i, next(replies)))
+        return result
+
+    async def close(self):
+        for conn in self._conns.values():
+            await conn.close()
+        self._conns.clear()
+
+
+# --- Running and resharding a cluster (redis-cli --cluster's job) ---
+
+def start_cluster(workers, port=CLUSTER_PORT, host="127.0.0.1"):
+    """Starts one node process per worker (each its own core and GIL); returns (processes, node addresses)."""
+    nodes = [f"{host}:{port + i}" for i in range(workers)]
+    script = os.path.abspath(__file__)
+    processes = [subprocess.Popen([sys.executable, script, "--port", str(port + i), "--nodes", ",".join(nodes)],
+                                  stdout=subprocess.DEVNULL) for i in range(workers)]
+    deadline = time.time() + 10
+    for node in nodes:
+        while True:
+            try:
+                socket.create_connection(_address(node), timeout=0.1).close()
+                break
+            except OSError:
+                if time.time() > deadline:
+                    stop_cluster(processes)
+                    raise RuntimeError(f"cluster node {node} did not start")
+                time.sleep(0.05)
+    return processes, nodes
+
+
+def stop_cluster(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.wait()
+
+
+async def move_slot(admin, slot, target, nodes):
+    """
+    Live-migrates one slot to target, the way redis-cli --cluster reshard
+    does: mark it IMPORTING on the target and MIGRATING on the source, MIGRATE
+    its keys over in batches, then tell every node (target first) the new owner.
+    admin is a ClusterClient, only used for its per-node connections.
+    """
+    source = admin.slots[slot]
+    if source == target:
+        return 0
+    src, dst = await admin._conn(source), await admin._conn(target)
+    await dst.execute("CLUSTER", "SETSLOT", slot, "IMPORTING", source)
+    await src.execute("CLUSTER", "SETSLOT", slot, "MIGRATING", target)
+    host, port = _address(target)
+    moved = 0
+    while keys := await src.execute("CLUSTER", "GETKEYSINSLOT", slot, MIGRATE_BATCH):
+        await src.execute("MIGRATE", host, port, "", 0, 5000, "REPLACE", "KEYS", *keys)
+        moved += len(keys)
+    for node in [target, source] + [n for n in nodes if n not in (target, source)]:
+        await (await admin._conn(node)).execute("CLUSTER", "SETSLOT", slot, "NODE", target)
+    admin.slots[slot] = target
+    return moved
+
+
+async def cluster_demo(workers):
+    print(f"\n--- 🧩 Cluster Demo: {workers} nodes, {CLUSTER_SLOTS} hash slots ---")
+    processes, nodes = start_cluster(workers)
+    try:
+        client = await ClusterClient.connect(nodes)
+        for first, last, node in slot_ranges(client.slots):
+            print(f"[Cluster] Slots {first:>5}-{last:<5} -> {node}")
+
+        # 1. Keys spread over the nodes; {hashtags} keep related keys together
+        await client.execute_many([("SET", f"user:{i}", f"User_Data_{i}") for i in range(1000)])
+        await client.execute("MSET", "{user:7}:name", "Alice", "{user:7}:email", "alice@example.com")
+        print(f"[Client] MSET on '{{user:7}}:name' and '{{user:7}}:email': both in slot "
+              f"{key_slot('{user:7}:name')}, so one node can do it")
+        counts = [await (await client._conn(node)).execute("DBSIZE") for node in nodes]
+        print(f"[Cluster] 1,000 users spread as {counts}")
+
+        # 2. Live resharding: move node 0's first 100 slots to the last node while a stale client reads on
+        stale = await ClusterClient.connect(nodes)
+        moved = 0
+        for slot in range(100):
+            moved += await move_slot(client, slot, nodes[-1], nodes)
+        values = await stale.execute_many([("GET", f"user:{i}") for i in range(1000)])
+        misses = sum(value is None or isinstance(value, ReplyError) for value in values)
+        print(f"[Reshard] Moved slots 0-99 ({moved} keys) to {nodes[-1]}; a client with the old map read all "
+              f"1,000 users, {misses} failed, after {stale.stats['moved']} MOVED redirects")
+        await stale.close()
+        await client.close()
+    finally:
+        stop_cluster(processes)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hash-slot sharded MockRedis cluster")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="Run ONE node on this port (default: run the demo)")
+    parser.add_argument("--nodes", help="Every node's host:port, comma-separated, in slot order")
+    parser.add_argument("--hz", type=int, default=HZ)
+    parser.add_argument("--workers", type=int, default=3, help="Nodes the demo starts")
+    args = parser.parse_args()
+    if args.port is None:
+        asyncio.run(cluster_demo(args.workers))
+    else:
+        nodes = args.nodes.split(",") if args.nodes else [f"{args.host}:{args.port}"]
+        try:
+            asyncio.run(ClusterNode(nodes, host=args.host, port=args.port, hz=args.hz).serve())
+        except KeyboardInterrupt:
+            pass
@@ -1,42 +1,1160 @@
+import bisect
+import contextlib
+import os
+import random
+import shutil
+import sys
 import time
 import heapq
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+from cache_loader import CacheLoader
+from hash_slot import CLUSTER_SLOTS, key_slot
+from listpack import IntSet, ListpackHash, ListpackZSet, intset_member
+from rate_limiter import LIMITERS
+from redis_persistence import (FSYNC_EVERYSEC, RDB_TYPE_HASH, RDB_TYPE_SET, RDB_TYPE_STRING, RDB_TYPE_ZSET,
+                               AppendOnlyFile, decode_value, encode_value, read_aof, read_manifest, read_snapshot,
+                               write_manifest, write_snapshot)
+from sorted_set import SortedSet
+
+# Active expiry, like Redis's activeExpireCycle
+HZ = 10                                # Cron runs per second
+ACTIVE_EXPIRE_KEYS_PER_LOOP = 20       # Volatile keys sampled per round
+ACTIVE_EXPIRE_ACCEPTABLE_STALE = 0.10  # Keep sampling while more than 10% of a round had expired
+ACTIVE_EXPIRE_CPU_PERCENT = 25         # Max share of each cron period the cycle may use
+
+# maxmemory, like Redis's evict.c
+MAXMEMORY_POLICIES = ("noeviction", "allkeys-lru", "allkeys-lfu", "volatile-lru", "volatile-lfu", "volatile-ttl")
+MAXMEMORY_SAMPLES = 5  # Keys sampled per eviction round (Redis's maxmemory-samples)
+EVPOOL_SIZE = 16       # Best candidates kept between rounds
+LFU_INIT_VAL = 5       # A new key's counter, so it is not evicted before it had a chance to be read
+LFU_LOG_FACTOR = 10    # Higher = the 8-bit counter saturates after more hits
+LFU_DECAY_TIME = 1     # Minutes per counter decrement while a key is not read
+
+# Approximate memory: sys.getsizeof of the key and value plus fixed overheads
+DICT_ENTRY_BYTES = 48      # A slot in the keyspace dict
+ZSET_BYTES = 880           # An empty SortedSet: dict + 32-level skiplist header
+ZSET_MEMBER_BYTES = 270    # A skiplist node + its dict slot, without the member itself
+HASH_BYTES = 64            # An empty dict; each field then costs a DICT_ENTRY_BYTES slot
+SET_BYTES = 216            # An empty set
+SET_ENTRY_BYTES = 32       # A set slot (16 bytes) at Python's load factor
+
+# Small collections use compact encodings until they outgrow these, like redis.conf (0 = never compact)
+ZSET_MAX_LISTPACK_ENTRIES = 128
+ZSET_MAX_LISTPACK_VALUE = 64     # Longest member (characters) a listpack zset takes
+HASH_MAX_LISTPACK_ENTRIES = 128
+HASH_MAX_LISTPACK_VALUE = 64     # Longest field or value a listpack hash takes
+SET_MAX_INTSET_ENTRIES = 512
+
+
+# Persistence, like redis.conf
+RDB_FILE = "dump.rdb"
+SAVE_POINTS = ((3600, 1), (300, 100), (60, 10000))  # BGSAVE once `seconds` have passed with >= `changes` writes
+AOF_REWRITE_PERCENTAGE = 100                          # BGREWRITEAOF once the AOF has doubled since the last rewrite...
+AOF_REWRITE_MIN_SIZE = 64 * 1024 * 1024               # ...and is at least this big
+
+
+class OutOfMemoryError(Exception):
+    """A write was refused: used memory is over maxmemory and nothing may be evicted."""
+
+
+class WrongTypeError(Exception):
+    """A command on a key holding another type of value (Redis's WRONGTYPE)."""
+
+    def __init__(self):
+        super().__init__("Operation against a key holding the wrong kind of value")
+
+
+class RandomKeys:
+    """
+    A set of keys that can also hand out a random one in O(1): the keys in a
+    list, plus each key's index in it. A removal moves the last key into the
+    hole, so nothing is ever O(n).
+    """
+
+    def __init__(self):
+        self._keys = []
+        self._pos = {}  # key -> index in _keys
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self._pos
+
+    def add(self, key):
+        if key not in self._pos:
+            self._pos[key] = len(self._keys)
+            self._keys.append(key)
+
+    def discard(self, key):
+        i = self._pos.pop(key, None)
+        if i is None:
+            return
+        last = self._keys.pop()
+        if i < len(self._keys):
+            self._keys[i] = last
+            self._pos[last] = i
+
+    def sample(self):
+        return self._keys[random.randrange(len(self._keys))]
+
+
+class ExpiryIndex:
+    """
+    The deadlines of every key with a TTL (Redis's "expires" dict), plus the
+    same keys in a RandomKeys so the active cycle can pick random ones in O(1).
+    """
+
+    def __init__(self):
+        self.deadlines = {}  # key -> Unix time it expires at
+        self.keys = RandomKeys()
+
+    def __len__(self):
+        return len(self.deadlines)
+
+    def set(self, key, deadline):
+        self.keys.add(key)
+        self.deadlines[key] = deadline
+
+    def discard(self, key):
+        if self.deadlines.pop(key, None) is not None:
+            self.keys.discard(key)
+
+    def sample(self):
+        """A random key with a TTL, and its deadline."""
+        key = self.keys.sample()
+        return key, self.deadlines[key]
+
+
+def _lfu_log_incr(counter):
+    """Redis's logarithmic counter: the higher it is, the less likely a hit bumps it."""
+    if counter == 255:
+        return 255
+    p = 1.0 / (max(counter - LFU_INIT_VAL, 0) * LFU_LOG_FACTOR + 1)
+    return counter + 1 if random.random() < p else counter
+
+
+def _too_long(value, limit):
+    return isinstance(value, (str, bytes)) and len(value) > limit
+
+
+def _lfu_decayed(access, minutes):
+    """The counter of a packed (minutes << 8) | counter, minus one per LFU_DECAY_TIME since it was set."""
+    periods = (minutes - (access >> 8)) // LFU_DECAY_TIME
+    return max((access & 255) - periods, 0)
+
 
 # --- Mock Redis Implementation ---
 class MockRedis:
-    def __init__(self):
+    def __init__(self, hz=HZ, maxmemory=0, maxmemory_policy="noeviction", maxmemory_samples=MAXMEMORY_SAMPLES,
+                 dir=None, appendonly=False, appendfsync=FSYNC_EVERYSEC, save=SAVE_POINTS, cluster=False):
         self.store = {} # Key-Value Store
-        self.sorted_sets = {} # For Leaderboards
-        
+        self.sorted_sets = {} # For Leaderboards: key -> ListpackZSet, or SortedSet once it grows
+        self.hashes = {} # key -> ListpackHash, or dict once it grows
+        self.sets = {} # key -> IntSet, or set once it grows or holds a non-integer
+        self.zset_max_listpack_entries = ZSET_MAX_LISTPACK_ENTRIES # CONFIG SET-able, like the rest below
+        self.zset_max_listpack_value = ZSET_MAX_LISTPACK_VALUE
+        self.hash_max_listpack_entries = HASH_MAX_LISTPACK_ENTRIES
+        self.hash_max_listpack_value = HASH_MAX_LISTPACK_VALUE
+        self.set_max_intset_entries = SET_MAX_INTSET_ENTRIES
+        self.expires = ExpiryIndex() # TTLs of keys in either of the above
+        self.keys = RandomKeys() # Every key, for allkeys-* eviction to sample
+        self.slot_keys = [set() for _ in range(CLUSTER_SLOTS)] if cluster else None # Cluster mode: slot -> its keys
+        self.hz = hz # Active expiry cycles per second (0 = lazy expiry only)
+        self._next_cron = 0.0
+        self.maxmemory = maxmemory # Bytes (0 = no limit)
+        self.set_maxmemory_samples(maxmemory_samples)
+        self.used_memory = 0
+        self._sizes = {} # key -> its approximate bytes
+        self._access = {} # key -> last access time (LRU) or packed LFU counter
+        self._pool_idle = [] # Eviction pool: best candidates so far, ascending idle score
+        self._pool_keys = []
+        self._lfu = False
+        self.set_maxmemory_policy(maxmemory_policy)
+        self.stats = {"expired_keys": 0, "expired_keys_active": 0, "expire_cycles": 0,
+                      "expire_cycle_seconds": 0.0, "expire_time_cap_reached": 0,
+                      "evicted_keys": 0, "keyspace_hits": 0, "keyspace_misses": 0,
+                      "rdb_saves": 0, "aof_rewrites": 0, "latest_fork_usec": 0, "loading_seconds": 0.0}
+        self.dir = dir # Where dump.rdb and the AOF live (None = nothing survives a restart)
+        self.save_points = save
+        self.appendfsync = appendfsync
+        self.aof = None
+        self.dirty = 0 # Writes since the last snapshot
+        self.last_save = time.time()
+        self._child = None # (pid, "rdb" or "aof", file it writes, dirty at fork) of a BGSAVE/BGREWRITEAOF
+        self._aof_manifest = None
+        self._aof_buf = None # AOF commands held back by batch() (None = log each as it happens)
+        self._aof_rewrite_base = 0 # AOF bytes right after the last rewrite
+        if dir is not None:
+            os.makedirs(dir, exist_ok=True)
+            self._load(appendonly)
+
+    def set_maxmemory_samples(self, samples):
+        """Like CONFIG SET maxmemory-samples: at least 1, or eviction could never pick a key."""
+        if samples < 1:
+            raise ValueError("maxmemory-samples must be at least 1")
+        self.maxmemory_samples = samples
+
+    def set_maxmemory_policy(self, policy):
+        """Like CONFIG SET maxmemory-policy. Switching between LRU and LFU restarts every key's history."""
+        if policy not in MAXMEMORY_POLICIES:
+            raise ValueError(f"unknown maxmemory policy {policy!r}")
+        lfu = policy.endswith("lfu")
+        if lfu != self._lfu:
+            self._lfu = lfu
+            for key in self._access:
+                self._access[key] = self._new_access()
+        self.maxmemory_policy = policy
+        self._pool_idle, self._pool_keys = [], []
+
+    def _now(self):
+        """The time, after running the cron if it is due: commands are the only events this in-process Redis sees."""
+        now = time.time()
+        if self.hz and now >= self._next_cron:
+            self.cron(now)
+        return now
+
+    def _lookup(self, key, write=False, now=None):
+        """
+        Every command goes through here for the key it touches:
+        1. Runs the cron when it is due (multi-key commands pass the `now`
+           they got from _now() once, instead).
+        2. Lazy expiry: an expired key is deleted, so it is never returned.
+        3. Records the access for LRU/LFU, and a hit or miss for reads.
+        Returns whether the key exists.
+        """
+        if now is None:
+            now = self._now()
+        deadline = self.expires.deadlines.get(key)
+        if deadline is not None and deadline <= now:
+            self._delete(key)
+            self._propagate("DEL", key)
+            self.stats["expired_keys"] += 1
+        found = key in self._access
+        if found:
+            self._touch(key)
+        if not write:
+            self.stats["keyspace_hits" if found else "keyspace_misses"] += 1
+        return found
+
+    def _new_access(self):
+        if self._lfu:
+            return (int(time.monotonic() // 60) << 8) | LFU_INIT_VAL
+        return time.monotonic()
+
+    def _touch(self, key):
+        if self._lfu:
+            minutes = int(time.monotonic() // 60)
+            counter = _lfu_log_incr(_lfu_decayed(self._access[key], minutes))
+            self._access[key] = (minutes << 8) | counter
+        else:
+            self._access[key] = time.monotonic()
+
+    def _charge(self, key, nbytes):
+        """Adds nbytes to key's share of used_memory (a new key starts at 0)."""
+        if key not in self._sizes:
+            self._sizes[key] = 0
+            self._access[key] = self._new_access()
+            self.keys.add(key)
+            if self.slot_keys is not None:
+                self.slot_keys[key_slot(key)].add(key)
+        self._sizes[key] += nbytes
+        self.used_memory += nbytes
+
+    def _delete(self, key):
+        found = key in self._sizes
+        if found:
+            self.used_memory -= self._sizes.pop(key)
+            del self._access[key]
+            self.keys.discard(key)
+            if self.slot_keys is not None:
+                self.slot_keys[key_slot(key)].discard(key)
+        self.store.pop(key, None)
+        self.sorted_sets.pop(key, None)
+        self.hashes.pop(key, None)
+        self.sets.pop(key, None)
+        self.expires.discard(key)
+        return found
+
+    def _check_type(self, key, table):
+        """Before reading key from, or creating it in, table (store, sorted_sets, hashes or sets): no other type."""
+        if key in self._sizes and key not in table:
+            raise WrongTypeError()
+
+    def _typed(self, key, table, write=False, now=None):
+        """key's value in table (None if missing), after _lookup: WrongTypeError if key holds another type."""
+        self._lookup(key, write=write, now=now)
+        self._check_type(key, table)
+        return table.get(key)
+
+    def _convert(self, key, table, full, full_bytes):
+        """Replaces key's compact encoding with its full structure (never back, like Redis)."""
+        self._charge(key, full_bytes - table[key].nbytes)
+        table[key] = full
+        return full
+
+    def _idle(self, key, now, minutes):
+        """Eviction score: the higher, the better a key is to evict."""
+        if self.maxmemory_policy == "volatile-ttl":
+            return -self.expires.deadlines[key] # Soonest to expire first
+        if self._lfu:
+            return 255 - _lfu_decayed(self._access[key], minutes)
+        return now - self._access[key]
+
+    def _make_room(self):
+        """Called before any write that can grow memory, like Redis's denyoom commands."""
+        if self.maxmemory and self.used_memory > self.maxmemory:
+            self._evict()
+
+    def _evict(self):
+        """
+        Redis's performEvictions: nothing is sorted by age. Each round samples
+        maxmemory_samples random keys into a small pool of the best candidates
+        seen so far (EVPOOL_SIZE, kept between rounds), then evicts the pool's
+        best key that still exists. O(samples) per evicted key, whatever the
+        number of keys.
+        """
+        if self.maxmemory_policy == "noeviction":
+            raise OutOfMemoryError("command not allowed when used memory > 'maxmemory'")
+        volatile = self.maxmemory_policy.startswith("volatile")
+        candidates = self.expires.keys if volatile else self.keys
+        now, minutes = time.monotonic(), int(time.monotonic() // 60)
+        while self.used_memory > self.maxmemory:
+            if not candidates:
+                raise OutOfMemoryError("command not allowed when used memory > 'maxmemory'")
+            for _ in range(min(self.maxmemory_samples, len(candidates))):
+                key = candidates.sample()
+                if key in self._pool_keys:
+                    continue
+                idle = self._idle(key, now, minutes)
+                if len(self._pool_keys) == EVPOOL_SIZE:
+                    if idle <= self._pool_idle[0]:
+                        continue # Worse than every candidate already pooled
+                    del self._pool_idle[0], self._pool_keys[0]
+                i = bisect.bisect(self._pool_idle, idle)
+                self._pool_idle.insert(i, idle)
+                self._pool_keys.insert(i, key)
+            if not self._pool_keys:
+                # The sample yielded no candidate: give up rather than loop forever
+                raise OutOfMemoryError("command not allowed when used memory > 'maxmemory'")
+            while self._pool_keys:
+                self._pool_idle.pop()
+                key = self._pool_keys.pop()
+                if key in candidates: # Pooled keys may have been deleted since
+                    self._delete(key)
+                    self._propagate("DEL", key)
+                    self.stats["evicted_keys"] += 1
+                    break
+
+    def cron(self, now=None):
+        """
+        Active expiry (Redis's serverCron -> activeExpireCycle): keys nobody reads
+        again would otherwise stay in memory forever. Samples random volatile keys,
+        deletes the expired ones, and goes on while more than
+        ACTIVE_EXPIRE_ACCEPTABLE_STALE of a sample had expired, but never for
+        longer than ACTIVE_EXPIRE_CPU_PERCENT of one cron period.
+        """
+        now = time.time() if now is None else now
+        self._next_cron = now + 1 / (self.hz or HZ)
+        budget = ACTIVE_EXPIRE_CPU_PERCENT / 100 / (self.hz or HZ)
+        start = time.perf_counter()
+        expired = 0
+        while self.expires:
+            sampled = min(ACTIVE_EXPIRE_KEYS_PER_LOOP, len(self.expires))
+            round_expired = 0
+            for _ in range(sampled):
+                key, deadline = self.expires.sample()
+                if deadline <= now:
+                    self._delete(key)
+                    self._propagate("DEL", key)
+                    round_expired += 1
+            expired += round_expired
+            if round_expired <= sampled * ACTIVE_EXPIRE_ACCEPTABLE_STALE:
+                break  # Few expired keys left: not worth more CPU
+            if time.perf_counter() - start > budget:
+                self.stats["expire_time_cap_reached"] += 1
+                break  # Latency first: the rest waits for the next cron
+        self.stats["expired_keys"] += expired
+        self.stats["expired_keys_active"] += expired
+        self.stats["expire_cycles"] += 1
+        self.stats["expire_cycle_seconds"] += time.perf_counter() - start
+        self._persistence_cron(now)
+
+    # --- Persistence: RDB snapshots + AOF ---
+
+    def _propagate(self, *command):
+        """
+        Logs one write as the AOF replays it. Relative TTLs are logged as
+        absolute deadlines, and INCR/ZINCRBY as their result, so replaying a
+        command always gives the same data, whenever it runs.
+        """
+        self.dirty += 1
+        if self.aof is not None:
+            if self._aof_buf is None:
+                self.aof.write(command)
+            else:
+                self._aof_buf.append(command)
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Holds back AOF writes until the block ends, then logs them all in ONE
+        write (so ONE fsync under appendfsync always), like Redis flushing its
+        AOF buffer once per event-loop turn. Pipelines and the server run each
+        batch of commands inside one. Nested batches join the outer one.
+        """
+        if self._aof_buf is not None:
+            yield
+            return
+        self._aof_buf = []
+        try:
+            yield
+        finally:
+            commands, self._aof_buf = self._aof_buf, None
+            if commands and self.aof is not None:
+                self.aof.write_many(commands)
+
+    def pipeline(self):
+        """A Pipeline: queue commands, then execute() them as one batch."""
+        return Pipeline(self)
+
+    def _replay(self, command):
+        op, *args = command
+        if op == "SET":
+            key, value, deadline = args
+            self._set_string(key, value)
+            if deadline is None:
+                self.expires.discard(key)
+            else:
+                self.expires.set(key, deadline)
+        elif op == "MSET":
+            for i in range(0, len(args), 2):
+                self._set_string(args[i], args[i + 1])
+                self.expires.discard(args[i])
+        elif op == "DEL":
+            for key in args:
+                self._delete(key)
+        elif op == "EXPIREAT":
+            self.expires.set(*args)
+        elif op == "PERSIST":
+            self.expires.discard(args[0])
+        elif op == "ZADD":
+            key = args[0]
+            for i in range(1, len(args), 2):
+                self._zadd(key, args[i], args[i + 1])
+        elif op == "ZREM":
+            self._zrem(*args)
+        elif op == "HSET":
+            key = args[0]
+            for i in range(1, len(args), 2):
+                self._hset(key, args[i], args[i + 1])
+        elif op == "HDEL":
+            for field in args[1:]:
+                self._hdel(args[0], field)
+        elif op == "SADD":
+            for member in args[1:]:
+                self._sadd(args[0], member)
+        elif op == "SREM":
+            for member in args[1:]:
+                self._srem(args[0], member)
+        else:
+            raise ValueError(f"unknown AOF command {op!r}")
+
+    def _snapshot_items(self):
+        deadlines = self.expires.deadlines
+        for key, value in self.store.items():
+            yield RDB_TYPE_STRING, key, value, deadlines.get(key)
+        for key, zset in self.sorted_sets.items():
+            yield RDB_TYPE_ZSET, key, zset.items(), deadlines.get(key)
+        for key, fields in self.hashes.items():
+            yield RDB_TYPE_HASH, key, fields.items(), deadlines.get(key)
+        for key, members in self.sets.items():
+            yield RDB_TYPE_SET, key, members, deadlines.get(key)
+
+    def _load_value(self, kind, key, value):
+        """Recreates a key from its snapshot/DUMP form; small collections come back compact."""
+        if kind == RDB_TYPE_ZSET:
+            for member, score in value:
+                self._zadd(key, member, score)
+        elif kind == RDB_TYPE_HASH:
+            for field, field_value in value:
+                self._hset(key, field, field_value)
+        elif kind == RDB_TYPE_SET:
+            for member in value:
+                self._sadd(key, member)
+        else:
+            self._set_string(key, value)
+
+    def _load_snapshot(self, path):
+        now = time.time()
+        for kind, key, value, deadline in read_snapshot(path):
+            if deadline is not None and deadline <= now:
+                continue # Expired while the server was down
+            self._load_value(kind, key, value)
+            if deadline is not None:
+                self.expires.set(key, deadline)
+
+    def _load_aof(self, path):
+        good = 0
+        for command, good in read_aof(path):
+            self._replay(command)
+        if good < os.path.getsize(path):
+            with open(path, "r+b") as f:
+                f.truncate(good) # Drop the torn tail of a crash, like aof-load-truncated
+
+    def _load(self, appendonly):
+        """At startup: the AOF if it is on (it has the latest writes), else dump.rdb."""
+        start = time.perf_counter()
+        manifest = read_manifest(self.dir) if appendonly else None
+        if manifest is not None:
+            if manifest["base"] is not None:
+                self._load_snapshot(os.path.join(self.dir, manifest["base"]))
+            for name in manifest["incr"]:
+                self._load_aof(os.path.join(self.dir, name))
+        elif os.path.exists(os.path.join(self.dir, RDB_FILE)):
+            self._load_snapshot(os.path.join(self.dir, RDB_FILE))
+        self.stats["loading_seconds"] = time.perf_counter() - start
+        if appendonly:
+            if manifest is None:
+                # First start with the AOF on: its base is whatever dump.rdb had
+                manifest = {"seq": 1, "base": None, "incr": ["appendonly.aof.1.incr.aof"]}
+                if self.dbsize():
+                    manifest["base"] = "appendonly.aof.1.base.rdb"
+                    write_snapshot(os.path.join(self.dir, manifest["base"]), self._snapshot_items())
+                write_manifest(self.dir, manifest)
+            self._aof_manifest = manifest
+            self.aof = AppendOnlyFile(os.path.join(self.dir, manifest["incr"][-1]), self.appendfsync)
+            self._aof_rewrite_base = self._aof_size()
+
+    def _aof_size(self):
+        names = [self._aof_manifest["base"]] + self._aof_manifest["incr"]
+        return sum(os.path.getsize(os.path.join(self.dir, name)) for name in names if name is not None)
+
+    def save(self):
+        """SAVE: writes dump.rdb, blocking every command until it is done."""
+        self._check_child()
+        if self._child is not None:
+            raise RuntimeError("a background save or rewrite is already in progress")
+        write_snapshot(os.path.join(self.dir, RDB_FILE), self._snapshot_items())
+        self.dirty = 0
+        self.last_save = time.time()
+        self.stats["rdb_saves"] += 1
+
+    def bgsave(self):
+        """
+        BGSAVE: a forked child writes dump.rdb while this process keeps serving.
+        The child sees memory frozen at fork time (the OS shares the pages
+        copy-on-write), so the snapshot is one consistent point in time.
+        Returns at once; cron() collects the result.
+        """
+        self._fork("rdb", os.path.join(self.dir, RDB_FILE))
+
+    def bgrewriteaof(self):
+        """
+        BGREWRITEAOF, multi-part like Redis 7: new writes go to a fresh incr
+        file at once, while a forked child snapshots everything before them
+        into a new base. Once the base is written, the manifest drops every
+        older file, so the AOF shrinks to about the size of the data.
+        """
+        if self.aof is None:
+            raise RuntimeError("the AOF is off")
+        self._check_child()
+        if self._child is not None:
+            raise RuntimeError("a background save or rewrite is already in progress")
+        old = self._aof_manifest
+        seq = old["seq"] + 1
+        incr = f"appendonly.aof.{seq}.incr.aof"
+        self.aof.rotate(os.path.join(self.dir, incr))
+        self._aof_manifest = {"seq": seq, "base": old["base"], "incr": old["incr"] + [incr]}
+        write_manifest(self.dir, self._aof_manifest) # Until the new base exists, replay every incr
+        self._fork("aof", os.path.join(self.dir, f"appendonly.aof.{seq}.base.rdb"))
+
+    def _fork(self, kind, path):
+        self._check_child()
+        if self._child is not None:
+            raise RuntimeError("a background save or rewrite is already in progress")
+        if not hasattr(os, "fork"):
+            write_snapshot(path, self._snapshot_items()) # No fork (Windows): block instead
+            self._finish_child(kind, path, self.dirty, ok=True)
+            return
+        start = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            # Child: write the snapshot and exit at once, without running any of the parent's cleanup
+            code = 1
+            try:
+                write_snapshot(path, self._snapshot_items())
+                code = 0
+            finally:
+                os._exit(code)
+        self.stats["latest_fork_usec"] = int((time.perf_counter() - start) * 1e6)
+        self._child = (pid, kind, path, self.dirty)
+
+    def wait_for_background(self):
+        """Blocks until a running BGSAVE or BGREWRITEAOF has finished."""
+        self._check_child(block=True)
+
+    def _check_child(self, block=False):
+        if self._child is None:
+            return
+        pid, kind, path, dirty = self._child
+        done, status = os.waitpid(pid, 0 if block else os.WNOHANG)
+        if done == 0:
+            return
+        self._child = None
+        self._finish_child(kind, path, dirty, ok=os.waitstatus_to_exitcode(status) == 0)
+
+    def _finish_child(self, kind, path, dirty, ok):
+        if not ok:
+            return # The old snapshot (or the longer AOF file list) is still complete
+        if kind == "rdb":
+            self.dirty -= dirty # Writes made during the save are not in it
+            self.last_save = time.time()
+            self.stats["rdb_saves"] += 1
+            return
+        old = self._aof_manifest
+        self._aof_manifest = {"seq": old["seq"], "base": os.path.basename(path), "incr": old["incr"][-1:]}
+        write_manifest(self.dir, self._aof_manifest)
+        for name in [old["base"]] + old["incr"][:-1]:
+            if name is not None:
+                os.remove(os.path.join(self.dir, name))
+        self._aof_rewrite_base = self._aof_size()
+        self.stats["aof_rewrites"] += 1
+
+    def _persistence_cron(self, now):
+        """Collects a finished child, then starts an automatic rewrite or save if one is due."""
+        self._check_child()
+        if self.dir is None or self._child is not None:
+            return
+        if self.aof is not None:
+            size = self._aof_size()
+            if size >= AOF_REWRITE_MIN_SIZE and size >= self._aof_rewrite_base * (1 + AOF_REWRITE_PERCENTAGE / 100):
+                self.bgrewriteaof()
+                return
+        if any(self.dirty >= changes and now - self.last_save >= seconds for seconds, changes in self.save_points):
+            self.bgsave()
+
+    def close(self):
+        """Waits for a background save or rewrite, then syncs and closes the AOF."""
+        self.wait_for_background()
+        if self.aof is not None:
+            self.aof.close()
+            self.aof = None
+
+    def info(self):
+        """Memory, eviction and keyspace counters, like INFO."""
+        lookups = self.stats["keyspace_hits"] + self.stats["keyspace_misses"]
+        return {"used_memory": self.used_memory, "maxmemory": self.maxmemory,
+                "maxmemory_policy": self.maxmemory_policy, "keys": self.dbsize(),
+                "expires": len(self.expires), "evicted_keys": self.stats["evicted_keys"],
+                "expired_keys": self.stats["expired_keys"], "keyspace_hits": self.stats["keyspace_hits"],
+                "keyspace_misses": self.stats["keyspace_misses"],
+                "hit_rate": self.stats["keyspace_hits"] / lookups if lookups else 0.0,
+                "rdb_changes_since_last_save": self.dirty, "rdb_last_save_time": int(self.last_save),
+                "rdb_bgsave_in_progress": int(self._child is not None and self._child[1] == "rdb"),
+                "aof_enabled": int(self.aof is not None),
+                "aof_rewrite_in_progress": int(self._child is not None and self._child[1] == "aof"),
+                "latest_fork_usec": self.stats["latest_fork_usec"], "loading_seconds": self.stats["loading_seconds"]}
+
     def get(self, key):
         """Simulate getting a value (Instant)"""
-        return self.store.get(key)
-    
-    def set(self, key, value):
-        """Simulate setting a value"""
+        return self._typed(key, self.store)
+
+    def mget(self, *keys):
+        """[value or None] for each key: one call (and one round trip) instead of len(keys)"""
+        now = self._now()
+        return [self._typed(key, self.store, now=now) for key in keys]
+
+    def _set_string(self, key, value):
+        if key in self._sizes and key not in self.store:
+            self._delete(key) # SET replaces a key of any type
+        old = self.store.get(key)
+        old_bytes = 0 if old is None else sys.getsizeof(old)
+        self._charge(key, sys.getsizeof(value) - old_bytes +
+                     (0 if old is not None else DICT_ENTRY_BYTES + sys.getsizeof(key)))
         self.store[key] = value
-        
-    def zadd(self, key, member, score):
-        """Simulate adding to a Sorted Set (Leaderboard)"""
-        if key not in self.sorted_sets:
-            self.sorted_sets[key] = {}
-        self.sorted_sets[key][member] = score
-        
+
+    def set(self, key, value, ex=None):
+        """Simulate setting a value. ex = TTL in seconds; without it, any old TTL is cleared (like SET)."""
+        self._make_room()
+        self._lookup(key, write=True)
+        self._set_string(key, value)
+        if ex is None:
+            self.expires.discard(key)
+        else:
+            self.expires.set(key, time.time() + ex)
+        self._propagate("SET", key, value, self.expires.deadlines.get(key))
+
+    def mset(self, mapping):
+        """SETs every key -> value in mapping (clearing their TTLs), logged as ONE AOF record."""
+        self._make_room()
+        now = self._now()
+        command = ["MSET"]
+        for key, value in mapping.items():
+            self._lookup(key, write=True, now=now)
+            self._set_string(key, value)
+            self.expires.discard(key)
+            command += (key, value)
+        if len(command) > 1:
+            self._propagate(*command)
+
+    def _zset(self, key):
+        """key's sorted set, created (and charged for) if missing: a ListpackZSet while small."""
+        zset = self.sorted_sets.get(key)
+        if zset is None:
+            self._check_type(key, self.sorted_sets)
+            if self.zset_max_listpack_entries:
+                zset = self.sorted_sets[key] = ListpackZSet()
+                self._charge(key, DICT_ENTRY_BYTES + sys.getsizeof(key) + zset.nbytes)
+            else:
+                zset = self.sorted_sets[key] = SortedSet()
+                self._charge(key, DICT_ENTRY_BYTES + sys.getsizeof(key) + ZSET_BYTES)
+        return zset
+
+    def _zadd(self, key, member, score):
+        zset = self._zset(key)
+        if zset.encoding == "listpack" and (
+                _too_long(member, self.zset_max_listpack_value) or
+                len(zset) >= self.zset_max_listpack_entries and member not in zset):
+            full = SortedSet()
+            for m, s in zset.items():
+                full.add(m, s)
+            zset = self._convert(key, self.sorted_sets, full, ZSET_BYTES + sum(
+                ZSET_MEMBER_BYTES + sys.getsizeof(m) for m in full.scores))
+        if zset.encoding == "listpack":
+            before = zset.nbytes
+            added = zset.add(member, score)
+            self._charge(key, zset.nbytes - before)
+            return int(added)
+        if not zset.add(member, score):
+            return 0
+        self._charge(key, ZSET_MEMBER_BYTES + sys.getsizeof(member))
+        return 1
+
+    def _zrem(self, key, member):
+        zset = self.sorted_sets.get(key)
+        if zset is None:
+            return 0
+        before = zset.nbytes if zset.encoding == "listpack" else None
+        if not zset.remove(member):
+            return 0
+        if not zset:
+            self._delete(key)
+        elif before is not None:
+            self._charge(key, zset.nbytes - before)
+        else:
+            self._charge(key, -(ZSET_MEMBER_BYTES + sys.getsizeof(member)))
+        return 1
+
+    def zadd(self, key, member, score, *more):
+        """
+        Simulate adding to a Sorted Set (Leaderboard). `more` = further member, score
+        pairs, added by the same call. Returns how many members are new. O(log n) each
+        """
+        if len(more) % 2:
+            raise ValueError("zadd takes member, score pairs")
+        self._make_room()
+        self._lookup(key, write=True)
+        added = self._zadd(key, member, score)
+        for i in range(0, len(more), 2):
+            added += self._zadd(key, more[i], more[i + 1])
+        self._propagate("ZADD", key, member, score, *more)
+        return added
+
+    def zincrby(self, key, member, amount):
+        """Adds amount to member's score (from 0 if new). Returns the new score. O(log n)"""
+        self._make_room()
+        self._typed(key, self.sorted_sets, write=True)
+        old = self._zset(key).score(member)
+        score = (0 if old is None else old) + amount
+        self._zadd(key, member, score)
+        self._propagate("ZADD", key, member, score)
+        return score
+
+    def zrem(self, key, member):
+        """Returns 1 if member was removed. An emptied set is deleted, like in Redis."""
+        self._typed(key, self.sorted_sets, write=True)
+        removed = self._zrem(key, member)
+        if removed:
+            self._propagate("ZREM", key, member)
+        return removed
+
+    def zscore(self, key, member):
+        zset = self._typed(key, self.sorted_sets)
+        return None if zset is None else zset.score(member)
+
+    def zcard(self, key):
+        return len(self._typed(key, self.sorted_sets) or ())
+
+    def zrank(self, key, member):
+        """0-based rank by ascending score, or None. O(log n)"""
+        zset = self._typed(key, self.sorted_sets)
+        return None if zset is None else zset.rank(member)
+
+    def zrevrank(self, key, member):
+        """0-based rank by descending score (0 = the leader), or None. O(log n)"""
+        zset = self._typed(key, self.sorted_sets)
+        return None if zset is None else zset.rank(member, reverse=True)
+
+    def zrange(self, key, start, end):
+        """[(member, score)] by ascending score, ranks start..end inclusive (-1 = last). O(log n + k)"""
+        zset = self._typed(key, self.sorted_sets)
+        return [] if zset is None else zset.range_by_rank(start, end)
+
     def zrevrange(self, key, start, end):
-        """Simulate getting top players (Sorted by score desc)"""
-        if key not in self.sorted_sets:
-            return []
-        # Sort by score descending
-        sorted_items = sorted(self.sorted_sets[key].items(), key=lambda x: x[1], reverse=True)
-        return sorted_items[start:end+1]
+        """Simulate getting top players (Sorted by score desc). O(log n + k), no sorting"""
+        zset = self._typed(key, self.sorted_sets)
+        return [] if zset is None else zset.range_by_rank(start, end, reverse=True)
+
+    def zrangebyscore(self, key, min_score, max_score, offset=0, count=None):
+        """[(member, score)] with min_score <= score <= max_score, ascending. O(log n + offset + k)"""
+        zset = self._typed(key, self.sorted_sets)
+        return [] if zset is None else zset.range_by_score(min_score, max_score, offset, count)
+
+    def zremrangebyscore(self, key, min_score, max_score):
+        """Removes members with min_score <= score <= max_score. Returns how many. O(log n + k log n)"""
+        zset = self._typed(key, self.sorted_sets, write=True)
+        if zset is None:
+            return 0
+        doomed = zset.range_by_score(min_score, max_score)
+        for member, _ in doomed:
+            self._zrem(key, member)
+            self._propagate("ZREM", key, member)
+        return len(doomed)
+
+    # --- Hashes ---
+
+    def _hash(self, key):
+        """key's hash, created (and charged for) if missing: a ListpackHash while small."""
+        fields = self.hashes.get(key)
+        if fields is None:
+            self._check_type(key, self.hashes)
+            fields = self.hashes[key] = ListpackHash() if self.hash_max_listpack_entries else {}
+            self._charge(key, DICT_ENTRY_BYTES + sys.getsizeof(key) +
+                         (HASH_BYTES if type(fields) is dict else fields.nbytes))
+        return fields
+
+    def _hset(self, key, field, value):
+        fields = self._hash(key)
+        if type(fields) is ListpackHash and (
+                _too_long(field, self.hash_max_listpack_value) or _too_long(value, self.hash_max_listpack_value) or
+                len(fields) >= self.hash_max_listpack_entries and field not in fields):
+            full = dict(fields.items())
+            fields = self._convert(key, self.hashes, full, HASH_BYTES + sum(
+                DICT_ENTRY_BYTES + sys.getsizeof(f) + sys.getsizeof(v) for f, v in full.items()))
+        if type(fields) is ListpackHash:
+            before = fields.nbytes
+            new = fields.set(field, value)
+            self._charge(key, fields.nbytes - before)
+            return int(new)
+        new = field not in fields
+        old = DICT_ENTRY_BYTES + sys.getsizeof(field) if new else sys.getsizeof(fields[field])
+        fields[field] = value
+        self._charge(key, sys.getsizeof(value) + old if new else sys.getsizeof(value) - old)
+        return int(new)
+
+    def _hdel(self, key, field):
+        fields = self.hashes.get(key)
+        if fields is None or field not in fields:
+            return 0
+        before = fields.nbytes if type(fields) is ListpackHash else None
+        value = fields.pop(field)
+        if not fields:
+            self._delete(key)
+        elif before is not None:
+            self._charge(key, fields.nbytes - before)
+        else:
+            self._charge(key, -(DICT_ENTRY_BYTES + sys.getsizeof(field) + sys.getsizeof(value)))
+        return 1
+
+    def hset(self, key, field, value, *more):
+        """Sets field to value (`more` = further field, value pairs). Returns how many fields are new."""
+        if len(more) % 2:
+            raise ValueError("hset takes field, value pairs")
+        self._make_room()
+        self._lookup(key, write=True)
+        added = self._hset(key, field, value)
+        for i in range(0, len(more), 2):
+            added += self._hset(key, more[i], more[i + 1])
+        self._propagate("HSET", key, field, value, *more)
+        return added
+
+    def hget(self, key, field):
+        fields = self._typed(key, self.hashes)
+        return None if fields is None else fields.get(field)
+
+    def hgetall(self, key):
+        """{field: value}"""
+        return dict((self._typed(key, self.hashes) or {}).items())
+
+    def hdel(self, key, *fields):
+        """Returns how many of fields were removed. An emptied hash is deleted."""
+        self._typed(key, self.hashes, write=True)
+        removed = [field for field in fields if self._hdel(key, field)]
+        if removed:
+            self._propagate("HDEL", key, *removed)
+        return len(removed)
+
+    def hlen(self, key):
+        return len(self._typed(key, self.hashes) or ())
+
+    def hexists(self, key, field):
+        return int(field in (self._typed(key, self.hashes) or ()))
+
+    def hincrby(self, key, field, amount):
+        """Adds amount to field (from 0 if new). Returns the new value."""
+        self._make_room()
+        value = int((self._typed(key, self.hashes, write=True) or {}).get(field, 0)) + amount
+        self._hset(key, field, value)
+        self._propagate("HSET", key, field, value)
+        return value
+
+    # --- Sets ---
+
+    def _members(self, key, member):
+        """key's set, created (and charged for) if missing: an IntSet while it only holds small integers."""
+        members = self.sets.get(key)
+        if members is None:
+            self._check_type(key, self.sets)
+            members = self.sets[key] = IntSet() if self.set_max_intset_entries and intset_member(member) else set()
+            self._charge(key, DICT_ENTRY_BYTES + sys.getsizeof(key) +
+                         (SET_BYTES if type(members) is set else members.nbytes))
+        return members
+
+    def _sadd(self, key, member):
+        members = self._members(key, member)
+        if type(members) is IntSet and (
+                not intset_member(member) or
+                len(members) >= self.set_max_intset_entries and member not in members):
+            full = set(members)
+            members = self._convert(key, self.sets, full, SET_BYTES + sum(
+                SET_ENTRY_BYTES + sys.getsizeof(m) for m in full))
+        if member in members:
+            return 0
+        if type(members) is IntSet:
+            before = members.nbytes
+            members.add(member)
+            self._charge(key, members.nbytes - before)
+        else:
+            members.add(member)
+            self._charge(key, SET_ENTRY_BYTES + sys.getsizeof(member))
+        return 1
+
+    def _srem(self, key, member):
+        members = self.sets.get(key)
+        if members is None or member not in members:
+            return 0
+        before = members.nbytes if type(members) is IntSet else None
+        members.discard(member)
+        if not members:
+            self._delete(key)
+        elif before is not None:
+            self._charge(key, members.nbytes - before)
+        else:
+            self._charge(key, -(SET_ENTRY_BYTES + sys.getsizeof(member)))
+        return 1
+
+    def sadd(self, key, *members):
+        """Returns how many of members are new."""
+        self._make_room()
+        self._lookup(key, write=True)
+        added = [member for member in members if self._sadd(key, member)]
+        if added:
+            self._propagate("SADD", key, *added)
+        return len(added)
+
+    def srem(self, key, *members):
+        """Returns how many of members were removed. An emptied set is deleted."""
+        self._typed(key, self.sets, write=True)
+        removed = [member for member in members if self._srem(key, member)]
+        if removed:
+            self._propagate("SREM", key, *removed)
+        return len(removed)
+
+    def sismember(self, key, member):
+        return int(member in (self._typed(key, self.sets) or ()))
+
+    def smembers(self, key):
+        return set(self._typed(key, self.sets) or ())
+
+    def scard(self, key):
+        return len(self._typed(key, self.sets) or ())
+
+    def object_encoding(self, key):
+        """How key's value is stored, like OBJECT ENCODING: e.g. "listpack" until it grows, then "skiplist"."""
+        if not self._lookup(key):
+            return None
+        if key in self.store:
+            value = self.store[key]
+            return "int" if type(value) is int else "embstr" if len(str(value)) <= 44 else "raw"
+        for table in (self.sorted_sets, self.hashes, self.sets):
+            if key in table:
+                return getattr(table[key], "encoding", "hashtable")
 
     def incr(self, key):
-        """Simulate incrementing a counter"""
-        self.store[key] = self.store.get(key, 0) + 1
-        return self.store[key]
+        """Simulate incrementing a counter (keeps its TTL, like INCR). A string holding an integer counts too."""
+        self._make_room()
+        old = self._typed(key, self.store, write=True) # Only SET/MSET replace a key of another type
+        value = int(0 if old is None else old) + 1
+        self._set_string(key, value)
+        self._propagate("SET", key, value, self.expires.deadlines.get(key))
+        return value
 
     def expire(self, key, seconds):
-        """Simulate setting an expiration (Mock)"""
-        print(f"[Redis] Key '{key}' will expire in {seconds}s")
+        """Sets a TTL. Returns 1, or 0 if the key does not exist."""
+        if not self._lookup(key, write=True):
+            return 0
+        if seconds <= 0:
+            self._delete(key)
+            self._propagate("DEL", key)
+        else:
+            self.expires.set(key, time.time() + seconds)
+            self._propagate("EXPIREAT", key, self.expires.deadlines[key])
+        return 1
+
+    def ttl(self, key):
+        """Seconds left to live: -1 if the key has no TTL, -2 if it does not exist."""
+        if not self._lookup(key):
+            return -2
+        deadline = self.expires.deadlines.get(key)
+        return -1 if deadline is None else round(deadline - time.time())
+
+    def pttl(self, key):
+        """Like ttl(), in milliseconds."""
+        if not self._lookup(key):
+            return -2
+        deadline = self.expires.deadlines.get(key)
+        return -1 if deadline is None else max(int((deadline - time.time()) * 1000), 1)
+
+    def persist(self, key):
+        """Removes the TTL. Returns 1 if there was one."""
+        self._lookup(key, write=True)
+        if key not in self.expires.deadlines:
+            return 0
+        self.expires.discard(key)
+        self._propagate("PERSIST", key)
+        return 1
+
+    def delete(self, key):
+        """Returns 1 if the key existed."""
+        self._lookup(key, write=True)
+        if not self._delete(key):
+            return 0
+        self._propagate("DEL", key)
+        return 1
+
+    def mdel(self, *keys):
+        """Deletes every key (DEL k1 k2 ...). Returns how many existed."""
+        now = self._now()
+        deleted = [key for key in keys if self._lookup(key, write=True, now=now) and self._delete(key)]
+        if deleted:
+            self._propagate("DEL", *deleted)
+        return len(deleted)
+
+    def exists(self, key):
+        return int(self._lookup(key))
+
+    def dump(self, key):
+        """The key's value serialized (like DUMP; the TTL is not included), or None."""
+        if not self._lookup(key):
+            return None
+        out = bytearray()
+        if key in self.sorted_sets:
+            encode_value((RDB_TYPE_ZSET, tuple(self.sorted_sets[key].items())), out)
+        elif key in self.hashes:
+            encode_value((RDB_TYPE_HASH, tuple(self.hashes[key].items())), out)
+        elif key in self.sets:
+            encode_value((RDB_TYPE_SET, tuple(self.sets[key])), out)
+        else:
+            encode_value((RDB_TYPE_STRING, self.store[key]), out)
+        return bytes(out)
+
+    def restore(self, key, payload, ttl=None, replace=False):
+        """Recreates a key from dump() output, with ttl seconds to live (None = no TTL). False if it exists."""
+        (kind, value), _ = decode_value(payload, 0)
+        self._make_room()
+        if self._lookup(key, write=True):
+            if not replace:
+                return False
+            self._delete(key)
+            self._propagate("DEL", key)
+        self._load_value(kind, key, value)
+        if ttl is not None:
+            self.expires.set(key, time.time() + ttl)
+        if kind == RDB_TYPE_STRING:
+            self._propagate("SET", key, value, self.expires.deadlines.get(key))
+            return True
+        if kind == RDB_TYPE_SET:
+            self._propagate("SADD", key, *value)
+        else:
+            self._propagate("ZADD" if kind == RDB_TYPE_ZSET else "HSET", key, *(x for pair in value for x in pair))
+        if ttl is not None:
+            self._propagate("EXPIREAT", key, self.expires.deadlines[key])
+        return True
+
+    def keys_in_slot(self, slot, count):
+        """Up to count keys hashing to slot (cluster mode), like CLUSTER GETKEYSINSLOT."""
+        return list(itertools.islice(self.slot_keys[slot], count))
+
+    def count_keys_in_slot(self, slot):
+        return len(self.slot_keys[slot])
+
+    def dbsize(self):
+        """Keys held in memory, including expired ones nothing has reclaimed yet."""
+        return len(self.store) + len(self.sorted_sets) + len(self.hashes) + len(self.sets)
+
+
+class Pipeline:
+    """
+    Queues commands instead of running them: pipe.set(...).incr(...) records
+    both, and execute() runs them back to back inside one batch() and returns
+    their results in order. Over a network that is one round trip; in
+    process, one AOF write. Not a transaction: a failing command does not
+    stop the others (its exception takes its place in the results).
+    """
+
+    def __init__(self, redis):
+        self.redis = redis
+        self._commands = []
+
+    def __getattr__(self, name):
+        if name.startswith("_") or not callable(getattr(MockRedis, name, None)):
+            raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+        command = getattr(self.redis, name)
+        commands = self._commands
+
+        def queue(*args, **kwargs):
+            commands.append((command, args, kwargs))
+            return self
+        return queue
+
+    def __len__(self):
+        return len(self._commands)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._commands.clear()
+
+    def execute(self, raise_on_error=True):
+        """Runs the queued commands; with raise_on_error, re-raises the first failure after all ran."""
+        commands = self._commands[:]
+        self._commands.clear()
+        results = []
+        with self.redis.batch():
+            for command, args, kwargs in commands:
+                try:
+                    results.append(command(*args, **kwargs))
+                except Exception as e:
+                    results.append(e)
+        if raise_on_error:
+            for result in results:
+                if isinstance(result, Exception):
+                    raise result
+        return results
 
 # --- 1. Caching Demo ---
 
@@ -81,6 +1199,18 @@ def caching_demo():
     print(f"Time Taken: {time.time() - start:.4f}s")
     print("Notice: The second request was instant!")
 
+    # Thundering herd: a popular key is missing and many requests arrive at once
+    herd = 10
+    print(f"\nRequest 3: {herd} concurrent requests for User 102 (not cached yet)")
+    loader = CacheLoader(redis, get_user_from_db, ttl=60, stale_ttl=300)
+    start = time.time()
+    with ThreadPoolExecutor(herd) as pool:
+        results = list(pool.map(loader.get, [102] * herd))
+    loader.close()
+    print(f"[App] {len(results)} requests served by {loader.stats['loads']} DB call ({loader.stats['coalesced']} waited for it)")
+    print(f"Time Taken: {time.time() - start:.2f}s")
+    print("Notice: Plain cache-aside would have sent all of them to the DB!")
+
 # --- 2. Leaderboard Demo ---
 
 def leaderboard_demo():
@@ -89,10 +1219,7 @@ def leaderboard_demo():
     key = "game_scores"
     
     print("[Game] Adding players...")
-    redis.zadd(key, "Alice", 100)
-    redis.zadd(key, "Bob", 500)
-    redis.zadd(key, "Charlie", 300)
-    redis.zadd(key, "Dave", 1200)
+    redis.zadd(key, "Alice", 100, "Bob", 500, "Charlie", 300, "Dave", 1200) # One call (one round trip) for all four
     
     print("[Game] Fetching Top 3 Players...")
     top_players = redis.zrevrange(key, 0, 2)
@@ -102,6 +1229,24 @@ def leaderboard_demo():
         
     print("Notice: Redis sorted them automatically!")
 
+    redis.zincrby(key, "Alice", 1000) # Alice scores big
+    print(f"[Game] Alice is now #{redis.zrevrank(key, 'Alice') + 1} with {redis.zscore(key, 'Alice')} pts")
+    print(f"[Game] Players between 250 and 1000 pts: {redis.zrangebyscore(key, 250, 1000)}")
+
+    # A pipeline queues commands and sends them as one batch; results come back in order
+    pipe = redis.pipeline()
+    for player in ("Bob", "Charlie", "Dave"):
+        pipe.zincrby(key, player, 50) # Round bonus
+    pipe.zrevrange(key, 0, 0)
+    results = pipe.execute()
+    print(f"[Game] After the round bonus ({len(results) - 1} updates in the same batch), "
+          f"the leader is {results[-1][0][0]}")
+
+    # Small boards live in one packed buffer; past zset_max_listpack_entries they become a skiplist
+    print(f"[Redis] OBJECT ENCODING {key}: {redis.object_encoding(key)}")
+    redis.zadd(key, *[x for i in range(redis.zset_max_listpack_entries) for x in (f"bot:{i}", i)])
+    print(f"[Redis] ...and with {redis.zcard(key)} players: {redis.object_encoding(key)}")
+
 # --- 3. Rate Limiter Demo ---
 
 def rate_limiter_demo():
@@ -109,16 +1254,18 @@ def rate_limiter_demo():
     redis = MockRedis()
     user_ip = "192.168.1.1"
     limit = 5
+    window = 1 # Seconds (a minute in real life; shortened so the demo shows the reset)
     
-    print(f"[API] Limit is {limit} requests per minute.")
+    print(f"[API] Limit is {limit} requests per {window}s.")
     
-    for i in range(1, 11):
+    for i in range(1, 16):
         # 1. Increment the counter for this IP
         count = redis.incr(user_ip)
         
         # 2. If it's the first request, set expiration (window)
         if count == 1:
-            redis.expire(user_ip, 60)
+            redis.expire(user_ip, window)
+            print(f"[Redis] Key '{user_ip}' will expire in {window}s")
             
         # 3. Check limit
         if count > limit:
@@ -128,7 +1275,50 @@ def rate_limiter_demo():
         
         time.sleep(0.1)
 
+    # 4. The fixed window's weak spot: a burst on both sides of a window edge
+    window = 60
+    edge = time.time() // window * window + window # The next window boundary
+    burst = [edge - 0.1] * limit + [edge + 0.1] * limit
+    print(f"\n[Attacker] {limit} requests just before a window edge, {limit} just after (limit {limit}/{window}s):")
+    for name, limiter_class in LIMITERS.items():
+        limiter = limiter_class(MockRedis(), limit, window)
+        allowed = sum(limiter.allow(user_ip, now=t) for t in burst)
+        print(f"{'🛑' if allowed > limit else '✅'} {name:>15}: {allowed} of {len(burst)} allowed within 0.2s")
+
+# --- 4. Persistence Demo ---
+
+def persistence_demo():
+    print("\n--- 4. Persistence Demo (RDB Snapshot + AOF) ---")
+    data_dir = "redis_data"
+    shutil.rmtree(data_dir, ignore_errors=True)
+
+    # 1. Warm the cache once, then snapshot it in a forked child
+    redis = MockRedis(dir=data_dir)
+    redis.set(101, get_user_from_db(101))
+    redis.bgsave()
+    redis.close() # Waits for the child
+    print(f"[Redis] BGSAVE wrote {RDB_FILE} (fork took {redis.stats['latest_fork_usec']} us)")
+
+    # 2. Restart: the cache comes back from the snapshot, no DB call
+    redis = MockRedis(dir=data_dir, appendonly=True)
+    print(f"[App] After restart: {redis.get(101)} (loaded in {redis.stats['loading_seconds'] * 1000:.2f} ms)")
+
+    # 3. The AOF logs every write, so even writes after the last snapshot survive
+    for _ in range(1000):
+        redis.incr("page_views")
+    redis.close()
+    redis = MockRedis(dir=data_dir, appendonly=True)
+    print(f"[App] page_views after restart: {redis.get('page_views')} (replayed 1000 INCRs)")
+
+    # 4. Rewrite: 1000 log records become one key in a fresh base snapshot
+    before = sorted(os.listdir(data_dir))
+    redis.bgrewriteaof()
+    redis.close()
+    print(f"[Redis] BGREWRITEAOF: {before} -> {sorted(os.listdir(data_dir))}")
+    shutil.rmtree(data_dir)
+
 if __name__ == "__main__":
     caching_demo()
     leaderboard_demo()
     rate_limiter_demo()
+    persistence_demo()
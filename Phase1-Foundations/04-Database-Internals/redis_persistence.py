@@ -0,0 +1,305 @@
+import json
+import os
+import struct
+import threading
+import zlib
+
+# --- Typed values: keys, values, members and scores keep their Python type across a restart ---
+T_NONE, T_STR, T_BYTES, T_INT, T_FLOAT, T_BIGINT, T_TUPLE = range(7)
+LEN = struct.Struct("<I")
+INT = struct.Struct("<q")
+FLOAT = struct.Struct("<d")
+
+
+def encode_value(value, out):
+    """Appends value to the bytearray out as [type]([length])[data]."""
+    t = type(value)
+    if t is str:
+        data = value.encode("utf-8", "surrogateescape")
+        out.append(T_STR)
+        out += LEN.pack(len(data))
+        out += data
+    elif t is int:
+        if -2**63 <= value < 2**63:
+            out.append(T_INT)
+            out += INT.pack(value)
+        else:
+            data = str(value).encode()
+            out.append(T_BIGINT)
+            out += LEN.pack(len(data))
+            out += data
+    elif t is float:
+        out.append(T_FLOAT)
+        out += FLOAT.pack(value)
+    elif t is bytes:
+        out.append(T_BYTES)
+        out += LEN.pack(len(value))
+        out += value
+    elif value is None:
+        out.append(T_NONE)
+    elif t is tuple:
+        out.append(T_TUPLE)
+        out += LEN.pack(len(value))
+        for item in value:
+            encode_value(item, out)
+    else:
+        raise TypeError(f"cannot persist a {t.__name__}")
+
+
+def decode_value(buf, pos):
+    """(value, next pos)"""
+    t = buf[pos]
+    pos += 1
+    if t == T_STR or t == T_BIGINT:
+        (length,) = LEN.unpack_from(buf, pos)
+        pos += LEN.size
+        text = str(buf[pos:pos + length], "utf-8", "surrogateescape")
+        return (text if t == T_STR else int(text)), pos + length
+    if t == T_INT:
+        return INT.unpack_from(buf, pos)[0], pos + INT.size
+    if t == T_FLOAT:
+        return FLOAT.unpack_from(buf, pos)[0], pos + FLOAT.size
+    if t == T_BYTES:
+        (length,) = LEN.unpack_from(buf, pos)
+        pos += LEN.size
+        return bytes(buf[pos:pos + length]), pos + length
+    if t == T_NONE:
+        return None, pos
+    if t == T_TUPLE:
+        (length,) = LEN.unpack_from(buf, pos)
+        pos += LEN.size
+        items = []
+        for _ in range(length):
+            item, pos = decode_value(buf, pos)
+            items.append(item)
+        return tuple(items), pos
+    raise ValueError(f"unknown value type {t}")
+
+
+# --- RDB-style snapshot: one compact binary file of the whole dataset at one point in time ---
+#   [magic] then per key: ([EXPIRETIME][deadline]) [type] [key] [value]
+#   then [EOF] [crc32 of everything before it]
+RDB_MAGIC = b"MOCKRDB1"
+RDB_TYPE_STRING = 0
+RDB_TYPE_SET = 2
+RDB_TYPE_ZSET = 3
+RDB_TYPE_HASH = 4
+RDB_OPCODE_EXPIRETIME = 0xFC  # Followed by the Unix time the next key expires at
+RDB_OPCODE_EOF = 0xFF
+CHUNK_SIZE = 1024 * 1024      # Bytes buffered between file writes
+
+
+def write_snapshot(path, items):
+    """
+    Writes (type, key, value, deadline) items to path. A zset's value is a sized
+    iterable of (member, score) pairs, a hash's of (field, value) pairs and a
+    set's of members. Written to a temp file, fsynced, then renamed over path,
+    so a crash mid-save leaves the previous snapshot intact.
+    """
+    tmp = f"{path}.tmp-{os.getpid()}"
+    crc = 0
+    out = bytearray(RDB_MAGIC)
+    with open(tmp, "wb") as f:
+        for kind, key, value, deadline in items:
+            if deadline is not None:
+                out.append(RDB_OPCODE_EXPIRETIME)
+                out += FLOAT.pack(deadline)
+            out.append(kind)
+            encode_value(key, out)
+            if kind == RDB_TYPE_ZSET or kind == RDB_TYPE_HASH:
+                out += LEN.pack(len(value))
+                for member, score in value:
+                    encode_value(member, out)
+                    encode_value(score, out)
+            elif kind == RDB_TYPE_SET:
+                out += LEN.pack(len(value))
+                for member in value:
+                    encode_value(member, out)
+            else:
+                encode_value(value, out)
+            if len(out) >= CHUNK_SIZE:
+                crc = zlib.crc32(out, crc)
+                f.write(out)
+                out = bytearray()
+        out.append(RDB_OPCODE_EOF)
+        crc = zlib.crc32(out, crc)
+        out += LEN.pack(crc)
+        f.write(out)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def read_snapshot(path):
+    """Yields (type, key, value, deadline) for every key in a snapshot. Checks the checksum first."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(RDB_MAGIC):
+        raise ValueError(f"{path} is not a snapshot")
+    body_end = len(data) - LEN.size
+    if body_end < len(RDB_MAGIC) + 1 or data[body_end - 1] != RDB_OPCODE_EOF:
+        raise ValueError(f"{path} is truncated")
+    if zlib.crc32(memoryview(data)[:body_end]) != LEN.unpack_from(data, body_end)[0]:
+        raise ValueError(f"{path} is corrupt (checksum mismatch)")
+
+    with memoryview(data) as buf:
+        pos = len(RDB_MAGIC)
+        end = body_end - 1
+        while pos < end:
+            deadline = None
+            if buf[pos] == RDB_OPCODE_EXPIRETIME:
+                (deadline,) = FLOAT.unpack_from(buf, pos + 1)
+                pos += 1 + FLOAT.size
+            kind = buf[pos]
+            key, pos = decode_value(buf, pos + 1)
+            if kind == RDB_TYPE_ZSET or kind == RDB_TYPE_HASH:
+                (count,) = LEN.unpack_from(buf, pos)
+                pos += LEN.size
+                value = []
+                for _ in range(count):
+                    member, pos = decode_value(buf, pos)
+                    score, pos = decode_value(buf, pos)
+                    value.append((member, score))
+            elif kind == RDB_TYPE_SET:
+                (count,) = LEN.unpack_from(buf, pos)
+                pos += LEN.size
+                value = []
+                for _ in range(count):
+                    member, pos = decode_value(buf, pos)
+                    value.append(member)
+            elif kind == RDB_TYPE_STRING:
+                value, pos = decode_value(buf, pos)
+            else:
+                raise ValueError(f"unknown key type {kind}")
+            yield kind, key, value, deadline
+
+
+# --- AOF: every write command, appended as it happens ---
+# Record framing, like the LSM tree's WAL: [crc32 of payload][payload length][payload = typed args]
+RECORD_HEADER = struct.Struct("<II")
+
+# appendfsync policies
+FSYNC_ALWAYS = "always"      # fsync after every write: nothing acknowledged is ever lost
+FSYNC_EVERYSEC = "everysec"  # A background thread fsyncs once a second: a power cut loses <= ~1s
+FSYNC_NO = "no"              # Hand the bytes to the OS and let it flush when it likes
+FSYNC_POLICIES = (FSYNC_ALWAYS, FSYNC_EVERYSEC, FSYNC_NO)
+
+# Multi-part AOF (Redis 7): one base snapshot plus the incremental logs written since, listed here
+AOF_MANIFEST = "appendonly.aof.manifest"
+
+
+def encode_record(args):
+    payload = bytearray()
+    for arg in args:
+        encode_value(arg, payload)
+    return RECORD_HEADER.pack(zlib.crc32(payload), len(payload)) + payload
+
+
+def read_aof(path):
+    """
+    Yields (args, end offset) for every intact record, in log order. Stops at
+    the first torn or corrupt record: that is where the crash happened.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    pos = 0
+    with memoryview(data) as buf:
+        while pos + RECORD_HEADER.size <= len(data):
+            crc, length = RECORD_HEADER.unpack_from(buf, pos)
+            start, end = pos + RECORD_HEADER.size, pos + RECORD_HEADER.size + length
+            if end > len(data) or zlib.crc32(buf[start:end]) != crc:
+                return
+            args, p = [], start
+            while p < end:
+                arg, p = decode_value(buf, p)
+                args.append(arg)
+            pos = end
+            yield args, pos
+
+
+def read_manifest(directory):
+    """The AOF manifest ({"seq", "base", "incr"}), or None if there is no AOF yet."""
+    path = os.path.join(directory, AOF_MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_manifest(directory, manifest):
+    """Replaces the manifest atomically: a restart sees either the old file list or the new one."""
+    path = os.path.join(directory, AOF_MANIFEST)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class AppendOnlyFile:
+    """
+    The open incremental AOF. Each write() is one unbuffered write(2), so a
+    crash of this process never loses an acknowledged command; only the
+    fsync policy decides what a power cut can take.
+    """
+
+    def __init__(self, filename, policy=FSYNC_EVERYSEC):
+        if policy not in FSYNC_POLICIES:
+            raise ValueError(f"appendfsync must be one of {FSYNC_POLICIES}")
+        self.filename = filename
+        self.policy = policy
+        self._file = open(filename, "ab", buffering=0)
+        self.size = self._file.tell()
+        self._unsynced = False
+        self._file_lock = threading.Lock()  # The everysec syncer vs rotate() and close()
+        self.stats = {"records": 0, "bytes": 0, "fsyncs": 0}
+
+        self._closed = threading.Event()
+        if policy == FSYNC_EVERYSEC:
+            self._syncer = threading.Thread(target=self._sync_loop, daemon=True)
+            self._syncer.start()
+
+    def write(self, args):
+        self._append(encode_record(args), 1)
+
+    def write_many(self, commands):
+        """Logs a batch of commands with one write(2), and one fsync under FSYNC_ALWAYS."""
+        self._append(b"".join(encode_record(args) for args in commands), len(commands))
+
+    def _append(self, data, records):
+        self._file.write(data)
+        self.size += len(data)
+        self.stats["records"] += records
+        self.stats["bytes"] += len(data)
+        if self.policy == FSYNC_ALWAYS:
+            os.fsync(self._file.fileno())
+            self.stats["fsyncs"] += 1
+        else:
+            self._unsynced = True
+
+    def rotate(self, filename):
+        """Makes the current file durable and continues in a fresh one."""
+        with self._file_lock:
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self.filename = filename
+            self._file = open(filename, "ab", buffering=0)
+            self.size = self._file.tell()
+            self._unsynced = False
+
+    def _sync_loop(self):
+        while not self._closed.wait(1.0):
+            with self._file_lock:
+                if self._unsynced:
+                    self._unsynced = False
+                    os.fsync(self._file.fileno())
+                    self.stats["fsyncs"] += 1
+
+    def close(self):
+        self._closed.set()
+        if self.policy == FSYNC_EVERYSEC:
+            self._syncer.join()
+        with self._file_lock:
+            os.fsync(self._file.fileno())
+            self._file.close()
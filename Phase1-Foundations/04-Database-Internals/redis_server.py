@@ -0,0 +1,598 @@
+import argparse
+import asyncio
+import struct
+
+from redis_demo import HZ, MAXMEMORY_POLICIES, MAXMEMORY_SAMPLES, MockRedis, OutOfMemoryError, WrongTypeError
+from redis_persistence import FSYNC_EVERYSEC, FSYNC_POLICIES
+
+DEFAULT_PORT = 6380      # Not 6379, so it never collides with a real Redis
+READ_SIZE = 64 * 1024    # Free space offered to each socket read
+CRLF = b"\r\n"
+INCOMPLETE = object()    # The rest of this message has not arrived yet
+OK = b"+OK\r\n"
+NIL = b"$-1\r\n"
+
+
+class ProtocolError(Exception):
+    pass
+
+
+class CommandError(Exception):
+    """Becomes an -ERR reply; the connection stays open."""
+
+
+class ReplyError(Exception):
+    """An error reply, as seen by a client."""
+
+
+# --- RESP2 encoding ---
+
+def encode_bulk(value):
+    data = value if isinstance(value, bytes) else str(value).encode("utf-8", "surrogateescape")
+    return b"$%d\r\n%s\r\n" % (len(data), data)
+
+
+def encode_reply(value):
+    """None -> nil, int -> integer, list/tuple -> array, anything else -> bulk string."""
+    if value is None:
+        return NIL
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, (list, tuple)):
+        return b"*%d\r\n" % len(value) + b"".join(encode_reply(v) for v in value)
+    return encode_bulk(value)
+
+
+def encode_command(*args):
+    """A request, as clients send it: an array of bulk strings."""
+    return b"*%d\r\n" % len(args) + b"".join(encode_bulk(a) for a in args)
+
+
+def format_score(score):
+    """Scores go over the wire as strings; 1100.0 is sent as "1100", like Redis does."""
+    score = float(score)
+    return str(int(score)) if score.is_integer() else repr(score)
+
+
+# --- RESP2 parsing, straight out of the receive buffer ---
+
+def parse_command(buf, view, pos, end):
+    """
+    One request from buf[pos:end]: (args, next pos), or (INCOMPLETE, pos).
+    Only the arguments themselves are copied (decoded straight out of the
+    memoryview); lengths and delimiters are read in place.
+    """
+    if buf[pos] == 0x2A:  # "*": an array of bulk strings
+        line_end = buf.find(CRLF, pos, end)
+        if line_end < 0:
+            return INCOMPLETE, pos
+        p = line_end + 2
+        args = []
+        for _ in range(int(buf[pos + 1:line_end])):
+            if p >= end:
+                return INCOMPLETE, pos
+            if buf[p] != 0x24:  # "$"
+                raise ProtocolError(f"expected '$', got {chr(buf[p])!r}")
+            line_end = buf.find(CRLF, p, end)
+            if line_end < 0:
+                return INCOMPLETE, pos
+            start = line_end + 2
+            p = start + int(buf[p + 1:line_end]) + 2
+            if p > end:
+                return INCOMPLETE, pos
+            args.append(str(view[start:p - 2], "utf-8", "surrogateescape"))
+        return args, p
+    # Inline command ("PING\r\n" from telnet, or redis-benchmark's PING_INLINE)
+    line_end = buf.find(b"\n", pos, end)
+    if line_end < 0:
+        return INCOMPLETE, pos
+    return str(view[pos:line_end], "utf-8", "surrogateescape").split(), line_end + 1
+
+
+def parse_reply(buf, view, pos, end):
+    """One reply from buf[pos:end]: (value, next pos), or (INCOMPLETE, pos). Errors come back as ReplyError."""
+    line_end = buf.find(CRLF, pos, end)
+    if line_end < 0:
+        return INCOMPLETE, pos
+    kind = buf[pos]
+    if kind == 0x2B:  # "+"
+        return str(view[pos + 1:line_end], "utf-8"), line_end + 2
+    if kind == 0x2D:  # "-"
+        return ReplyError(str(view[pos + 1:line_end], "utf-8")), line_end + 2
+    if kind == 0x3A:  # ":"
+        return int(buf[pos + 1:line_end]), line_end + 2
+    n = int(buf[pos + 1:line_end])
+    if kind == 0x24:  # "$"
+        if n < 0:
+            return None, line_end + 2
+        start, p = line_end + 2, line_end + 2 + n + 2
+        if p > end:
+            return INCOMPLETE, pos
+        return str(view[start:p - 2], "utf-8", "surrogateescape"), p
+    if kind == 0x2A:  # "*"
+        if n < 0:
+            return None, line_end + 2
+        items, p = [], line_end + 2
+        for _ in range(n):
+            item, p = parse_reply(buf, view, p, end)
+            if item is INCOMPLETE:
+                return INCOMPLETE, pos
+            items.append(item)
+        return items, p
+    raise ProtocolError(f"unknown reply type {chr(kind)!r}")
+
+
+# --- Commands: MockRedis behind the Redis wire protocol ---
+
+def _int(value):
+    try:
+        return int(value)
+    except ValueError:
+        raise CommandError("value is not an integer or out of range") from None
+
+
+def _float(value):
+    try:
+        return float(value)
+    except ValueError:
+        raise CommandError("value is not a valid float") from None
+
+
+def _score_bound(value):
+    """ZRANGEBYSCORE bounds: "-inf", "+inf", "5", or "(5" for exclusive. Returns (score, exclusive)."""
+    exclusive = value.startswith("(")
+    return _float(value[1:] if exclusive else value), exclusive
+
+
+def _with_scores(pairs, with_scores):
+    if not with_scores:
+        return [member for member, _ in pairs]
+    return [item for member, score in pairs for item in (member, format_score(score))]
+
+
+def cmd_ping(server, args):
+    return b"+PONG\r\n" if not args else encode_bulk(args[0])
+
+
+def cmd_set(server, args):
+    key, value, *options = args
+    ex = None
+    while options:
+        option = options.pop(0).upper()
+        if option not in ("EX", "PX") or not options:
+            raise CommandError("syntax error")
+        ex = _int(options.pop(0)) / (1 if option == "EX" else 1000)
+        if ex <= 0:
+            raise CommandError("invalid expire time in 'set' command")
+    server.db.set(key, value, ex=ex)
+    return OK
+
+
+def cmd_incr(server, args):
+    try:
+        return encode_reply(server.db.incr(args[0]))
+    except ValueError:
+        raise CommandError("value is not an integer or out of range") from None
+
+
+def cmd_zadd(server, args):
+    key, pairs = args[0], args[1:]
+    if len(pairs) % 2:
+        raise CommandError("syntax error")
+    members = []
+    for i in range(0, len(pairs), 2):
+        members += (pairs[i + 1], _float(pairs[i]))
+    return encode_reply(server.db.zadd(key, *members))  # One call, one AOF record for the lot
+
+
+def _bulk_array(values):
+    """An array of bulk strings (or nils), whatever the Python types: what MGET, HGETALL, SMEMBERS reply."""
+    return b"*%d\r\n" % len(values) + b"".join(NIL if v is None else encode_bulk(v) for v in values)
+
+
+def cmd_mget(server, args):
+    return _bulk_array(server.db.mget(*args))
+
+
+def cmd_mset(server, args):
+    if len(args) % 2:
+        raise CommandError("wrong number of arguments for 'mset' command")
+    server.db.mset(dict(zip(args[::2], args[1::2])))
+    return OK
+
+
+def cmd_zrange(server, args, reverse=False):
+    key, start, stop, *options = args
+    if options and [o.upper() for o in options] != ["WITHSCORES"]:
+        raise CommandError("syntax error")
+    get = server.db.zrevrange if reverse else server.db.zrange
+    return encode_reply(_with_scores(get(key, _int(start), _int(stop)), bool(options)))
+
+
+def cmd_zrangebyscore(server, args):
+    key, low, high, *options = args
+    (low, low_open), (high, high_open) = _score_bound(low), _score_bound(high)
+    with_scores, offset, count = False, 0, None
+    while options:
+        option = options.pop(0).upper()
+        if option == "WITHSCORES":
+            with_scores = True
+        elif option == "LIMIT" and len(options) >= 2:
+            offset, count = _int(options.pop(0)), _int(options.pop(0))
+            count = None if count < 0 else count
+        else:
+            raise CommandError("syntax error")
+    if low_open or high_open:
+        # Exclusive bounds: fetch inclusively, then drop the boundary scores before paging
+        pairs = [(m, s) for m, s in server.db.zrangebyscore(key, low, high)
+                 if not (low_open and s == low) and not (high_open and s == high)]
+        pairs = pairs[offset:] if count is None else pairs[offset:offset + count]
+    else:
+        pairs = server.db.zrangebyscore(key, low, high, offset, count)
+    return encode_reply(_with_scores(pairs, with_scores))
+
+
+def cmd_zremrangebyscore(server, args):
+    key, low, high = args
+    (low, low_open), (high, high_open) = _score_bound(low), _score_bound(high)
+    if not (low_open or high_open):
+        return encode_reply(server.db.zremrangebyscore(key, low, high))
+    doomed = [m for m, s in server.db.zrangebyscore(key, low, high)
+              if not (low_open and s == low) and not (high_open and s == high)]
+    return encode_reply(sum(server.db.zrem(key, m) for m in doomed))
+
+
+def cmd_restore(server, args):
+    key, ttl, payload, *options = args
+    ttl = _int(ttl)
+    if ttl < 0 or any(option.upper() != "REPLACE" for option in options):
+        raise CommandError("syntax error")
+    try:
+        restored = server.db.restore(key, payload.encode("utf-8", "surrogateescape"), ttl / 1000 if ttl else None,
+                                     replace=bool(options))
+    except (ValueError, IndexError, struct.error):
+        raise CommandError("DUMP payload version or checksum are wrong") from None
+    if not restored:
+        raise CommandError("BUSYKEY Target key name already exists.")
+    return OK
+
+
+def positive_int(value):
+    """argparse type for counts that must be at least 1."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
+def _memory(value):
+    """maxmemory values: bytes, or with a kb/mb/gb suffix like redis.conf."""
+    units = {"kb": 1024, "mb": 1024 ** 2, "gb": 1024 ** 3}
+    unit = units.get(value[-2:].lower(), 1)
+    return _int(value[:-2] if unit > 1 else value) * unit
+
+
+ENCODING_CONFIG = ("zset-max-listpack-entries", "zset-max-listpack-value", "hash-max-listpack-entries",
+                   "hash-max-listpack-value", "set-max-intset-entries")
+
+
+def cmd_hset(server, args):
+    key, pairs = args[0], args[1:]
+    if len(pairs) % 2:
+        raise CommandError("wrong number of arguments for 'hset' command")
+    return encode_reply(server.db.hset(key, *pairs))
+
+
+def cmd_hincrby(server, args):
+    try:
+        return encode_reply(server.db.hincrby(args[0], args[1], _int(args[2])))
+    except ValueError:
+        raise CommandError("hash value is not an integer") from None
+
+
+def _set_member(value):
+    """Members that look like integers are stored as ints, so small numeric sets can be intsets (like Redis)."""
+    try:
+        number = int(value)
+    except ValueError:
+        return value
+    return number if str(number) == value else value
+
+
+def cmd_object(server, args):
+    if args[0].upper() != "ENCODING":
+        raise CommandError(f"OBJECT {args[0]} is not supported")
+    return encode_reply(server.db.object_encoding(args[1]))
+
+
+def cmd_config(server, args):
+    subcommand = args[0].upper()
+    if subcommand == "GET" and len(args) == 2:
+        db = server.db
+        save = "" if db.dir is None else " ".join(f"{seconds} {changes}" for seconds, changes in db.save_points)
+        config = {"save": save,
+                  "appendonly": "yes" if db.aof is not None else "no",
+                  "appendfsync": db.appendfsync, "dir": db.dir or "",
+                  "maxmemory": str(db.maxmemory), "maxmemory-policy": db.maxmemory_policy,
+                  "maxmemory-samples": str(db.maxmemory_samples)}
+        config.update({name: str(getattr(db, name.replace("-", "_"))) for name in ENCODING_CONFIG})
+        return encode_reply([item for name, value in config.items() if name == args[1]
+                             for item in (name, value)])
+    if subcommand == "SET" and len(args) == 3:
+        name, value = args[1].lower(), args[2]
+        if name == "maxmemory":
+            server.db.maxmemory = _memory(value)
+        elif name == "maxmemory-policy":
+            try:
+                server.db.set_maxmemory_policy(value.lower())
+            except ValueError as e:
+                raise CommandError(str(e)) from None
+        elif name == "maxmemory-samples":
+            try:
+                server.db.set_maxmemory_samples(_int(value))
+            except ValueError as e:
+                raise CommandError(str(e)) from None
+        elif name in ENCODING_CONFIG:
+            setattr(server.db, name.replace("-", "_"), _int(value))  # Affects collections as they are created or grow
+        else:
+            raise CommandError(f"CONFIG SET {args[1]} is not supported")
+        return OK
+    raise CommandError(f"CONFIG {args[0]} is not supported")
+
+
+def cmd_persist(server, start, reply):
+    """SAVE, BGSAVE, BGREWRITEAOF. The background ones fork and reply at once; the server's cron collects the child."""
+    if server.db.dir is None:
+        raise CommandError("no dir configured: start the server with --dir")
+    try:
+        start()
+    except RuntimeError as e:
+        raise CommandError(str(e)) from None
+    return reply
+
+
+def cmd_info(server, args):
+    """The INFO fields MockRedis tracks, as "name:value" lines."""
+    info = {"connected_clients": server.clients, "total_commands_processed": server.stats["commands"],
+            **server.db.info()}
+    return encode_bulk("".join(f"{name}:{value}\r\n" for name, value in info.items()))
+
+
+def cmd_quit(server, args):
+    return OK
+
+
+# name -> (handler(server, args), arity). Like Redis: arity counts the command name,
+# and a negative arity means "at least that many".
+COMMANDS = {
+    "PING": (cmd_ping, -1),
+    "ECHO": (lambda s, a: encode_bulk(a[0]), 2),
+    "GET": (lambda s, a: NIL if (v := s.db.get(a[0])) is None else encode_bulk(v), 2),
+    "SET": (cmd_set, -3),
+    "MGET": (cmd_mget, -2),
+    "MSET": (cmd_mset, -3),
+    "DEL": (lambda s, a: encode_reply(s.db.mdel(*a)), -2),
+    "EXISTS": (lambda s, a: encode_reply(sum(s.db.exists(k) for k in a)), -2),
+    "INCR": (cmd_incr, 2),
+    "EXPIRE": (lambda s, a: encode_reply(s.db.expire(a[0], _int(a[1]))), 3),
+    "TTL": (lambda s, a: encode_reply(s.db.ttl(a[0])), 2),
+    "PTTL": (lambda s, a: encode_reply(s.db.pttl(a[0])), 2),
+    "PERSIST": (lambda s, a: encode_reply(s.db.persist(a[0])), 2),
+    "DUMP": (lambda s, a: encode_reply(s.db.dump(a[0])), 2),
+    "RESTORE": (cmd_restore, -4),
+    "DBSIZE": (lambda s, a: encode_reply(s.db.dbsize()), 1),
+    "ZADD": (cmd_zadd, -4),
+    "ZINCRBY": (lambda s, a: encode_bulk(format_score(s.db.zincrby(a[0], a[2], _float(a[1])))), 4),
+    "ZREM": (lambda s, a: encode_reply(sum(s.db.zrem(a[0], m) for m in a[1:])), -3),
+    "ZSCORE": (lambda s, a: encode_reply(None if (v := s.db.zscore(a[0], a[1])) is None else format_score(v)), 3),
+    "ZCARD": (lambda s, a: encode_reply(s.db.zcard(a[0])), 2),
+    "ZRANK": (lambda s, a: encode_reply(s.db.zrank(a[0], a[1])), 3),
+    "ZREVRANK": (lambda s, a: encode_reply(s.db.zrevrank(a[0], a[1])), 3),
+    "ZRANGE": (cmd_zrange, -4),
+    "ZREVRANGE": (lambda s, a: cmd_zrange(s, a, reverse=True), -4),
+    "ZRANGEBYSCORE": (cmd_zrangebyscore, -4),
+    "ZREMRANGEBYSCORE": (cmd_zremrangebyscore, 4),
+    "HSET": (cmd_hset, -4),
+    "HGET": (lambda s, a: NIL if (v := s.db.hget(a[0], a[1])) is None else encode_bulk(v), 3),
+    "HDEL": (lambda s, a: encode_reply(s.db.hdel(a[0], *a[1:])), -3),
+    "HGETALL": (lambda s, a: _bulk_array([x for pair in s.db.hgetall(a[0]).items() for x in pair]), 2),
+    "HLEN": (lambda s, a: encode_reply(s.db.hlen(a[0])), 2),
+    "HEXISTS": (lambda s, a: encode_reply(s.db.hexists(a[0], a[1])), 3),
+    "HINCRBY": (cmd_hincrby, 4),
+    "SADD": (lambda s, a: encode_reply(s.db.sadd(a[0], *map(_set_member, a[1:]))), -3),
+    "SREM": (lambda s, a: encode_reply(s.db.srem(a[0], *map(_set_member, a[1:]))), -3),
+    "SISMEMBER": (lambda s, a: encode_reply(s.db.sismember(a[0], _set_member(a[1]))), 3),
+    "SMEMBERS": (lambda s, a: _bulk_array(s.db.smembers(a[0])), 2),
+    "SCARD": (lambda s, a: encode_reply(s.db.scard(a[0])), 2),
+    "OBJECT": (cmd_object, 3),
+    "CONFIG": (cmd_config, -2),
+    "INFO": (cmd_info, -1),
+    "SAVE": (lambda s, a: cmd_persist(s, s.db.save, OK), 1),
+    "BGSAVE": (lambda s, a: cmd_persist(s, s.db.bgsave, b"+Background saving started\r\n"), 1),
+    "BGREWRITEAOF": (lambda s, a: cmd_persist(s, s.db.bgrewriteaof,
+                                              b"+Background append only file rewriting started\r\n"), 1),
+    "LASTSAVE": (lambda s, a: encode_reply(int(s.db.last_save)), 1),
+    "COMMAND": (lambda s, a: b"*0\r\n", -1),  # redis-cli asks at startup; an empty table is fine
+    "QUIT": (cmd_quit, 1),
+}
+
+
+class RedisProtocol(asyncio.BufferedProtocol):
+    """
+    One client connection. The socket reads straight into self.buf (no
+    intermediate bytes object per read); every complete command in it is
+    parsed in place and executed, and all their replies leave in ONE write.
+    So a client that pipelines N commands costs one read and one write.
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.buf = bytearray(READ_SIZE)
+        self.start = 0  # First unparsed byte
+        self.end = 0    # End of the received data
+        self.transport = None
+        self.asking = False  # Cluster mode: ASKING was sent, so the next command may use an importing slot
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.server.clients += 1
+
+    def connection_lost(self, exc):
+        self.server.clients -= 1
+
+    def get_buffer(self, sizehint):
+        if len(self.buf) - self.end < READ_SIZE:
+            # Move the partial command to the front; grow only if it alone fills the buffer
+            pending = self.end - self.start
+            self.buf[:pending] = self.buf[self.start:self.end]
+            self.start, self.end = 0, pending
+            if len(self.buf) - self.end < READ_SIZE:
+                self.buf.extend(bytes(len(self.buf)))
+        return memoryview(self.buf)[self.end:]
+
+    def buffer_updated(self, nbytes):
+        self.end += nbytes
+        replies = []
+        close = False
+        with memoryview(self.buf) as view, self.server.db.batch():  # The AOF is written before any reply
+            while self.start < self.end:
+                try:
+                    args, pos = parse_command(self.buf, view, self.start, self.end)
+                except (ProtocolError, ValueError) as e:
+                    replies.append(b"-ERR Protocol error: %s\r\n" % str(e).encode())
+                    close = True
+                    break
+                if args is INCOMPLETE:
+                    break
+                self.start = pos
+                if args:
+                    replies.append(self.server.execute(args, self))
+                    if args[0].upper() == "QUIT":
+                        close = True
+                        break
+        if self.start == self.end:
+            self.start = self.end = 0  # All consumed: the next read starts at the front again
+        if replies:
+            self.transport.write(b"".join(replies))
+        if close:
+            self.transport.close()
+
+
+class RedisServer:
+    """A single-threaded RESP2 server in front of one MockRedis, like redis-server's event loop."""
+
+    def __init__(self, db=None, host="127.0.0.1", port=DEFAULT_PORT, hz=HZ):
+        self.db = db if db is not None else MockRedis(hz=0)  # The server's own cron drives expiry
+        self.host = host
+        self.port = port
+        self.hz = hz
+        self.clients = 0
+        self.commands = COMMANDS  # name -> (handler, arity); subclasses add their own
+        self.stats = {"commands": 0, "errors": 0}
+
+    def execute(self, args, conn=None):
+        """Runs one command (sent on connection conn) and returns its encoded reply."""
+        self.stats["commands"] += 1
+        name = args[0].upper()
+        entry = self.commands.get(name)
+        if entry is None:
+            self.stats["errors"] += 1
+            return b"-ERR unknown command '%s'\r\n" % args[0].encode("utf-8", "surrogateescape")
+        handler, arity = entry
+        if len(args) != arity if arity > 0 else len(args) < -arity:
+            self.stats["errors"] += 1
+            return b"-ERR wrong number of arguments for '%s' command\r\n" % name.lower().encode()
+        try:
+            return handler(self, args[1:])
+        except CommandError as e:
+            self.stats["errors"] += 1
+            return b"-ERR %s\r\n" % str(e).encode()
+        except OutOfMemoryError as e:
+            self.stats["errors"] += 1
+            return b"-OOM %s\r\n" % str(e).encode()
+        except WrongTypeError as e:
+            self.stats["errors"] += 1
+            return b"-WRONGTYPE %s\r\n" % str(e).encode()
+
+    def _cron(self):
+        """Active expiry, hz times a second, even while no command arrives."""
+        self.db.cron()
+        asyncio.get_running_loop().call_later(1 / self.hz, self._cron)
+
+    async def serve(self, ready=None):
+        loop = asyncio.get_running_loop()
+        server = await loop.create_server(lambda: RedisProtocol(self), self.host, self.port)
+        if self.hz:
+            self._cron()
+        if ready is not None:
+            ready.set()
+        async with server:
+            await server.serve_forever()
+
+
+class RedisClient:
+    """A minimal asyncio RESP2 client: send any number of commands at once, get the replies in order."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.buf = bytearray()
+
+    @classmethod
+    async def connect(cls, host="127.0.0.1", port=DEFAULT_PORT):
+        reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def execute_many(self, commands):
+        """Pipelines commands (tuples of args): one write, then the replies in order. Error replies are returned, not raised."""
+        self.writer.write(b"".join(encode_command(*c) for c in commands))
+        replies = []
+        pos = 0
+        while True:
+            with memoryview(self.buf) as view:
+                while len(replies) < len(commands):
+                    reply, pos = parse_reply(self.buf, view, pos, len(self.buf))
+                    if reply is INCOMPLETE:
+                        break
+                    replies.append(reply)
+            if len(replies) == len(commands):
+                del self.buf[:pos]
+                return replies
+            data = await self.reader.read(READ_SIZE)
+            if not data:
+                raise ConnectionError("server closed the connection")
+            self.buf += data
+
+    async def execute(self, *args):
+        reply = (await self.execute_many([args]))[0]
+        if isinstance(reply, ReplyError):
+            raise reply
+        return reply
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="RESP2 server in front of MockRedis")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--hz", type=int, default=HZ)
+    parser.add_argument("--maxmemory", default="0", help="Bytes, or e.g. 100mb (0 = no limit)")
+    parser.add_argument("--maxmemory-policy", default="noeviction", choices=MAXMEMORY_POLICIES)
+    parser.add_argument("--maxmemory-samples", type=positive_int, default=MAXMEMORY_SAMPLES)
+    parser.add_argument("--dir", help="Where dump.rdb and the AOF live (default: nothing is persisted)")
+    parser.add_argument("--appendonly", action="store_true")
+    parser.add_argument("--appendfsync", default=FSYNC_EVERYSEC, choices=FSYNC_POLICIES)
+    args = parser.parse_args()
+    db = MockRedis(hz=0, maxmemory=_memory(args.maxmemory), maxmemory_policy=args.maxmemory_policy,
+                   maxmemory_samples=args.maxmemory_samples, dir=args.dir, appendonly=args.appendonly,
+                   appendfsync=args.appendfsync)
+    print(f"--- 🛰️  MockRedis listening on {args.host}:{args.port} (try: redis-cli -p {args.port}) ---")
+    try:
+        asyncio.run(RedisServer(db, host=args.host, port=args.port, hz=args.hz).serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        db.close()  # Waits for a running BGSAVE, syncs the AOF
@@ -0,0 +1,199 @@
+import random
+
+MAX_LEVEL = 32  # Enough for 2^64 elements with P = 1/4
+P = 0.25        # Chance a node is promoted one level up
+
+
+class _Node:
+    __slots__ = ("member", "score", "forward", "span", "backward")
+
+    def __init__(self, member, score, level):
+        self.member = member
+        self.score = score
+        self.forward = [None] * level
+        self.span = [0] * level  # How many level-0 nodes each forward link jumps over
+        self.backward = None
+
+
+def _random_level():
+    level = 1
+    while level < MAX_LEVEL and random.random() < P:
+        level += 1
+    return level
+
+
+class SortedSet:
+    """
+    Redis's zset: a dict member -> score for O(1) lookups, plus a skiplist
+    ordered by (score, member). Every forward link also records its "span",
+    the number of nodes it jumps over, so summing spans on the way down gives
+    a node's rank: rank lookups, rank ranges and score ranges are all
+    O(log n + k) instead of a full sort per read.
+    """
+    encoding = "skiplist"
+
+    def __init__(self):
+        self.header = _Node(None, None, MAX_LEVEL)
+        self.tail = None
+        self.level = 1
+        self.length = 0  # Nodes in the skiplist
+        self.scores = {}
+
+    def __len__(self):
+        return len(self.scores)
+
+    def __contains__(self, member):
+        return member in self.scores
+
+    def score(self, member):
+        return self.scores.get(member)
+
+    def items(self):
+        """(member, score) pairs, in no particular order."""
+        return self.scores.items()
+
+    def add(self, member, score):
+        """Adds or re-scores member. Returns True if it is new."""
+        old = self.scores.get(member)
+        if old is not None:
+            if old == score:
+                return False
+            self._delete(old, member)
+        self._insert(score, member)
+        self.scores[member] = score
+        return old is None
+
+    def incrby(self, member, amount):
+        """Adds amount to member's score (from 0 if new). Returns the new score."""
+        score = self.scores.get(member, 0) + amount
+        self.add(member, score)
+        return score
+
+    def remove(self, member):
+        """Returns True if member was there."""
+        score = self.scores.pop(member, None)
+        if score is None:
+            return False
+        self._delete(score, member)
+        return True
+
+    def rank(self, member, reverse=False):
+        """0-based position by ascending score (descending if reverse), or None."""
+        score = self.scores.get(member)
+        if score is None:
+            return None
+        rank = 0
+        x = self.header
+        for i in range(self.level - 1, -1, -1):
+            while x.forward[i] is not None and (x.forward[i].score < score or
+                                                (x.forward[i].score == score and x.forward[i].member <= member)):
+                rank += x.span[i]
+                x = x.forward[i]
+        # x is now member's node and rank its 1-based position
+        return self.length - rank if reverse else rank - 1
+
+    def range_by_rank(self, start, stop, reverse=False):
+        """[(member, score)] for ranks start..stop inclusive; negative ranks count from the end (like ZRANGE)."""
+        n = self.length
+        if start < 0:
+            start += n
+        if stop < 0:
+            stop += n
+        start = max(start, 0)
+        stop = min(stop, n - 1)
+        if start > stop:
+            return []
+        node = self._node_at(n - start if reverse else start + 1)
+        result = []
+        for _ in range(stop - start + 1):
+            result.append((node.member, node.score))
+            node = node.backward if reverse else node.forward[0]
+        return result
+
+    def range_by_score(self, min_score, max_score, offset=0, count=None):
+        """[(member, score)] with min_score <= score <= max_score, ascending, after skipping offset of them."""
+        x = self.header
+        for i in range(self.level - 1, -1, -1):
+            while x.forward[i] is not None and x.forward[i].score < min_score:
+                x = x.forward[i]
+        x = x.forward[0]
+        for _ in range(offset):
+            if x is None:
+                break
+            x = x.forward[0]
+        result = []
+        while x is not None and x.score <= max_score and (count is None or len(result) < count):
+            result.append((x.member, x.score))
+            x = x.forward[0]
+        return result
+
+    def _node_at(self, rank):
+        """The node at 1-based rank: follow the links whose spans still fit."""
+        traversed = 0
+        x = self.header
+        for i in range(self.level - 1, -1, -1):
+            while x.forward[i] is not None and traversed + x.span[i] <= rank:
+                traversed += x.span[i]
+                x = x.forward[i]
+            if traversed == rank:
+                return x
+        return None
+
+    def _insert(self, score, member):
+        update = [None] * MAX_LEVEL
+        rank = [0] * MAX_LEVEL  # 1-based rank of update[i]
+        x = self.header
+        for i in range(self.level - 1, -1, -1):
+            rank[i] = 0 if i == self.level - 1 else rank[i + 1]
+            while x.forward[i] is not None and (x.forward[i].score < score or
+                                                (x.forward[i].score == score and x.forward[i].member < member)):
+                rank[i] += x.span[i]
+                x = x.forward[i]
+            update[i] = x
+
+        level = _random_level()
+        if level > self.level:
+            for i in range(self.level, level):
+                update[i] = self.header
+                self.header.span[i] = self.length
+            self.level = level
+
+        node = _Node(member, score, level)
+        for i in range(level):
+            node.forward[i] = update[i].forward[i]
+            update[i].forward[i] = node
+            # The old link over the new node is split in two
+            node.span[i] = update[i].span[i] - (rank[0] - rank[i])
+            update[i].span[i] = rank[0] - rank[i] + 1
+        for i in range(level, self.level):
+            update[i].span[i] += 1  # Taller links now jump over one more node
+
+        node.backward = None if update[0] is self.header else update[0]
+        if node.forward[0] is not None:
+            node.forward[0].backward = node
+        else:
+            self.tail = node
+        self.length += 1
+
+    def _delete(self, score, member):
+        update = [None] * MAX_LEVEL
+        x = self.header
+        for i in range(self.level - 1, -1, -1):
+            while x.forward[i] is not None and (x.forward[i].score < score or
+                                                (x.forward[i].score == score and x.forward[i].member < member)):
+                x = x.forward[i]
+            update[i] = x
+        node = x.forward[0]
+        for i in range(self.level):
+            if update[i].forward[i] is node:
+                update[i].span[i] += node.span[i] - 1
+                update[i].forward[i] = node.forward[i]
+            else:
+                update[i].span[i] -= 1
+        if node.forward[0] is not None:
+            node.forward[0].backward = node.backward
+        else:
+            self.tail = node.backward
+        while self.level > 1 and self.header.forward[self.level - 1] is None:
+            self.level -= 1
+        self.length -= 1
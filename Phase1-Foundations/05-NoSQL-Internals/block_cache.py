@@ -0,0 +1,94 @@
+import threading
+from collections import OrderedDict
+
+# Default capacity of the cache a store shares across all its SSTables
+BLOCK_CACHE_BYTES = 8 * 1024 * 1024
+
+# Block kinds. Index and filter blocks are consulted by EVERY read of a table,
+# so they live in the high-priority pool; data blocks live in the low one.
+INDEX = "index"
+FILTER = "filter"
+DATA = "data"
+HIGH_PRIORITY = (INDEX, FILTER)
+
+
+class BlockCache:
+    """
+    A size-bounded LRU cache of SSTable blocks, keyed by (file, kind, offset).
+
+    Two LRU lists share the capacity. Index and filter blocks go in the
+    high-priority list, which may hold up to high_priority_ratio of the
+    bytes; data blocks go in the low-priority list. When full, the least
+    recently used data block goes first, so a burst of cold data reads
+    cannot push out the indexes every lookup needs.
+
+    Blocks of a deleted SSTable are never touched again, so they simply age
+    out at the cold end of the list.
+    """
+
+    def __init__(self, capacity_bytes=BLOCK_CACHE_BYTES, high_priority_ratio=0.5):
+        self.capacity = capacity_bytes
+        self.high_priority_capacity = int(capacity_bytes * high_priority_ratio)
+        self._lock = threading.Lock()
+        self._lists = {True: OrderedDict(), False: OrderedDict()}  # high priority? -> key -> (value, charge)
+        self._usage = {True: 0, False: 0}
+        self.stats = {kind: {"hits": 0, "misses": 0} for kind in (INDEX, FILTER, DATA)}
+        self.stats["evictions"] = 0
+
+    @property
+    def usage(self):
+        return self._usage[True] + self._usage[False]
+
+    def get(self, key):
+        """The cached block, or None. A hit makes the block the most recently used."""
+        kind = key[1]
+        entries = self._lists[kind in HIGH_PRIORITY]
+        with self._lock:
+            entry = entries.get(key)
+            if entry is None:
+                self.stats[kind]["misses"] += 1
+                return None
+            entries.move_to_end(key)
+            self.stats[kind]["hits"] += 1
+            return entry[0]
+
+    def insert(self, key, value, charge):
+        """Caches a block that costs `charge` bytes, evicting LRU blocks to make room."""
+        if charge > self.capacity:
+            return  # Would evict everything, itself included
+        high = key[1] in HIGH_PRIORITY
+        with self._lock:
+            entries = self._lists[high]
+            old = entries.pop(key, None)
+            if old is not None:
+                self._usage[high] -= old[1]  # Two readers missed at once; keep the newer copy
+            entries[key] = (value, charge)
+            self._usage[high] += charge
+            self._evict()
+
+    def _evict(self):
+        high, low = self._lists[True], self._lists[False]
+        while self.usage > self.capacity:
+            # Index/filter blocks only lose their slot when they overflow their own share
+            if self._usage[True] > self.high_priority_capacity or not low:
+                entries, pool = high, True
+            else:
+                entries, pool = low, False
+            _, (_, charge) = entries.popitem(last=False)
+            self._usage[pool] -= charge
+            self.stats["evictions"] += 1
+
+    def counters(self):
+        """Hits, misses, evictions and hit rate, overall and per block kind."""
+        with self._lock:
+            result = {"capacity_bytes": self.capacity, "usage_bytes": self.usage,
+                      "evictions": self.stats["evictions"]}
+            for kind in (INDEX, FILTER, DATA):
+                hits, misses = self.stats[kind]["hits"], self.stats[kind]["misses"]
+                result[kind] = {"hits": hits, "misses": misses,
+                                "hit_rate": hits / (hits + misses) if hits + misses else 0.0}
+            hits = sum(result[kind]["hits"] for kind in (INDEX, FILTER, DATA))
+            misses = sum(result[kind]["misses"] for kind in (INDEX, FILTER, DATA))
+            result["hits"], result["misses"] = hits, misses
+            result["hit_rate"] = hits / (hits + misses) if hits + misses else 0.0
+            return result
@@ -0,0 +1,56 @@
+import hashlib
+import math
+import struct
+
+# Header of a persisted filter: number of bits, number of hash functions
+HEADER = struct.Struct("<QB")
+
+
+class BloomFilter:
+    """
+    Answers "is this key MAYBE in the set?" or "DEFINITELY NOT".
+    False positives are possible, false negatives are not.
+    """
+
+    def __init__(self, num_bits, num_hashes, bits=None):
+        self.num_bits = max(8, num_bits)
+        self.num_hashes = num_hashes
+        self.bits = bits if bits is not None else bytearray((self.num_bits + 7) // 8)
+
+    @classmethod
+    def for_keys(cls, keys, bits_per_key=10):
+        """Sizes the filter for the keys. k = bits_per_key * ln(2) minimises false positives."""
+        num_hashes = max(1, min(30, round(bits_per_key * math.log(2))))
+        bloom = cls(len(keys) * bits_per_key, num_hashes)
+        for key in keys:
+            bloom.add(key)
+        return bloom
+
+    def _positions(self, key):
+        # Double hashing: two 64-bit hashes simulate k independent ones
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1, h2 = struct.unpack("<QQ", digest)
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def might_contain(self, key):
+        for pos in self._positions(key):
+            if not self.bits[pos >> 3] & (1 << (pos & 7)):
+                return False  # One zero bit is proof of absence
+        return True
+
+    @property
+    def memory_bytes(self):
+        return len(self.bits)
+
+    def to_bytes(self):
+        return HEADER.pack(self.num_bits, self.num_hashes) + bytes(self.bits)
+
+    @classmethod
+    def from_bytes(cls, data):
+        num_bits, num_hashes = HEADER.unpack_from(data)
+        return cls(num_bits, num_hashes, bytearray(data[HEADER.size:]))
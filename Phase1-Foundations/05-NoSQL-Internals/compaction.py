@@ -0,0 +1,281 @@
+import bisect
+import heapq
+import itertools
+from operator import itemgetter
+
+from sstable import MISSING, Expiring, unwrap
+
+# Leveled compaction sizing (small, so the demo actually compacts)
+L0_TRIGGER = 4                  # Flushes allowed in L0 before merging into L1
+TARGET_FILE_BYTES = 64 * 1024   # Output tables are split at about this size
+LEVEL_BASE_BYTES = 256 * 1024   # Max bytes in L1; each deeper level is 10x bigger
+LEVEL_MULTIPLIER = 10
+MAX_LEVELS = 7
+
+
+class Version:
+    """
+    An immutable picture of which SSTables are live, level by level.
+
+    L0 holds flushed tables (Oldest -> Newest) whose key ranges overlap.
+    L1+ each hold non-overlapping tables sorted by key, so at most ONE
+    table per level can contain a key.
+
+    Readers pin a Version while they search it. An SSTable that compaction
+    replaced is only deleted once no pinned Version references it.
+    """
+
+    def __init__(self, levels):
+        self.levels = tuple(tuple(level) for level in levels)
+        self.refs = 0
+        self._max_keys = [[t.max_key for t in level] for level in self.levels]
+        for table in self.tables():
+            table.refs += 1
+
+    def tables(self):
+        for level in self.levels:
+            yield from level
+
+    def candidates(self, key):
+        """Tables that may hold key, in the order a read must check them (Newest -> Oldest)."""
+        for table in reversed(self.levels[0]):
+            if table.min_key <= key <= table.max_key:
+                yield table
+        for n in range(1, len(self.levels)):
+            i = bisect.bisect_left(self._max_keys[n], key)
+            if i < len(self.levels[n]) and self.levels[n][i].min_key <= key:
+                yield self.levels[n][i]
+
+    def scan_level(self, n, start=None):
+        """Yields (key, seq, value) from level n (n >= 1) in key order: its tables are one sorted run."""
+        first = 0 if start is None else bisect.bisect_left(self._max_keys[n], start)
+        for table in self.levels[n][first:]:
+            yield from table.scan(start)
+
+    def sorted_runs(self):
+        """Worst-case tables a point read touches: every L0 table plus one per level."""
+        return len(self.levels[0]) + sum(1 for level in self.levels[1:] if level)
+
+    def run_bytes(self):
+        """Size of each sorted run (each L0 table is its own run; a level is one run)."""
+        return [t.size for t in self.levels[0]] + [sum(t.size for t in level) for level in self.levels[1:]]
+
+    def drop(self):
+        """Called once this Version is neither current nor pinned by a reader."""
+        for table in self.tables():
+            table.refs -= 1
+            if table.refs == 0:
+                table.delete()  # Compacted away and nobody is reading it any more
+
+
+class CompactionJob:
+    def __init__(self, inputs, level, output_level, max_output_bytes=None, trivial_move=False):
+        self.inputs = inputs              # Newest -> Oldest
+        self.level = level
+        self.output_level = output_level
+        self.max_output_bytes = max_output_bytes
+        self.trivial_move = trivial_move  # No overlap below: just move the file, no rewrite
+
+
+def overlapping(level, min_key, max_key):
+    return [t for t in level if t.min_key <= max_key and t.max_key >= min_key]
+
+
+def merge_entries(sources):
+    """Lazy k-way merge of (key, seq, value) iterators, each sorted by key ASC then seq DESC."""
+    return heapq.merge(*sources, key=lambda entry: (entry[0], -entry[1]))
+
+
+def visible(entries, seq):
+    """(key, value) for the newest version of each key written at or before seq (tombstones included)."""
+    last_key = MISSING
+    for key, entry_seq, value in entries:
+        if key == last_key or entry_seq > seq:
+            continue  # Shadowed by a version we already emitted, or too new for this reader
+        last_key = key
+        yield key, value
+
+
+def collapse(entries, snapshots, drop_tombstone, now=None):
+    """
+    Garbage-collects old versions from a merged (key, seq, value) stream.
+
+    Per key, keeps the newest version, plus the newest version each live
+    snapshot (a sorted list of sequence numbers) can see. Everything else
+    is hidden from every reader. A tombstone left as the oldest kept version
+    is dropped too, when drop_tombstone(key) says no older data for the key
+    survives elsewhere.
+
+    Given `now`, a value whose TTL has passed becomes a tombstone: it must
+    keep shadowing older versions, but is dropped like any other tombstone.
+    """
+    for key, versions in itertools.groupby(entries, key=itemgetter(0)):
+        kept, last_stripe = [], None
+        for entry in versions:
+            if now is not None and type(entry[2]) is Expiring and entry[2].expire_at <= now:
+                entry = (key, entry[1], None)
+            # Versions between the same two snapshots are seen by the same readers: keep the newest
+            stripe = bisect.bisect_left(snapshots, entry[1])
+            if stripe != last_stripe:
+                kept.append(entry)
+                last_stripe = stripe
+        while kept and kept[-1][2] is None and drop_tombstone(key):
+            kept.pop()
+        yield from kept
+
+
+def merge_tables(tables, drop_tombstone, snapshots=(), now=None):
+    """Merges sorted tables into one sorted stream, keeping only the versions someone can still read."""
+    return collapse(merge_entries(tables), snapshots, drop_tombstone, now)
+
+
+def expired_tables(version, now):
+    """
+    Tables whose every entry has expired by `now`, judged from max_expiry
+    alone, so they can be deleted without being read. A table only
+    qualifies if every OLDER table overlapping it has expired too:
+    otherwise its expired versions still shadow older, live values.
+    """
+    expired = []
+    for n, level in enumerate(version.levels):
+        deeper = [t for lower in version.levels[n + 1:] for t in lower]
+        for i, table in enumerate(level):
+            if table.max_expiry > now:
+                continue
+            older = list(level[:i]) + deeper if n == 0 else deeper  # L0 is Oldest -> Newest
+            if all(t.max_expiry <= now for t in overlapping(older, table.min_key, table.max_key)):
+                expired.append(table)
+    return expired
+
+
+def split_by_size(items, max_bytes):
+    """
+    Chops a sorted stream into chunks of about max_bytes, one per output SSTable.
+    Only cuts between keys, so each key's versions stay in one table.
+    """
+    chunk, size = [], 0
+    for entry in items:
+        if max_bytes and size >= max_bytes and entry[0] != chunk[-1][0]:
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(entry)
+        size += len(entry[0]) + len(unwrap(entry[2]) or "")
+    if chunk:
+        yield chunk
+
+
+def covers(tables, key):
+    return any(t.min_key <= key <= t.max_key and t.might_contain(key) for t in tables)
+
+
+class SizeTieredCompaction:
+    """
+    Cassandra-style: everything lives in L0. When min_threshold tables of a
+    similar size (a "tier") pile up, merge them into one bigger table.
+    Cheap on writes, but a key may sit in one table per tier.
+    """
+    name = "size_tiered"
+
+    def __init__(self, min_threshold=4, max_threshold=32, bucket_low=0.5, bucket_high=1.5,
+                 min_table_bytes=TARGET_FILE_BYTES):
+        self.min_threshold = min_threshold
+        self.max_threshold = max_threshold
+        self.bucket_low = bucket_low
+        self.bucket_high = bucket_high
+        self.min_table_bytes = min_table_bytes  # Smaller tables all share the first tier
+
+    def _same_tier(self, bucket, table):
+        avg = sum(t.size for t in bucket) / len(bucket)
+        if avg < self.min_table_bytes and table.size < self.min_table_bytes:
+            return True
+        return self.bucket_low * avg <= table.size <= self.bucket_high * avg
+
+    def pick(self, version):
+        # Only merge tables that are ADJACENT in age. Merging around a table
+        # of another tier would let the merged output shadow its newer data.
+        bucket = []
+        for table in version.levels[0]:
+            if bucket and not self._same_tier(bucket, table):
+                if len(bucket) >= self.min_threshold:
+                    break
+                bucket = []
+            bucket.append(table)
+        if len(bucket) < self.min_threshold:
+            return None
+        inputs = bucket[:self.max_threshold]
+        return CompactionJob(list(reversed(inputs)), level=0, output_level=0)
+
+    def drop_tombstone(self, version, job):
+        # Safe only if no OLDER table outside the merge might still hold the key
+        l0 = version.levels[0]
+        older = list(l0[:l0.index(job.inputs[-1])]) + [t for level in version.levels[1:] for t in level]
+        return lambda key: not covers(older, key)
+
+    def install(self, levels, job, outputs):
+        l0 = levels[0]
+        start = l0.index(job.inputs[-1])
+        remaining = [t for t in l0 if t not in job.inputs]
+        levels[0] = remaining[:start] + outputs + remaining[start:]
+
+
+class LeveledCompaction:
+    """
+    LevelDB/RocksDB-style: L0 is merged into L1 once L0_TRIGGER tables pile up,
+    and each level Ln (n >= 1) is kept under LEVEL_BASE_BYTES * 10^(n-1) by
+    pushing one table at a time into the overlapping tables of Ln+1.
+    Few sorted runs (cheap reads, little wasted space), more rewriting.
+    """
+    name = "leveled"
+
+    def __init__(self, l0_trigger=L0_TRIGGER, level_base_bytes=LEVEL_BASE_BYTES,
+                 level_multiplier=LEVEL_MULTIPLIER, target_file_bytes=TARGET_FILE_BYTES):
+        self.l0_trigger = l0_trigger
+        self.level_base_bytes = level_base_bytes
+        self.level_multiplier = level_multiplier
+        self.target_file_bytes = target_file_bytes
+        self._compact_pointer = {}  # Level -> last key compacted, so we round-robin the key space
+
+    def max_bytes(self, n):
+        return self.level_base_bytes * self.level_multiplier ** (n - 1)
+
+    def pick(self, version):
+        levels = version.levels
+
+        # 1. Too many overlapping flushes: merge ALL of L0 into L1
+        l0 = levels[0]
+        if len(l0) >= self.l0_trigger:
+            min_key = min(t.min_key for t in l0)
+            max_key = max(t.max_key for t in l0)
+            inputs = list(reversed(l0)) + overlapping(levels[1], min_key, max_key)
+            return CompactionJob(inputs, 0, 1, self.target_file_bytes)
+
+        # 2. Push one table from the most over-full level down a level
+        scores = [(sum(t.size for t in levels[n]) / self.max_bytes(n), n)
+                  for n in range(1, len(levels) - 1)]
+        score, n = max(scores)
+        if score <= 1:
+            return None
+        pointer = self._compact_pointer.get(n)
+        table = next((t for t in levels[n] if pointer is None or t.min_key > pointer), levels[n][0])
+        below = overlapping(levels[n + 1], table.min_key, table.max_key)
+        if not below:
+            return CompactionJob([table], n, n + 1, trivial_move=True)
+        return CompactionJob([table] + below, n, n + 1, self.target_file_bytes)
+
+    def drop_tombstone(self, version, job):
+        # Safe only if no level BELOW the output might still hold the key
+        deeper = [t for level in version.levels[job.output_level + 1:] for t in level]
+        return lambda key: not covers(deeper, key)
+
+    def install(self, levels, job, outputs):
+        for n in range(len(levels)):
+            levels[n] = [t for t in levels[n] if t not in job.inputs]
+        levels[job.output_level] = sorted(levels[job.output_level] + outputs, key=lambda t: t.min_key)
+        if job.level > 0:
+            self._compact_pointer[job.level] = job.inputs[0].max_key
+
+
+COMPACTION_STRATEGIES = {
+    SizeTieredCompaction.name: SizeTieredCompaction,
+    LeveledCompaction.name: LeveledCompaction,
+}
@@ -0,0 +1,299 @@
+import argparse
+import json
+import random
+import shutil
+import string
+import sys
+import tempfile
+import threading
+import time
+
+from lsm_demo import DEFAULT_COMPRESSION, LSMTree
+from sstable import BITS_PER_KEY
+
+# Workloads, in the order db_bench would run them. fill* start from an empty store;
+# the others run against whatever the previous workloads left behind.
+WORKLOADS = ("fillseq", "fillrandom", "overwrite", "readrandom", "readmissing", "seekrandom", "mixed")
+FILLS = ("fillseq", "fillrandom")
+PERCENTILES = (50, 95, 99, 99.9)
+
+
+class ZipfianGenerator:
+    """
+    Zipf-distributed integers in [0, n): item 0 is the most popular, with skew theta
+    (0.99 = YCSB's default). Uses the Gray et al. closed form, so each draw is O(1)
+    once zeta(n) is precomputed. Ranks are hashed onto the keyspace so the hot keys
+    are scattered across SSTables instead of all sitting in the first one.
+    """
+
+    def __init__(self, n, theta=0.99):
+        if not 0 < theta < 1:
+            raise ValueError(f"zipfian theta must be in (0, 1), got {theta}")  # alpha = 1 / (1 - theta)
+        if n < 3:
+            raise ValueError(f"zipfian needs at least 3 keys, got {n}")  # zeta(2) == zeta(n) below that
+        self.n = n
+        self.theta = theta
+        zeta2 = 1 + 0.5 ** theta
+        self.zetan = sum(1 / i ** theta for i in range(1, n + 1))
+        self.alpha = 1 / (1 - theta)
+        self.eta = (1 - (2 / n) ** (1 - theta)) / (1 - zeta2 / self.zetan)
+
+    def next(self, rng):
+        u = rng.random()
+        uz = u * self.zetan
+        if uz < 1:
+            rank = 0
+        elif uz < 1 + 0.5 ** self.theta:
+            rank = 1
+        else:
+            rank = int(self.n * (self.eta * u - self.eta + 1) ** self.alpha)
+        return (rank * 2654435761) % self.n  # Knuth's multiplicative hash: scramble the ranks
+
+
+class ValueGenerator:
+    """
+    Values cut from a pre-built pool of text that compresses to about
+    compression_ratio of its size, like db_bench's RandomGenerator, so codecs
+    see realistic (not all-random, not all-zero) data.
+    """
+
+    def __init__(self, value_size, compression_ratio=0.5, seed=301):
+        rng = random.Random(seed)
+        self.value_size = value_size
+        pool = []
+        while sum(map(len, pool)) < max(1 << 20, value_size * 4):
+            # A random 100-char piece, repeated to reach the target compressibility
+            raw = int(100 * compression_ratio) or 1
+            piece = "".join(rng.choices(string.ascii_letters + string.digits, k=raw))
+            pool.append((piece * (100 // raw + 1))[:100])
+        self.pool = "".join(pool)
+
+    def next(self, rng):
+        pos = rng.randrange(len(self.pool) - self.value_size)
+        return self.pool[pos:pos + self.value_size]
+
+
+class Bench:
+    """Runs db_bench-style workloads against one LSMTree and collects per-workload results."""
+
+    def __init__(self, args):
+        self.args = args
+        self.db = None
+        self.directory = args.db or tempfile.mkdtemp(prefix="db_bench_")
+        self.values = ValueGenerator(args.value_size, args.compression_ratio)
+        self.zipf = ZipfianGenerator(args.num, args.zipf_theta) if args.distribution == "zipfian" else None
+
+    def key(self, n):
+        return str(n).zfill(self.args.key_size)
+
+    def pick(self, rng):
+        """A key number from the configured distribution."""
+        if self.zipf is not None:
+            return self.zipf.next(rng)
+        return rng.randrange(self.args.num)
+
+    def open(self, fresh):
+        if self.db is not None:
+            self.db.close()
+        if fresh:
+            shutil.rmtree(self.directory, ignore_errors=True)
+        a = self.args
+        self.db = LSMTree(memtable_limit=a.memtable_limit, bits_per_key=a.bits_per_key, compaction=a.compaction,
+                          data_dir=self.directory, sync_mode=a.sync_mode, block_cache_bytes=int(a.cache_mb * 2**20),
+                          compression=a.compression, verbose=False)
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+        if not self.args.db:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    # --- Workloads: each returns a function run(rng, i) doing ONE operation ---
+
+    def fillseq(self):
+        def run(rng, i):
+            self.db.write(self.key(i), self.values.next(rng))
+            return self.args.key_size + self.args.value_size
+        return run, self.args.num
+
+    def fillrandom(self):
+        def run(rng, i):
+            self.db.write(self.key(rng.randrange(self.args.num)), self.values.next(rng))
+            return self.args.key_size + self.args.value_size
+        return run, self.args.num
+
+    def overwrite(self):
+        def run(rng, i):
+            self.db.write(self.key(self.pick(rng)), self.values.next(rng))
+            return self.args.key_size + self.args.value_size
+        return run, self.args.num
+
+    def readrandom(self):
+        def run(rng, i):
+            value = self.db.read(self.key(self.pick(rng)))
+            return None if value is None else self.args.key_size + len(value)
+        return run, self.args.reads
+
+    def readmissing(self):
+        def run(rng, i):
+            # "00042." sorts between real keys, so only the Bloom filters can rule it out
+            value = self.db.read(self.key(self.pick(rng)) + ".")
+            return None if value is None else self.args.key_size + len(value)
+        return run, self.args.reads
+
+    def seekrandom(self):
+        def run(rng, i):
+            nbytes = 0
+            scan = self.db.scan(self.key(self.pick(rng)))
+            for _, (key, value) in zip(range(self.args.seek_nexts), scan):
+                nbytes += len(key) + len(value)
+            scan.close()  # Unpins the SSTables now, not whenever the generator is collected
+            return nbytes or None
+        return run, self.args.seeks
+
+    def mixed(self):
+        def run(rng, i):
+            key = self.key(self.pick(rng))
+            if rng.random() < self.args.read_ratio:
+                value = self.db.read(key)
+                return None if value is None else self.args.key_size + len(value)
+            self.db.write(key, self.values.next(rng))
+            return self.args.key_size + self.args.value_size
+        return run, self.args.reads
+
+    def run(self, name):
+        if self.db is None or (name in FILLS and not self.args.use_existing_db):
+            self.open(fresh=name in FILLS and not self.args.use_existing_db)
+        op, ops = getattr(self, name)()
+        threads = self.args.threads
+        samples = [[] for _ in range(threads)]
+        found = [0] * threads
+        nbytes = [0] * threads
+
+        def worker(t):
+            rng = random.Random(self.args.seed + t)
+            lat = samples[t]
+            for i in range(t * ops // threads, (t + 1) * ops // threads):  # Spreads any remainder
+                start = time.perf_counter()
+                result = op(rng, i)
+                lat.append(time.perf_counter() - start)
+                if result is not None:
+                    found[t] += 1
+                    nbytes[t] += result
+
+        workers = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+        start = time.perf_counter()
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        elapsed = time.perf_counter() - start
+
+        latencies = sorted(s for per in samples for s in per)
+        done = len(latencies)
+        result = {
+            "benchmark": name,
+            "ops": done,
+            "seconds": elapsed,
+            "ops_per_sec": done / elapsed,
+            "micros_per_op": elapsed / done * 1e6,
+            "mb_per_sec": sum(nbytes) / elapsed / 2**20,
+            "found": sum(found),
+            "latency_us": {f"p{p}": latencies[min(done - 1, int(done * p / 100))] * 1e6 for p in PERCENTILES},
+        }
+        result["latency_us"]["max"] = latencies[-1] * 1e6
+
+        # Amplification so far (cumulative, like db_bench's stats), then let the
+        # background work settle so the next workload starts from a steady state
+        result["amplification"] = self.db.amplification()
+        if self.args.settle:
+            self.db.flush_to_disk()
+            self.db.wait_for_flushes()
+            self.db.wait_for_compactions()
+            result["amplification_settled"] = self.db.amplification()
+        result["block_cache"] = self.db.cache_stats()
+        result["bloom"] = self.db.filter_stats()
+        result["wal"] = dict(self.db.wal.stats)
+        return result
+
+
+def report(result):
+    """One db_bench-style summary line per workload."""
+    lat = result["latency_us"]
+    amp = result["amplification"]
+    line = (f"{result['benchmark']:<12}: {result['micros_per_op']:9.3f} micros/op {result['ops_per_sec']:10,.0f} ops/sec"
+            f" {result['mb_per_sec']:7.1f} MB/s | p50 {lat['p50']:7.1f} p99 {lat['p99']:8.1f} p99.9 {lat['p99.9']:8.1f}"
+            f" max {lat['max']:9.1f} us | W-amp {amp['write_amplification']:5.2f}"
+            f" R-amp {amp['read_amplification']:5.2f} S-amp {amp['space_amplification']:5.2f}")
+    if result["benchmark"] not in FILLS + ("overwrite",):
+        line += f" | {result['found']:,} of {result['ops']:,} found"
+    print(line, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="db_bench-style workloads for LSMTree")
+    parser.add_argument("--benchmarks", default="fillseq,readrandom,readmissing,seekrandom,overwrite,mixed",
+                        help=f"Comma-separated, run in order: {','.join(WORKLOADS)}")
+    parser.add_argument("--num", type=int, default=100_000, help="Keys written by fill/overwrite (= the keyspace)")
+    parser.add_argument("--reads", type=int, default=None, help="Ops for read/mixed workloads (default: --num)")
+    parser.add_argument("--seeks", type=int, default=None, help="Ops for seekrandom (default: --reads / 10)")
+    parser.add_argument("--seek-nexts", type=int, default=10, help="Keys read after each seek")
+    parser.add_argument("--key-size", type=int, default=16)
+    parser.add_argument("--value-size", type=int, default=100)
+    parser.add_argument("--compression-ratio", type=float, default=0.5, help="How compressible generated values are")
+    parser.add_argument("--distribution", choices=["uniform", "zipfian"], default="uniform",
+                        help="Key choice for overwrite/read/seek/mixed")
+    parser.add_argument("--zipf-theta", type=float, default=0.99)
+    parser.add_argument("--read-ratio", type=float, default=0.9, help="Share of reads in the mixed workload")
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=301)
+    parser.add_argument("--memtable-limit", type=int, default=10_000)
+    parser.add_argument("--bits-per-key", type=int, default=BITS_PER_KEY)
+    parser.add_argument("--compaction", choices=["leveled", "size_tiered", "none"], default="leveled")
+    parser.add_argument("--compression", nargs="+", default=list(DEFAULT_COMPRESSION), help="Codec per level")
+    parser.add_argument("--cache-mb", type=float, default=8)
+    parser.add_argument("--sync-mode", choices=["none", "batch", "interval"], default="none")
+    parser.add_argument("--no-settle", dest="settle", action="store_false",
+                        help="Don't wait for flushes/compactions between workloads")
+    parser.add_argument("--db", help="Directory to use (default: a temp dir, deleted at the end)")
+    parser.add_argument("--use-existing-db", action="store_true", help="fill* workloads don't wipe the store")
+    parser.add_argument("--json", metavar="PATH", help="Write the results as JSON ('-' = stdout)")
+    args = parser.parse_args()
+    args.reads = args.reads or args.num
+    args.seeks = args.seeks or max(args.threads, args.reads // 10)
+    if args.threads < 1:
+        parser.error("--threads must be at least 1")
+    for flag in ("num", "reads", "seeks"):
+        if getattr(args, flag) < args.threads:
+            parser.error(f"--{flag} must be at least --threads ({args.threads}), or some threads would do nothing")
+    if args.distribution == "zipfian":
+        if not 0 < args.zipf_theta < 1:
+            parser.error("--zipf-theta must be in (0, 1)")
+        if args.num < 3:
+            parser.error("--num must be at least 3 for the zipfian distribution")
+    if args.compaction == "none":
+        args.compaction = None
+    benchmarks = [b for b in args.benchmarks.split(",") if b]
+    for name in benchmarks:
+        if name not in WORKLOADS:
+            parser.error(f"unknown benchmark {name!r}; choose from {','.join(WORKLOADS)}")
+
+    print(f"--- 🏁 db_bench: {args.num:,} keys | {args.key_size} B keys, {args.value_size} B values | "
+          f"{args.distribution} | {args.threads} thread(s) | compaction {args.compaction} ---", file=sys.stderr)
+    bench = Bench(args)
+    results = []
+    try:
+        for name in benchmarks:
+            results.append(bench.run(name))
+            report(results[-1])
+    finally:
+        bench.close()
+
+    if args.json:
+        output = json.dumps({"config": vars(args), "results": results}, indent=2)
+        if args.json == "-":
+            print(output)
+        else:
+            with open(args.json, "w") as f:
+                f.write(output + "\n")
+            print(f"Results written to {args.json}", file=sys.stderr)
@@ -0,0 +1,661 @@
+import argparse
+import bisect
+import json
+import os
+import random
+import shutil
+import struct
+import tempfile
+import threading
+import time
+
+from compaction import COMPACTION_STRATEGIES
+from lsm_demo import LSMTree, WriteBatch
+from partitioned_store import PartitionedLSM
+from sstable import BLOCK_SIZE, COMPRESSION_CODECS, MISSING, write_sstable
+from wal import SYNC_MODES
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+
+def make_tables(num_keys, num_tables):
+    """Splits num_keys random keys across num_tables sorted (key, seq, value) runs, like repeated flushes."""
+    keys = [f"user:{i:09d}" for i in range(num_keys)]
+    random.shuffle(keys)
+    per_table = num_keys // num_tables
+    runs = []
+    for t in range(num_tables):
+        chunk = keys[t * per_table:(t + 1) * per_table]
+        runs.append([(k, t + 1, f"value_{k}") for k in sorted(chunk)])
+    return keys, runs
+
+
+# --- Old path: json.load every SSTable, newest to oldest ---
+
+def json_read(filenames, key):
+    for filename in reversed(filenames):
+        with open(filename, "r") as f:
+            data = json.load(f)
+            if key in data:
+                return data[key]
+    return None
+
+
+# --- New path: bisect the in-memory sparse index, read one block ---
+
+def indexed_read(sstables, key):
+    for sstable in reversed(sstables):
+        value = sstable.get(key)
+        if value is not MISSING:
+            return value
+    return None
+
+
+# --- Previous SSTable format: JSON blocks + JSON index, read with seek() + json.loads ---
+
+JSON_FOOTER = struct.Struct("<Q")
+
+
+def write_json_sstable(filename, items, block_size=BLOCK_SIZE):
+    index, offset, block, block_bytes, last_key = [], 0, [], 0, None
+    with open(filename, "wb") as f:
+        for key, _, value in items:
+            entry = json.dumps([key, value]).encode("utf-8")
+            block.append(entry)
+            block_bytes += len(entry) + 1
+            last_key = key
+            if block_bytes >= block_size:
+                data = b"[" + b",".join(block) + b"]"
+                f.write(data)
+                index.append([json.loads(block[0])[0], offset, len(data)])
+                offset += len(data)
+                block, block_bytes = [], 0
+        if block:
+            data = b"[" + b",".join(block) + b"]"
+            f.write(data)
+            index.append([json.loads(block[0])[0], offset, len(data)])
+            offset += len(data)
+        f.write(json.dumps({"blocks": index, "last_key": last_key}).encode("utf-8"))
+        f.write(JSON_FOOTER.pack(offset))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class JsonSSTable:
+    def __init__(self, filename):
+        self.f = open(filename, "rb")
+        self.f.seek(-JSON_FOOTER.size, os.SEEK_END)
+        end = self.f.tell()
+        (index_offset,) = JSON_FOOTER.unpack(self.f.read(JSON_FOOTER.size))
+        self.f.seek(index_offset)
+        index = json.loads(self.f.read(end - index_offset))
+        self.first_keys = [b[0] for b in index["blocks"]]
+        self.blocks = [(b[1], b[2]) for b in index["blocks"]]
+
+    def get(self, key):
+        i = bisect.bisect_right(self.first_keys, key) - 1
+        if i < 0:
+            return MISSING
+        offset, length = self.blocks[i]
+        self.f.seek(offset)
+        for k, v in json.loads(self.f.read(length)):
+            if k == key:
+                return v
+        return MISSING
+
+    def close(self):
+        self.f.close()
+
+
+def bench_format(num_keys, num_tables, reads):
+    """Same runs written in both formats: bytes on disk, flush time, point and scan reads."""
+    directory = tempfile.mkdtemp(prefix="lsm_bench_")
+    try:
+        keys, runs = make_tables(num_keys, num_tables)
+        sample = random.sample(keys[:len(runs) * len(runs[0])], reads)
+        results = {}
+        for name, write, open_table, ext in (
+            ("json", write_json_sstable, JsonSSTable, "json"),
+            ("binary", write_sstable, None, "sst"),
+        ):
+            files, tables = [], []
+            start = time.perf_counter()
+            for t, run in enumerate(runs):
+                files.append(os.path.join(directory, f"{name}_{t}.{ext}"))
+                table = write(files[-1], run)
+                tables.append(table if open_table is None else open_table(files[-1]))
+            flush_secs = time.perf_counter() - start
+
+            samples = time_reads(indexed_read, tables, sample)
+            results[name] = {
+                "bytes": sum(os.path.getsize(f) for f in files),
+                "flush_ms": flush_secs * 1000,
+                "avg_us": sum(samples) / reads * 1e6,
+                "p99_us": percentile(samples, 99) * 1e6,
+            }
+            for table in tables:
+                table.close()
+        return results
+    finally:
+        shutil.rmtree(directory)
+
+
+def user_record(i):
+    """A text-heavy value, like the user records the store actually holds."""
+    first = random.choice(["alice", "bob", "carol", "dave", "erin", "frank", "grace", "heidi"])
+    city = random.choice(["London", "Paris", "Berlin", "Madrid", "Rome", "Lisbon", "Vienna"])
+    return json.dumps({"id": i, "name": first.title(), "email": f"{first}{i}@example.com",
+                       "city": city, "plan": random.choice(["free", "pro", "team"]),
+                       "signup": f"2024-{random.randint(1, 12):02d}-{random.randint(1, 28):02d}"})
+
+
+def bench_compression(num_keys, num_tables, reads):
+    """Same user-record runs per codec: bytes on disk, write time, full scans and uncached point reads."""
+    directory = tempfile.mkdtemp(prefix="lsm_bench_")
+    try:
+        keys, runs = make_tables(num_keys, num_tables)
+        runs = [[(k, seq, user_record(i)) for i, (k, seq, _) in enumerate(run)] for run in runs]
+        sample = random.sample(keys[:len(runs) * len(runs[0])], reads)
+        results = {}
+        for codec in COMPRESSION_CODECS:
+            start = time.perf_counter()
+            tables = [write_sstable(os.path.join(directory, f"{codec}_{t}.sst"), run, compression=codec)
+                      for t, run in enumerate(runs)]
+            write_secs = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for table in tables:
+                for _ in table.scan():
+                    pass
+            scan_secs = time.perf_counter() - start
+
+            samples = time_reads(indexed_read, tables, sample)  # No cache: every read decompresses a block
+            results[codec] = {
+                "bytes": sum(t.size for t in tables),
+                "write_ms": write_secs * 1000,
+                "scan_ms": scan_secs * 1000,
+                "avg_us": sum(samples) / reads * 1e6,
+                "p99_us": percentile(samples, 99) * 1e6,
+            }
+            for table in tables:
+                table.close()
+        for r in results.values():
+            r["ratio"] = results["none"]["bytes"] / r["bytes"]
+        return results
+    finally:
+        shutil.rmtree(directory)
+
+
+def time_reads(read, tables, keys):
+    samples = []
+    for key in keys:
+        start = time.perf_counter()
+        read(tables, key)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_read_latency(num_keys, num_tables, reads, json_reads):
+    directory = tempfile.mkdtemp(prefix="lsm_bench_")
+    try:
+        keys, runs = make_tables(num_keys, num_tables)
+
+        json_files, sstables = [], []
+        for t, run in enumerate(runs):
+            json_file = os.path.join(directory, f"legacy_{t}.json")
+            with open(json_file, "w") as f:
+                json.dump({k: v for k, _, v in run}, f)
+            json_files.append(json_file)
+            sstables.append(write_sstable(os.path.join(directory, f"sstable_{t}.sst"), run))
+
+        # Same random keys for both paths (the JSON path just gets fewer of them)
+        sample = random.sample(keys[:len(runs) * len(runs[0])], reads)
+
+        results = {}
+        for name, read, tables, n in (
+            ("json", json_read, json_files, json_reads),
+            ("indexed", indexed_read, sstables, reads),
+        ):
+            samples = time_reads(read, tables, sample[:n])
+            results[name] = {
+                "reads": n,
+                "avg_ms": sum(samples) / n * 1000,
+                "p99_ms": percentile(samples, 99) * 1000,
+            }
+        for sstable in sstables:
+            sstable.close()
+        return results
+    finally:
+        shutil.rmtree(directory)
+
+
+def bench_bloom(num_keys, num_tables, reads, bits_per_key):
+    """Missing-key reads: how many tables does each bits_per_key setting still touch?"""
+    directory = tempfile.mkdtemp(prefix="lsm_bench_")
+    try:
+        _, runs = make_tables(num_keys, num_tables)
+        sstables = [write_sstable(os.path.join(directory, f"sstable_{t}.sst"), run, bits_per_key=bits_per_key)
+                    for t, run in enumerate(runs)]
+        # Keys that sort between real keys, so the index alone cannot rule them out
+        misses = [f"user:{random.randrange(num_keys):09d}-missing" for _ in range(reads)]
+        samples = time_reads(indexed_read, sstables, misses)
+
+        negatives = sum(t.bloom_negatives for t in sstables)
+        false_positives = sum(t.bloom_false_positives for t in sstables)
+        memory = sum(t.bloom.memory_bytes for t in sstables if t.bloom is not None)
+        for sstable in sstables:
+            sstable.close()
+        return {
+            "bits_per_key": bits_per_key,
+            "false_positive_rate": false_positives / (negatives + false_positives) if bits_per_key else 1.0,
+            "filter_memory_kb": memory / 1024,
+            "avg_ms": sum(samples) / reads * 1000,
+        }
+    finally:
+        shutil.rmtree(directory)
+
+
+def bench_compaction(strategy, num_ops, reads, memtable_limit):
+    """Overwrite-heavy load (keyspace = half the writes, 10% deletes), then random reads."""
+    directory = tempfile.mkdtemp(prefix="lsm_bench_")
+    db = LSMTree(memtable_limit=memtable_limit, compaction=strategy, data_dir=directory, verbose=False)
+    try:
+        keyspace = max(1, num_ops // 2)
+        start = time.perf_counter()
+        for i in range(num_ops):
+            key = f"user:{random.randrange(keyspace):09d}"
+            if i % 10 == 9:
+                db.delete(key)
+            else:
+                db.write(key, f"value_{i}_" + "x" * 50)
+        write_secs = time.perf_counter() - start
+        db.wait_for_compactions()
+
+        for _ in range(reads):
+            db.read(f"user:{random.randrange(keyspace):09d}")
+
+        result = db.amplification()
+        result["writes_per_sec"] = num_ops / write_secs
+        return result
+    finally:
+        db.close()
+        shutil.rmtree(directory)
+
+
+def bench_wal(sync_mode, num_writes, threads, memtable_limit):
+    """Writes/sec with N concurrent writers. More writers = bigger group commits."""
+    directory = tempfile.mkdtemp(prefix="lsm_bench_")
+    db = LSMTree(memtable_limit=memtable_limit, compaction=None, data_dir=directory,
+                 sync_mode=sync_mode, verbose=False)
+    try:
+        per_thread = num_writes // threads
+
+        def writer(t):
+            for i in range(per_thread):
+                db.write(f"user:{t:02d}:{i:09d}", f"value_{i}")
+
+        workers = [threading.Thread(target=writer, args=(t,)) for t in range(threads)]
+        start = time.perf_counter()
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        elapsed = time.perf_counter() - start
+
+        wal = db.wal.stats
+        return {
+            "writes_per_sec": per_thread * threads / elapsed,
+            "avg_batch": wal["records"] / max(1, wal["batches"]),
+            "fsyncs": wal["syncs"],
+        }
+    finally:
+        db.close()
+        shutil.rmtree(directory)
+
+
+def bench_recovery(num_keys, memtable_limit, strategy):
+    """Fill a store, "crash" with a half-full memtable, then time open + first read."""
+    directory = tempfile.mkdtemp(prefix="lsm_bench_")
+    try:
+        db = LSMTree(memtable_limit=memtable_limit, compaction=strategy, data_dir=directory,
+                     sync_mode="none", verbose=False)
+        for i in range(num_keys + memtable_limit // 2):  # The extra half memtable lives only in the WAL
+            db.write(f"user:{random.randrange(num_keys):09d}", f"value_{i}")
+        db.wait_for_compactions()
+        tables = len(db.sstables)
+        db.close()
+
+        start = time.perf_counter()
+        db = LSMTree(memtable_limit=memtable_limit, compaction=strategy, data_dir=directory, verbose=False)
+        opened = time.perf_counter()
+        db.read(f"user:{random.randrange(num_keys):09d}")
+        first_read = time.perf_counter()
+        db.close()
+        return {
+            "tables": tables,
+            "replayed_records": db.recovered_records,
+            "open_ms": (opened - start) * 1000,
+            "first_read_ms": (first_read - start) * 1000,
+        }
+    finally:
+        shutil.rmtree(directory)
+
+
+def bench_block_cache(num_keys, reads, cache_bytes, memtable_limit, hot_fraction=0.1):
+    """Skewed reads (90% go to hot_fraction of the keys) against one cache size."""
+    directory = tempfile.mkdtemp(prefix="lsm_bench_")
+    db = LSMTree(memtable_limit=memtable_limit, compaction="leveled", data_dir=directory,
+                 sync_mode="none", block_cache_bytes=cache_bytes, verbose=False)
+    try:
+        for i in range(num_keys):
+            db.write(f"user:{i:09d}", f"value_{i}_" + "x" * 50)
+        db.flush_to_disk()
+        db.wait_for_flushes()
+        db.wait_for_compactions()
+
+        hot = max(1, int(num_keys * hot_fraction))
+
+        def skewed_keys():
+            return [f"user:{random.randrange(hot) if random.random() < 0.9 else random.randrange(num_keys):09d}"
+                    for _ in range(reads)]
+
+        time_reads(lambda db, key: db.read(key), db, skewed_keys())  # Warm up: measure the steady state
+        before = db.cache_stats()
+        samples = time_reads(lambda db, key: db.read(key), db, skewed_keys())
+        result = db.cache_stats() or {}
+        if before is not None:
+            for kind in ("index", "filter", "data"):
+                hits = result[kind]["hits"] - before[kind]["hits"]
+                misses = result[kind]["misses"] - before[kind]["misses"]
+                result[kind]["hit_rate"] = hits / (hits + misses) if hits + misses else 0.0
+            hits, misses = result["hits"] - before["hits"], result["misses"] - before["misses"]
+            result["hit_rate"] = hits / (hits + misses) if hits + misses else 0.0
+            result["evictions"] -= before["evictions"]
+        result["disk_bytes"] = db.amplification()["disk_bytes"]
+        result["avg_us"] = sum(samples) / reads * 1e6
+        result["p99_us"] = percentile(samples, 99) * 1e6
+        return result
+    finally:
+        db.close()
+        shutil.rmtree(directory)
+
+
+def bench_batch(num_keys, batch_size, memtable_limit, sync_mode):
+    """Bulk load + fan-out reads: one key per call (batch_size=1) vs WriteBatch / multi_get."""
+    directory = tempfile.mkdtemp(prefix="lsm_bench_")
+    db = LSMTree(memtable_limit=memtable_limit, compaction="leveled", data_dir=directory,
+                 sync_mode=sync_mode, verbose=False)
+    try:
+        keys = [f"user:{i:09d}" for i in range(num_keys)]
+        random.shuffle(keys)
+        start = time.perf_counter()
+        for i in range(0, num_keys, batch_size):
+            chunk = keys[i:i + batch_size]
+            if batch_size == 1:
+                db.write(chunk[0], f"value_{chunk[0]}")
+            else:
+                batch = WriteBatch()
+                for key in chunk:
+                    batch.put(key, f"value_{key}")
+                db.write_batch(batch)
+        write_secs = time.perf_counter() - start
+        db.flush_to_disk()
+        db.wait_for_flushes()
+        db.wait_for_compactions()
+
+        random.shuffle(keys)
+        start = time.perf_counter()
+        for i in range(0, num_keys, batch_size):
+            chunk = keys[i:i + batch_size]
+            if batch_size == 1:
+                db.read(chunk[0])
+            else:
+                db.multi_get(chunk)
+        read_secs = time.perf_counter() - start
+        return {
+            "writes_per_sec": num_keys / write_secs,
+            "reads_per_sec": num_keys / read_secs,
+            "wal_records": db.wal.stats["records"],
+            "fsyncs": db.wal.stats["syncs"],
+        }
+    finally:
+        db.close()
+        shutil.rmtree(directory)
+
+
+def bench_partitioned(num_keys, num_shards, batch_size, memtable_limit):
+    """Bulk load + multi_get through the partitioned client; every shard is its own process."""
+    directory = tempfile.mkdtemp(prefix="lsm_bench_")
+    store = PartitionedLSM(num_shards, data_dir=directory, memtable_limit=memtable_limit,
+                           compaction="leveled", sync_mode="none")
+    try:
+        keys = [f"user:{i:09d}" for i in range(num_keys)]
+        random.shuffle(keys)
+        start = time.perf_counter()
+        for i in range(0, num_keys, batch_size):
+            batch = WriteBatch()
+            for key in keys[i:i + batch_size]:
+                batch.put(key, f"value_{key}")
+            store.write_batch(batch)
+        store.flush()  # Counted: flushing and compacting is part of the write work the shards split
+        write_secs = time.perf_counter() - start
+
+        random.shuffle(keys)
+        start = time.perf_counter()
+        for i in range(0, num_keys, batch_size):
+            store.multi_get(keys[i:i + batch_size])
+        read_secs = time.perf_counter() - start
+        return {"writes_per_sec": num_keys / write_secs, "reads_per_sec": num_keys / read_secs}
+    finally:
+        store.close()
+        shutil.rmtree(directory)
+
+
+def bench_ttl(num_writes, memtable_limit, ttl, batch_size=100):
+    """
+    Time-series-like load: ever-increasing keys, nothing overwritten or deleted.
+    Without a TTL the store only grows; with one, expired values are dropped by
+    compaction and fully expired tables are deleted unread.
+    """
+    directory = tempfile.mkdtemp(prefix="lsm_bench_")
+    db = LSMTree(memtable_limit=memtable_limit, compaction="leveled", data_dir=directory,
+                 sync_mode="none", verbose=False)
+    try:
+        peak_bytes = 0
+        tenth = max(1, num_writes // 10)  # Sample disk usage 10 times; read the newest 10% (at least 1 key)
+        start = time.perf_counter()
+        for i in range(0, num_writes, batch_size):
+            batch = WriteBatch()
+            for n in range(i, min(i + batch_size, num_writes)):
+                batch.put(f"sensor:{n:012d}", f"reading_{n}", ttl=ttl)
+            db.write_batch(batch)
+            if i % tenth < batch_size:
+                peak_bytes = max(peak_bytes, db.amplification()["disk_bytes"])
+        write_secs = time.perf_counter() - start
+        db.flush_to_disk()
+        db.wait_for_compactions()
+        amp = db.amplification()
+
+        # Reads of the most recent 10% of keys: the ones a time-series reader asks for
+        recent = range(num_writes - tenth, num_writes)
+        reads_before, probed_before = db.stats["reads"], db.stats["tables_probed"]
+        samples = []
+        for _ in range(1000):
+            key = f"sensor:{random.choice(recent):012d}"
+            t = time.perf_counter()
+            db.read(key)
+            samples.append(time.perf_counter() - t)
+        return {
+            "writes_per_sec": num_writes / write_secs,
+            "peak_mb": max(peak_bytes, amp["disk_bytes"]) / 2**20,
+            "final_mb": amp["disk_bytes"] / 2**20,
+            "tables": amp["tables"],
+            "expired_tables": db.stats["expired_tables"],
+            "read_amplification": (db.stats["tables_probed"] - probed_before) / (db.stats["reads"] - reads_before),
+            "avg_us": sum(samples) / len(samples) * 1e6,
+        }
+    finally:
+        db.close()
+        shutil.rmtree(directory)
+
+
+def bench_write_stalls(num_writes, memtable_limit, max_immutable_memtables):
+    """Per-write latency. max_immutable_memtables=0 makes the writer wait for its flush (the old inline path)."""
+    directory = tempfile.mkdtemp(prefix="lsm_bench_")
+    db = LSMTree(memtable_limit=memtable_limit, compaction=None, data_dir=directory, sync_mode="none",
+                 max_immutable_memtables=max_immutable_memtables, verbose=False)
+    try:
+        samples = []
+        for i in range(num_writes):
+            key = f"user:{random.randrange(num_writes):09d}"
+            start = time.perf_counter()
+            db.write(key, f"value_{i}")
+            samples.append(time.perf_counter() - start)
+        return {p: percentile(samples, p) * 1000 for p in (50, 99, 99.9, 100)}
+    finally:
+        db.close()
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="LSM Tree read-latency benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10**5, 10**6, 10**7])
+    parser.add_argument("--tables", type=int, default=10, help="SSTables the keys are spread over")
+    parser.add_argument("--reads", type=int, default=1000)
+    parser.add_argument("--json-reads", type=int, default=5, help="The old path is slow; sample less")
+    parser.add_argument("--bits-per-key", type=int, nargs="+", default=[0, 5, 10, 15])
+    parser.add_argument("--memtable-limit", type=int, default=1000)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--cache-mb", type=float, nargs="+", default=[0, 0.5, 2, 8, 32])
+    parser.add_argument("--ttl", type=float, default=0.5, help="Seconds each time-series value lives")
+    parser.add_argument("--shards", type=int, nargs="+",
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}), help="Shard processes to scale over")
+    parser.add_argument("--bench", choices=["read_latency", "format", "bloom", "compaction", "wal", "recovery", "write_stalls",
+                                            "block_cache", "compression", "batch", "partitioned", "ttl"],
+                        default="read_latency")
+    args = parser.parse_args()
+    if min(args.sizes) < 1:
+        parser.error("--sizes must all be at least 1")
+
+    if args.bench == "format":
+        print("--- 💾 SSTable Format: JSON Blocks vs Binary + mmap ---")
+        for size in args.sizes:
+            r = bench_format(size, args.tables, args.reads)
+            for name in ("json", "binary"):
+                print(f"{size:>10,} keys | {name:>6} | {r[name]['bytes'] / 2**20:8.1f} MB | "
+                      f"flush {r[name]['flush_ms']:9.1f} ms | read avg {r[name]['avg_us']:7.1f} us  "
+                      f"p99 {r[name]['p99_us']:7.1f} us")
+        raise SystemExit
+
+    if args.bench == "partitioned":
+        print(f"--- 🧩 Partitioned Store: Scaling over Shard Processes ({os.cpu_count()} cores) ---")
+        base = None
+        for shards in args.shards:
+            r = bench_partitioned(args.sizes[0], shards, args.batch_sizes[-1], args.memtable_limit)
+            base = base or r
+            print(f"{shards:>3} shards | {r['writes_per_sec']:>9,.0f} writes/s "
+                  f"({r['writes_per_sec'] / base['writes_per_sec']:4.2f}x) | {r['reads_per_sec']:>9,.0f} reads/s "
+                  f"({r['reads_per_sec'] / base['reads_per_sec']:4.2f}x)")
+        raise SystemExit
+
+    if args.bench == "batch":
+        print("--- 📦 One Key per Call vs WriteBatch / multi_get ---")
+        for sync_mode in ("none", "batch"):
+            for batch_size in args.batch_sizes:
+                r = bench_batch(args.sizes[0], batch_size, args.memtable_limit, sync_mode)
+                print(f"sync {sync_mode:>5} | batch {batch_size:>5} | {r['writes_per_sec']:>9,.0f} writes/s "
+                      f"({r['wal_records']:>7,} WAL records, {r['fsyncs']:>7,} fsyncs) | {r['reads_per_sec']:>9,.0f} reads/s")
+        raise SystemExit
+
+    if args.bench == "compression":
+        print("--- 🗜️  Block Compression per Codec (user records, no block cache) ---")
+        for size in args.sizes:
+            r = bench_compression(size, args.tables, args.reads)
+            for codec, c in r.items():
+                extra = c["avg_us"] - r["none"]["avg_us"]
+                print(f"{size:>10,} keys | {codec:>5} | {c['bytes'] / 2**20:7.1f} MB (ratio {c['ratio']:4.2f}x) | "
+                      f"write {c['write_ms']:8.1f} ms | full scan {c['scan_ms']:8.1f} ms | "
+                      f"read avg {c['avg_us']:6.1f} us ({extra:+6.1f} us to decompress)  p99 {c['p99_us']:6.1f} us")
+        raise SystemExit
+
+    if args.bench == "block_cache":
+        print("--- 🧊 Block Cache Size vs Skewed Reads (90% on 10% of keys) ---")
+        for mb in args.cache_mb:
+            r = bench_block_cache(args.sizes[0], args.reads, int(mb * 2**20), args.memtable_limit)
+            if not mb:
+                print(f"  no cache | data {r['disk_bytes'] / 2**20:6.1f} MB | "
+                      f"read avg {r['avg_us']:6.1f} us  p99 {r['p99_us']:6.1f} us")
+                continue
+            print(f"{mb:>6} MB | data {r['disk_bytes'] / 2**20:6.1f} MB | hit rate {r['hit_rate']:6.1%} "
+                  f"(index {r['index']['hit_rate']:6.1%}, data {r['data']['hit_rate']:6.1%}) | "
+                  f"{r['evictions']:>7} evictions | read avg {r['avg_us']:6.1f} us  p99 {r['p99_us']:6.1f} us")
+        raise SystemExit
+
+    if args.bench == "ttl":
+        print("--- ⌛ Time-Series Writes: No TTL vs TTL (disk use, read amplification) ---")
+        for size in args.sizes:
+            for ttl in (None, args.ttl):
+                r = bench_ttl(size, args.memtable_limit, ttl)
+                print(f"{size:>10,} writes | {'no ttl' if ttl is None else f'ttl {ttl}s':>9} | "
+                      f"{r['writes_per_sec']:>8,.0f} writes/s | disk peak {r['peak_mb']:6.1f} MB, "
+                      f"final {r['final_mb']:6.1f} MB | {r['tables']:>4} tables "
+                      f"({r['expired_tables']:>4} deleted unread) | read amp {r['read_amplification']:4.2f} | "
+                      f"recent-key read avg {r['avg_us']:6.1f} us")
+        raise SystemExit
+
+    if args.bench == "write_stalls":
+        print("--- ⏱️  Write Latency: Inline Flush vs Background Flusher ---")
+        for max_immutable, name in ((0, "inline flush"), (2, "background")):
+            r = bench_write_stalls(args.sizes[0], args.memtable_limit, max_immutable)
+            print(f"{name:>12} | p50 {r[50]:.3f} ms | p99 {r[99]:.3f} ms | "
+                  f"p99.9 {r[99.9]:.3f} ms | max {r[100]:.3f} ms")
+        raise SystemExit
+
+    if args.bench == "recovery":
+        print("--- 💥 Time to First Read after Restart ---")
+        for size in args.sizes:
+            for strategy in (None, "leveled"):
+                r = bench_recovery(size, args.memtable_limit, strategy)
+                print(f"{size:>10,} keys | {strategy or 'no compaction':>13} | {r['tables']:>6} tables | "
+                      f"replayed {r['replayed_records']:>5} WAL records | open {r['open_ms']:8.2f} ms | "
+                      f"first read {r['first_read_ms']:8.2f} ms")
+        raise SystemExit
+
+    if args.bench == "wal":
+        print("--- 🦺 WAL Writes/sec per Durability Mode ---")
+        for mode in SYNC_MODES:
+            for threads in args.threads:
+                r = bench_wal(mode, args.sizes[0], threads, args.memtable_limit)
+                print(f"{mode:>8} | {threads:>2} writers | {r['writes_per_sec']:>9,.0f} writes/s | "
+                      f"avg group commit {r['avg_batch']:5.1f} records | {r['fsyncs']:>6} fsyncs")
+        raise SystemExit
+
+    if args.bench == "compaction":
+        print("--- 🗜️  Amplification per Compaction Strategy ---")
+        for strategy in [None] + list(COMPACTION_STRATEGIES):
+            r = bench_compaction(strategy, args.sizes[0], args.reads, args.memtable_limit)
+            print(f"{strategy or 'none':>12} | write amp {r['write_amplification']:5.2f} | "
+                  f"read amp {r['read_amplification']:5.2f} (runs {r['sorted_runs']:>3}) | "
+                  f"space amp {r['space_amplification']:6.2f} | {r['tables']:>4} tables | "
+                  f"{r['writes_per_sec']:,.0f} writes/s")
+        raise SystemExit
+
+    if args.bench == "bloom":
+        print("--- 🌸 Missing-Key Reads vs Bloom Filter Size ---")
+        for bits in args.bits_per_key:
+            r = bench_bloom(args.sizes[0], args.tables, args.reads, bits)
+            print(f"{bits:>2} bits/key | FP rate {r['false_positive_rate']:6.2%} | "
+                  f"filters {r['filter_memory_kb']:9.1f} KB | miss read avg {r['avg_ms']:.3f} ms")
+        raise SystemExit
+
+    print("--- 📊 Point Read Latency: json.load vs Sparse Index ---")
+    for size in args.sizes:
+        r = bench_read_latency(size, args.tables, args.reads, args.json_reads)
+        speedup = r["json"]["avg_ms"] / r["indexed"]["avg_ms"]
+        print(f"{size:>10,} keys | json.load: avg {r['json']['avg_ms']:9.3f} ms  p99 {r['json']['p99_ms']:9.3f} ms"
+              f" | indexed: avg {r['indexed']['avg_ms']:7.3f} ms  p99 {r['indexed']['p99_ms']:7.3f} ms"
+              f" | {speedup:,.0f}x faster")
@@ -1,101 +1,720 @@
+import bisect
+import math
 import time
-import json
 import os
+import re
+import shutil
+import threading
+
+from block_cache import BLOCK_CACHE_BYTES, BlockCache
+from compaction import (COMPACTION_STRATEGIES, MAX_LEVELS, Version, collapse, expired_tables, merge_entries,
+                        merge_tables, split_by_size, visible)
+from manifest import Manifest
+from memtable import MemTable
+from sstable import BITS_PER_KEY, COMPRESSION_CODECS, MISSING, Expiring, SSTable, unexpired, unwrap, write_sstable
+from wal import SYNC_BATCH, WriteAheadLog, read_wal
+
+# sstable_000042.sst and wal_000043.log share one file-number counter
+SSTABLE_FILE = re.compile(r"sstable_(\d+)\.sst$")
+WAL_FILE = re.compile(r"wal_(\d+)\.log$")
+
+# Codec per level (the last one covers every deeper level). L0/L1 are small and
+# rewritten often, so they stay raw; the big, cold levels below are compressed.
+DEFAULT_COMPRESSION = ("none", "none", "zlib")
+
+
+def wal_number(path):
+    return int(WAL_FILE.match(os.path.basename(path)).group(1))
+
+
+def with_ttl(value, ttl):
+    """The value as stored: with a TTL (seconds), wrapped with the absolute time it expires at."""
+    return value if ttl is None else Expiring(value, time.time() + ttl)
+
+
+class WriteBatch:
+    """
+    Puts and deletes collected by the caller, then handed to LSMTree.write_batch:
+    they become ONE WAL record and land in the memtable together, so after a
+    crash either all of them are there or none is.
+    """
+
+    def __init__(self):
+        self.ops = []
+
+    def put(self, key, value, ttl=None):
+        self.ops.append((key, with_ttl(value, ttl)))
+        return self
+
+    def delete(self, key):
+        self.ops.append((key, None))
+        return self
+
+    def clear(self):
+        self.ops = []
+
+    def __len__(self):
+        return len(self.ops)
+
+
+class Snapshot:
+    """
+    A point-in-time view of the store: reads through it ignore every write
+    with a higher sequence number. Compaction keeps the versions it can see
+    until it is released.
+    """
+
+    def __init__(self, db, seq):
+        self.db = db
+        self.seq = seq
+
+    def release(self):
+        self.db.release_snapshot(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
 
 class LSMTree:
-    def __init__(self, memtable_limit=3):
-        self.memtable = {}
+    def __init__(self, memtable_limit=3, bits_per_key=BITS_PER_KEY, compaction="leveled",
+                 data_dir=".", sync_mode=SYNC_BATCH, max_immutable_memtables=2,
+                 block_cache_bytes=BLOCK_CACHE_BYTES, compression=DEFAULT_COMPRESSION, verbose=True):
+        self.memtable = MemTable()  # Sorted, so flushes need no sort and scans can seek
         self.memtable_limit = memtable_limit
-        self.sstables = []  # List of filenames
-        self.wal_file = "wal.log"
-        
-        # Ensure clean state
-        if os.path.exists(self.wal_file):
-            os.remove(self.wal_file)
-
-    def write(self, key, value):
-        """Writes to MemTable and WAL."""
-        print(f"📝 WRITE: {key} -> {value}")
-        
-        # 1. Append to Write-Ahead Log (WAL) for durability
-        with open(self.wal_file, "a") as f:
-            f.write(f"{key}:{value}\n")
-        
-        # 2. Write to In-Memory MemTable
-        self.memtable[key] = value
-        
+        # Full memtables, frozen and waiting for the background flusher (Oldest -> Newest).
+        # Reads still consult them. Writers stall once more than this many are waiting.
+        self.immutables = []
+        self.max_immutable_memtables = max_immutable_memtables
+        self.bits_per_key = bits_per_key  # Bloom filter size per SSTable (0 = no filter)
+        # One LRU of decoded blocks shared by every SSTable (0 = none: index/filters pinned in RAM)
+        self.block_cache = BlockCache(block_cache_bytes) if block_cache_bytes else None
+        # Block codec: one name for every level, or one per level
+        self.compression = (compression,) if isinstance(compression, str) else tuple(compression)
+        if not self.compression or any(c not in COMPRESSION_CODECS for c in self.compression):
+            raise ValueError(f"compression must be one of {tuple(COMPRESSION_CODECS)}, or a list of them per level")
+        self.data_dir = data_dir
+        self.verbose = verbose
+        os.makedirs(data_dir, exist_ok=True)
+        self.next_file_number = 1
+
+        # Counters behind amplification()
+        self.stats = {"user_bytes": 0, "flush_bytes": 0, "compaction_bytes": 0,
+                      "compactions": 0, "expired_tables": 0, "reads": 0, "tables_probed": 0}
+
+        # Guards the memtables and self.version. Flush and compaction I/O run WITHOUT it.
+        self._lock = threading.RLock()
+        self._flush_cv = threading.Condition(self._lock)
+        self._compaction_cv = threading.Condition(self._lock)
+        self._compacting = False
+        self._flush_error = None       # Set if a flush failed: re-raised to writers and flush waiters
+        self._compaction_error = None  # Set if a compaction failed: re-raised to writers and waiters
+        self._closed = False
+
+        # Every write gets the next sequence number. last_sequence is the newest one
+        # readers may see: a write (or a whole batch) becomes visible all at once.
+        self.last_sequence = 0
+        self._snapshots = []  # Sequence numbers of live snapshots, sorted (may repeat)
+
+        # Crash recovery: MANIFEST -> live tables, WAL tail -> memtable.
+        # self.version holds the live SSTables, level by level. It is swapped
+        # (never edited) on flush/compaction.
+        self.manifest = Manifest(data_dir)
+        self._logs = []  # WAL files whose data is only in the active memtable
+        self.recovered_records = self._recover()
+
+        # Binary, always-open, group-committed. sync_mode: "none", "batch" or "interval"
+        self.wal = WriteAheadLog(self._wal_filename(self._new_file_number()), sync_mode=sync_mode,
+                                 last_sequence=self.last_sequence)
+        self._logs.append(self.wal.filename)
+
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flusher.start()
+
+        # Background compaction: "leveled", "size_tiered", a strategy object, or None
+        if isinstance(compaction, str):
+            compaction = COMPACTION_STRATEGIES[compaction]()
+        self.compaction = compaction
+        if compaction is not None:
+            self._compactor = threading.Thread(target=self._compaction_loop, daemon=True)
+            self._compactor.start()
+
+    @property
+    def sstables(self):
+        """Every live SSTable, level by level."""
+        return list(self.version.tables())
+
+    def _log(self, message):
+        if self.verbose:
+            print(message)
+
+    def write(self, key, value, ttl=None):
+        """Writes to MemTable and WAL. With a ttl (seconds), the key reads as deleted once it has passed."""
+        self._log(f"📝 WRITE: {key} -> {value}" + (f" (ttl {ttl}s)" if ttl is not None else ""))
+        self._put(key, with_ttl(value, ttl))
+
+    def delete(self, key):
+        """Deletes are writes too: a tombstone (None) shadows older values until compaction drops it."""
+        self._log(f"🗑️  DELETE: {key}")
+        self._put(key, None)
+
+    def write_batch(self, batch):
+        """Applies a WriteBatch atomically: one WAL record, one memtable update, one limit check."""
+        if not batch.ops:
+            return
+        self._log(f"📦 WRITE BATCH: {len(batch)} ops")
+        self._put_ops(list(batch.ops))
+
+    def _put(self, key, value):
+        self._put_ops([(key, value)])
+
+    def _put_ops(self, ops):
+        for error in (self._flush_error, self._compaction_error):
+            if error is not None:
+                raise error  # Without flushes or compactions, memory or L0 would only grow
+        # 1. Append to Write-Ahead Log (WAL) for durability. Concurrent writers
+        #    share one write + fsync; the WAL then calls _apply in log order.
+        self.wal.append(ops, self._apply)
+
         # 3. Check if MemTable is full
         if len(self.memtable) >= self.memtable_limit:
-            self.flush_to_disk()
+            self._switch_if_full()
+
+    def _apply(self, ops, seq):
+        # 2. Write to In-Memory MemTable, each op tagged with its sequence number
+        with self._lock:
+            for i, (key, value) in enumerate(ops):
+                self.memtable.put(key, seq + i, value)
+                self.stats["user_bytes"] += len(key) + len(unwrap(value) or "")
+            self.last_sequence = seq + len(ops) - 1  # Publish: readers see all of ops, or none
+
+    def snapshot(self):
+        """A handle for repeatable reads: pass it to read/multi_get/scan, release() it when done."""
+        with self._lock:
+            bisect.insort(self._snapshots, self.last_sequence)
+            return Snapshot(self, self.last_sequence)
+
+    def release_snapshot(self, snapshot):
+        with self._lock:
+            self._snapshots.remove(snapshot.seq)
+
+    def _acquire(self, snapshot=None):
+        """
+        The memtables (Newest -> Oldest), the pinned Version and the sequence number a read
+        should use. The lock is only held for these few assignments, never for the search.
+        """
+        with self._lock:
+            memtables = [self.memtable] + [m for m, _ in reversed(self.immutables)]
+            self.version.refs += 1  # Compaction must not delete files under the read
+            seq = self.last_sequence if snapshot is None else snapshot.seq
+            return memtables, self.version, seq
+
+    def _new_file_number(self):
+        with self._lock:
+            number = self.next_file_number
+            self.next_file_number += 1
+        return number
+
+    def _sstable_filename(self, number):
+        return os.path.join(self.data_dir, f"sstable_{number:06d}.sst")
+
+    def _compression(self, level):
+        return self.compression[min(level, len(self.compression) - 1)]
+
+    def _wal_filename(self, number):
+        return os.path.join(self.data_dir, f"wal_{number:06d}.log")
+
+    def _recover(self):
+        """
+        Rebuilds state after a restart (clean or crash):
+        1. Replay the MANIFEST edits -> which tables live in which level.
+           Tables are NOT opened; their index loads on first read.
+        2. Replay only the WAL files not yet covered by an SSTable (the tail).
+        3. Delete leftovers of an interrupted flush/compaction.
+        """
+        self.manifest.load()
+        levels = [[] for _ in range(MAX_LEVELS)]
+        for level, files in self.manifest.levels.items():
+            for file, (min_key, max_key, size, order, max_expiry) in files.items():
+                sstable = SSTable(os.path.join(self.data_dir, file), min_key, max_key, size, cache=self.block_cache,
+                                  max_expiry=math.inf if max_expiry is None else max_expiry)
+                sstable.order = order
+                levels[level].append(sstable)
+        levels[0].sort(key=lambda t: t.order)  # Oldest -> Newest
+        for level in levels[1:]:
+            level.sort(key=lambda t: t.min_key)
+        self.version = Version(levels)
+        self.last_sequence = self.manifest.last_sequence
+
+        live = self.manifest.live_files()
+        max_number = self.manifest.next_file_number - 1
+        logs = []
+        for name in os.listdir(self.data_dir):
+            path = os.path.join(self.data_dir, name)
+            if match := WAL_FILE.match(name):
+                number = int(match.group(1))
+                if number < self.manifest.log_number:
+                    os.remove(path)  # Already flushed into an SSTable
+                else:
+                    logs.append((number, path))
+            elif match := SSTABLE_FILE.match(name):
+                number = int(match.group(1))
+                if name not in live:
+                    os.remove(path)  # Written, but never made it into the MANIFEST
+            else:
+                continue
+            max_number = max(max_number, number)
+        self.next_file_number = max_number + 1
+
+        replayed = 0
+        for _, path in sorted(logs):
+            for seq, ops in read_wal(path):
+                for i, (key, value) in enumerate(ops):
+                    self.memtable.put(key, seq + i, value)
+                self.last_sequence = max(self.last_sequence, seq + len(ops) - 1)
+                replayed += 1
+            self._logs.append(path)
+        if replayed:
+            self._log(f"♻️  RECOVERED {len(self.memtable)} keys from {len(logs)} WAL file(s)")
+        return replayed
+
+    def _install(self, levels, log_number=None):
+        """Makes a new set of live tables current and records it in the MANIFEST. Call with the lock held."""
+        old = self.version
+        edit = {"add": [], "delete": [], "next_file_number": self.next_file_number,
+                "last_sequence": self.last_sequence}
+        for n, (before, after) in enumerate(zip(old.levels, levels)):
+            before_set, after_set = set(before), set(after)
+            edit["add"] += [[n, os.path.basename(t.filename), t.min_key, t.max_key, t.size, t.order,
+                             None if t.max_expiry == math.inf else t.max_expiry]
+                            for t in after if t not in before_set]
+            edit["delete"] += [[n, os.path.basename(t.filename)] for t in before if t not in after_set]
+        if log_number is not None:
+            edit["log_number"] = log_number
+        self.manifest.log_edit(edit)  # Durable first: a crash now recovers the new state
+
+        self.version = Version(levels)
+        if old.refs == 0:
+            old.drop()
+
+    def _release_version(self, version):
+        with self._lock:
+            version.refs -= 1
+            if version.refs == 0 and version is not self.version:
+                version.drop()
+
+    def _switch_if_full(self):
+        # No group commit may be in flight: each WAL must match exactly one memtable
+        with self.wal.exclusive(), self._lock:
+            if len(self.memtable) >= self.memtable_limit:  # Another writer may have switched already
+                self._switch_memtable()
+
+            # Backpressure: the flusher is falling behind, so stall ALL writers
+            # (we hold the WAL) until it catches up.
+            while (len(self.immutables) > self.max_immutable_memtables and not self._closed and
+                   self._flush_error is None):
+                self._flush_cv.wait()
+            if self._flush_error is not None:
+                raise self._flush_error
+
+    def _switch_memtable(self):
+        """Freezes the memtable and starts a fresh one + WAL. O(1): no sorting or disk writes here."""
+        new_log = self._wal_filename(self._new_file_number())
+        self.wal.rotate(new_log)
+        self.immutables.append((self.memtable, self._logs))
+        self.memtable = MemTable()
+        self._logs = [new_log]
+        self._log(f"⚠️  MEMTABLE FULL! Frozen; {len(self.immutables)} waiting for the background flusher...")
+        self._flush_cv.notify_all()
 
     def flush_to_disk(self):
-        """Flushes MemTable to a new SSTable on disk."""
-        filename = f"sstable_{int(time.time())}.json"
-        print(f"⚠️  MEMTABLE FULL! Flushing to {filename}...")
-        
-        # Sort keys for efficient searching (SSTable property)
-        sorted_data = dict(sorted(self.memtable.items()))
-        
-        with open(filename, "w") as f:
-            json.dump(sorted_data, f)
-            
-        self.sstables.append(filename)
-        self.memtable.clear()  # Reset MemTable
-        
-        # Clear WAL since data is now persisted in SSTable
-        open(self.wal_file, 'w').close()
-        print("✅ FLUSH COMPLETE. MemTable cleared.")
-
-    def read(self, key):
-        """Reads from MemTable first, then checks SSTables (Newest -> Oldest)."""
-        print(f"🔍 READ: Searching for '{key}'...")
-        
-        # 1. Check MemTable (Fastest)
-        if key in self.memtable:
-            print(f"   Found in MemTable: {self.memtable[key]}")
-            return self.memtable[key]
-        
-        # 2. Check SSTables (Newest to Oldest)
-        for filename in reversed(self.sstables):
+        """Freezes the MemTable and waits until every frozen MemTable is on disk."""
+        with self.wal.exclusive(), self._lock:
+            if self.memtable:
+                self._switch_memtable()
+        self.wait_for_flushes()
+
+    def wait_for_flushes(self):
+        """Blocks until every frozen MemTable is on disk. Raises the error a failed flush hit."""
+        with self._lock:
+            while self.immutables and self._flush_error is None:
+                self._flush_cv.wait()
+            if self._flush_error is not None:
+                raise self._flush_error
+
+    def _flush_loop(self):
+        """Background flusher: writes the OLDEST frozen memtable to an SSTable, one at a time."""
+        while True:
+            with self._lock:
+                while not self._closed and not self.immutables:
+                    self._flush_cv.wait()
+                if not self.immutables:
+                    return  # Closed, and everything frozen is on disk
+                memtable, logs = self.immutables[0]
+                snapshots = list(self._snapshots)
+
             try:
-                with open(filename, "r") as f:
-                    data = json.load(f)
-                    if key in data:
-                        print(f"   Found in {filename}: {data[key]}")
-                        return data[key]
-            except FileNotFoundError:
-                continue
-                
-        print("   ❌ Key not found.")
+                # The skiplist is already sorted (SSTable property), so this is one pass.
+                # Overwritten versions no snapshot can see are dropped on the way,
+                # and values already past their TTL are written as tombstones.
+                # The file also gets a sparse block index so reads never parse it whole.
+                # The frozen memtable never changes, so no lock is needed.
+                number = self._new_file_number()
+                filename = self._sstable_filename(number)
+                entries = collapse(memtable.items(), snapshots, drop_tombstone=lambda key: False, now=time.time())
+                sstable = write_sstable(filename, entries, bits_per_key=self.bits_per_key,
+                                        cache=self.block_cache, compression=self._compression(0))
+                sstable.order = number  # L0 age order, persisted in the MANIFEST
+
+                with self._lock:
+                    # New flushes always land in L0 (the newest tables). The MANIFEST also
+                    # records the oldest WAL still needed: the next memtable's first one.
+                    next_logs = self.immutables[1][1] if len(self.immutables) > 1 else self._logs
+                    levels = [list(level) for level in self.version.levels]
+                    levels[0].append(sstable)
+                    self._install(levels, log_number=wal_number(next_logs[0]))
+                    self.immutables.pop(0)
+                    self.stats["flush_bytes"] += sstable.size
+                    self._log(f"✅ FLUSH COMPLETE: {filename}")  # Before waiters wake, so demo output stays in order
+                    self._flush_cv.notify_all()       # Unblock stalled writers
+                    self._compaction_cv.notify_all()  # Wake the compactor
+            except BaseException as e:
+                with self._lock:
+                    self._flush_error = e  # Fatal, like a failed compaction: the memtable stays queued
+                    self._flush_cv.notify_all()  # Wake stalled writers and waiters so they see it
+                return
+
+            # The frozen memtable's WALs are now persisted in the SSTable
+            for path in logs:
+                os.remove(path)
+
+    def read(self, key, snapshot=None):
+        """Reads from MemTable first, then checks SSTables (Newest -> Oldest), as of snapshot (default: now)."""
+        self._log(f"🔍 READ: Searching for '{key}'...")
+        memtables, version, seq = self._acquire(snapshot)
+        now = time.time()
+
+        probed = 0
+        try:
+            # 1. Check MemTable, then frozen MemTables waiting to flush (Fastest)
+            for memtable in memtables:
+                value = memtable.get(key, seq)
+                if value is not MISSING:
+                    value = unexpired(value, now)
+                    self._log(f"   Found in MemTable: {value if value is not None else '(deleted)'}")
+                    return value  # None here means "deleted" (or expired)
+
+            # 2. Check SSTables (Newest to Oldest). Only tables whose key range covers
+            #    the key are candidates; the Bloom filter then skips most of those,
+            #    otherwise bisect the index and read one block.
+            for sstable in version.candidates(key):
+                probed += 1
+                value = sstable.get(key, seq)
+                if value is not MISSING:
+                    value = unexpired(value, now)
+                    self._log(f"   Found in {sstable.filename}: {value if value is not None else '(deleted)'}")
+                    return value
+        finally:
+            self._release_version(version)
+            with self._lock:
+                self.stats["reads"] += 1
+                self.stats["tables_probed"] += probed
+
+        self._log("   ❌ Key not found.")
         return None
 
+    def multi_get(self, keys, snapshot=None):
+        """
+        Reads many keys at once, as of snapshot (default: now). Returns {key: value} (None = not found).
+
+        The keys are sorted, then each SSTable is probed ONCE with the sorted
+        slice of still-unresolved keys that falls in its range, so a block
+        shared by several keys is read (and decompressed) only once.
+        """
+        keys = list(keys)  # Any iterable: it is walked more than once below
+        memtables, version, seq = self._acquire(snapshot)
+        now = time.time()
+        results = {}
+        remaining = []
+        for key in sorted(set(keys)):
+            for memtable in memtables:
+                value = memtable.get(key, seq)
+                if value is not MISSING:
+                    results[key] = value
+                    break
+            else:
+                remaining.append(key)
+
+        probed = 0
+
+        def probe(tables):
+            """Probes each table with the remaining keys in its range. Returns what they resolved."""
+            nonlocal probed
+            found = {}
+            for table in tables:
+                lo = bisect.bisect_left(remaining, table.min_key)
+                hi = bisect.bisect_right(remaining, table.max_key)
+                if lo < hi:
+                    probed += hi - lo
+                    found.update(table.multi_get(remaining[lo:hi], seq))
+            return found
+
+        try:
+            # L0 tables overlap: Newest -> Oldest, one at a time. Each deeper level is one sorted run.
+            runs = [[table] for table in reversed(version.levels[0])] + list(version.levels[1:])
+            for tables in runs:
+                if not remaining:
+                    break
+                found = probe(tables)
+                if found:
+                    results.update(found)
+                    remaining = [k for k in remaining if k not in found]
+        finally:
+            self._release_version(version)
+            with self._lock:
+                self.stats["reads"] += len(keys)
+                self.stats["tables_probed"] += probed
+
+        results = {key: unexpired(value, now) for key, value in results.items()}
+        self._log(f"🔍 MULTI-GET: {len(keys)} keys, {sum(v is not None for v in results.values())} found")
+        return {key: results.get(key) for key in keys}
+
+    def scan(self, start=None, end=None, snapshot=None):
+        """
+        Yields (key, value) for start <= key < end in key order, e.g. scan("user:", "user;").
+
+        Lazily heap-merges the MemTable, the frozen MemTables and every SSTable,
+        keeping for each key the newest version as of the scan's start (or the
+        snapshot), so writes made while it runs never show up half-way through.
+        Deleted and expired keys are skipped. Each SSTable only holds one block
+        in memory at a time, so even a full scan streams.
+        """
+        memtables, version, seq = self._acquire(snapshot)
+        now = time.time()
+        try:
+            sources = [m.items(start) for m in memtables]
+            sources += [t.scan(start) for t in version.levels[0]
+                        if (start is None or t.max_key >= start) and (end is None or t.min_key < end)]
+            sources += [version.scan_level(n, start) for n in range(1, len(version.levels))]
+            for key, value in visible(merge_entries(sources), seq):
+                if end is not None and key >= end:
+                    break
+                value = unexpired(value, now)
+                if value is not None:
+                    yield key, value
+        finally:
+            self._release_version(version)
+
+    # --- Compaction ---
+
+    def _compaction_loop(self):
+        while True:
+            with self._lock:
+                while not self._closed:
+                    self._drop_expired()
+                    if (job := self.compaction.pick(self.version)) is not None:
+                        break
+                    self._compaction_cv.wait(self._until_next_expiry())  # Or until new tables arrive
+                if self._closed:
+                    return
+                self._compacting = True
+                self.version.refs += 1
+                version = self.version
+                snapshots = list(self._snapshots)  # Later snapshots only need the newest versions
+            try:
+                self._run_compaction(version, job, snapshots)
+            except BaseException as e:
+                with self._lock:
+                    self._compaction_error = e  # Fatal, like a broken WAL: stop compacting, fail later writes
+                return
+            finally:
+                self._release_version(version)
+                with self._lock:
+                    self._compacting = False
+                    self._compaction_cv.notify_all()
+
+    def _drop_expired(self):
+        """Deletes every table whose entries have all expired, without reading it. Call with the lock held."""
+        expired = set(expired_tables(self.version, time.time()))
+        if not expired:
+            return
+        self._install([[t for t in level if t not in expired] for level in self.version.levels])
+        self.stats["expired_tables"] += len(expired)
+        self._log(f"⌛ EXPIRED: {len(expired)} tables deleted unread")
+
+    def _until_next_expiry(self):
+        """Seconds until the next table could fully expire (None = no table ever will)."""
+        now = time.time()
+        pending = [t.max_expiry for t in self.version.tables() if now < t.max_expiry < math.inf]
+        return min(pending) - now if pending else None
+
+    def _run_compaction(self, version, job, snapshots=()):
+        """
+        Merges job.inputs into new tables, keeping versions live snapshots can see
+        and turning expired values into tombstones. Writers keep going.
+        """
+        if job.trivial_move:
+            outputs = job.inputs  # Nothing overlaps below: re-link the file, no rewrite
+        else:
+            merged = merge_tables(job.inputs, self.compaction.drop_tombstone(version, job), snapshots, time.time())
+            outputs = []
+            for chunk in split_by_size(merged, job.max_output_bytes):
+                filename = self._sstable_filename(self._new_file_number())
+                outputs.append(write_sstable(filename, chunk, bits_per_key=self.bits_per_key,
+                                             cache=self.block_cache,
+                                             compression=self._compression(job.output_level)))
+            for sstable in outputs:
+                sstable.order = max(t.order for t in job.inputs)  # As old as its newest input
+
+        with self._lock:
+            levels = [list(level) for level in self.version.levels]
+            self.compaction.install(levels, job, outputs)
+            self._install(levels)
+            if not job.trivial_move:
+                self.stats["compactions"] += 1
+                self.stats["compaction_bytes"] += sum(t.size for t in outputs)
+        self._log(f"🗜️  COMPACTION ({self.compaction.name}): {len(job.inputs)} tables "
+                  f"L{job.level} -> {len(outputs)} tables L{job.output_level}")
+
+    def wait_for_compactions(self):
+        """Blocks until the compactor has nothing left to do. Raises the error a failed compaction hit."""
+        if self.compaction is None:
+            return
+        with self._lock:
+            while self._compaction_error is None and (self._compacting or
+                                                      self.compaction.pick(self.version) is not None):
+                self._compaction_cv.wait()
+            if self._compaction_error is not None:
+                raise self._compaction_error
+
+    def amplification(self):
+        """
+        Write amp: bytes written to SSTables per byte the user wrote.
+        Read amp: SSTables probed per read (plus the worst case, sorted_runs).
+        Space amp: disk bytes vs the largest sorted run (an estimate of the live data).
+        """
+        with self._lock:
+            version = self.version
+            stats = dict(self.stats)
+        runs = version.run_bytes()
+        disk_bytes = sum(runs)
+        return {
+            "strategy": self.compaction.name if self.compaction else None,
+            "write_amplification": (stats["flush_bytes"] + stats["compaction_bytes"]) / max(1, stats["user_bytes"]),
+            "read_amplification": stats["tables_probed"] / max(1, stats["reads"]),
+            "sorted_runs": version.sorted_runs(),
+            "space_amplification": disk_bytes / max(runs) if disk_bytes else 0.0,
+            "disk_bytes": disk_bytes,
+            "tables": len(list(version.tables())),
+            "compactions": stats["compactions"],
+        }
+
+    def filter_stats(self):
+        """Bloom filter counters across all SSTables, for tuning bits_per_key vs memory."""
+        stats = {"negatives": 0, "positives": 0, "false_positives": 0, "memory_bytes": 0}
+        for sstable in self.sstables:
+            stats["negatives"] += sstable.bloom_negatives
+            stats["positives"] += sstable.bloom_positives
+            stats["false_positives"] += sstable.bloom_false_positives
+            if sstable.bloom is not None:
+                stats["memory_bytes"] += sstable.bloom.memory_bytes
+        checks = stats["negatives"] + stats["false_positives"]
+        stats["false_positive_rate"] = stats["false_positives"] / checks if checks else 0.0
+        return stats
+
+    def cache_stats(self):
+        """Block cache hits/misses/evictions, for sizing the cache against the working set."""
+        return self.block_cache.counters() if self.block_cache is not None else None
+
+    def close(self):
+        """Flushes the frozen memtables, stops the background threads. The files stay on disk."""
+        with self._lock:
+            self._closed = True
+            self._flush_cv.notify_all()
+            self._compaction_cv.notify_all()
+        self._flusher.join()
+        if self.compaction is not None:
+            self._compactor.join()
+        self.wal.close()
+        for sstable in self.sstables:
+            sstable.close()
+
 # --- Simulation ---
 if __name__ == "__main__":
-    db = LSMTree(memtable_limit=3)
-    
+    DATA_DIR = "lsm_data"
+    shutil.rmtree(DATA_DIR, ignore_errors=True) # Start from a clean slate
+    db = LSMTree(memtable_limit=3, data_dir=DATA_DIR)
+
     print("--- 🚀 Starting LSM Tree Simulation ---")
-    
+
     # 1. Fill MemTable
     db.write("user:1", "Alice")
     db.write("user:2", "Bob")
     db.write("user:3", "Charlie") # Triggers Flush 1
-    
-    time.sleep(1) # Ensure unique timestamp for filename
-    
+
     # 2. Fill MemTable again
     db.write("user:4", "Dave")
     db.write("user:1", "Alice_Updated") # Update existing key
     db.write("user:5", "Eve") # Triggers Flush 2
-    
+    db.wait_for_flushes() # Flushes run in the background
+
     print("\n--- 🔍 Reading Data ---")
     db.read("user:2") # Should be in first SSTable
     db.read("user:1") # Should find "Alice_Updated" in second SSTable (shadows the old one)
-    db.read("user:99") # Not found
-    
+    db.read("user:99") # Not found (no SSTable's key range or Bloom filter matches)
+    print(f"Bloom filter stats: {db.filter_stats()}")
+
+    print("\n--- 🗜️  Compaction ---")
+    db.delete("user:2")
+    db.write("user:6", "Frank")
+    db.write("user:7", "Grace") # Triggers Flush 3
+    db.write("user:1", "Alice_v3")
+    db.write("user:8", "Heidi")
+    db.write("user:9", "Ivan") # Triggers Flush 4 -> 4 tables in L0 -> merged into L1
+    db.wait_for_flushes()
+    db.wait_for_compactions()
+    print(f"Levels: {[[os.path.basename(t.filename) for t in level] for level in db.version.levels if level]}")
+    db.read("user:1") # Old "Alice" and "Alice_Updated" are gone from disk
+    db.read("user:2") # Tombstone dropped, and so is "Bob"
+    print(f"Amplification: {db.amplification()}")
+
+    print("\n--- 📜 Range Scan ---")
+    db.write("user:10", "Judy") # Still in the MemTable
+    for key, value in db.scan("user:", "user;"): # Every "user:" key, merged across MemTable + SSTables
+        print(f"   {key} -> {value}")
+
+    print("\n--- 📦 Write Batch & Multi-Get ---")
+    batch = WriteBatch().put("user:12", "Liam").put("user:13", "Mia").delete("user:10")
+    db.write_batch(batch) # ONE WAL record: after a crash all three are there, or none is
+    print(f"   {db.multi_get(['user:1', 'user:10', 'user:12', 'user:9', 'user:99'])}") # Each SSTable probed once
+
+    print("\n--- 📸 Snapshots ---")
+    snapshot = db.snapshot() # Sees every write so far (by sequence number), none after
+    db.write("user:12", "Liam_v2")
+    db.read("user:12") # Liam_v2
+    db.read("user:12", snapshot=snapshot) # Still Liam: compaction keeps it while the snapshot lives
+    snapshot.release()
+
+    print("\n--- ⌛ TTL ---")
+    db.write("session:1", "token_abc", ttl=0.5) # Stored with its expiry time, in the WAL and the SSTable
+    db.read("session:1") # token_abc
+    time.sleep(0.6)
+    db.read("session:1") # Expired: reads as deleted. Compaction drops it; a table that is ALL expired is deleted unread
+    db.flush_to_disk() # Start the crash below from an empty MemTable
+
+    print("\n--- 💥 Crash & Restart ---")
+    db.write("user:11", "Ken") # Only in the MemTable + WAL
+    db.close() # No flush: the process "dies" here
+    db = LSMTree(memtable_limit=3, data_dir=DATA_DIR) # Reads MANIFEST, replays the WAL tail
+    db.read("user:11") # Recovered from the WAL
+    db.read("user:9") # From an SSTable listed in the MANIFEST
+    db.read("user:8") # Same block as user:9: served from the block cache
+    print(f"Block cache: {db.cache_stats()}")
+
     # Cleanup
     print("\n--- 🧹 Cleanup ---")
-    if os.path.exists("wal.log"): os.remove("wal.log")
-    for sstable in db.sstables:
-        if os.path.exists(sstable):
-            os.remove(sstable)
-            print(f"Deleted {sstable}")
+    db.close()
+    shutil.rmtree(DATA_DIR)
+    print(f"Deleted {DATA_DIR}/")
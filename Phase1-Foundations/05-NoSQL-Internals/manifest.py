@@ -0,0 +1,93 @@
+import json
+import os
+
+MANIFEST_FILE = "MANIFEST"
+
+# After this many edits the log is rewritten as a single snapshot edit
+MAX_EDITS = 1000
+
+
+class Manifest:
+    """
+    The source of truth for which SSTables are live, and in which level.
+
+    It is an append-only log of "version edits" (one JSON line each):
+        {"add": [[level, file, min_key, max_key, size, order, max_expiry], ...],
+         "delete": [[level, file], ...],
+         "next_file_number": 42, "log_number": 41, "last_sequence": 9000}
+    Replaying the edits rebuilds the levels without opening a single SSTable.
+    log_number is the oldest WAL whose data is NOT yet in an SSTable;
+    last_sequence is at least the highest sequence number in any SSTable.
+    max_expiry is when a table's last entry expires (null = never).
+    """
+
+    def __init__(self, data_dir):
+        self.filename = os.path.join(data_dir, MANIFEST_FILE)
+        self.next_file_number = 1
+        self.log_number = 0
+        self.last_sequence = 0
+        self.levels = {}  # level -> {file: [min_key, max_key, size, order, max_expiry]}
+        self.edits = 0
+
+    def load(self):
+        """Replays the edit log. Returns False if there is no MANIFEST yet."""
+        if not os.path.exists(self.filename):
+            return False
+        good_end = 0
+        with open(self.filename, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Torn last line: the crash happened mid-append
+                try:
+                    edit = json.loads(line)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    break
+                self._apply(edit)
+                good_end += len(line)
+            torn = f.seek(0, os.SEEK_END) > good_end
+        if torn:
+            # Cut the torn tail off, or the next append would land after it and be lost on replay
+            with open(self.filename, "r+b") as f:
+                f.truncate(good_end)
+                os.fsync(f.fileno())
+        return True
+
+    def _apply(self, edit):
+        for level, file in edit.get("delete", []):
+            self.levels.get(level, {}).pop(file, None)
+        for level, file, min_key, max_key, size, order, max_expiry in edit.get("add", []):
+            self.levels.setdefault(level, {})[file] = [min_key, max_key, size, order, max_expiry]
+        self.next_file_number = max(self.next_file_number, edit.get("next_file_number", 0))
+        self.log_number = max(self.log_number, edit.get("log_number", 0))
+        self.last_sequence = max(self.last_sequence, edit.get("last_sequence", 0))
+        self.edits += 1
+
+    def log_edit(self, edit):
+        """Appends one edit and fsyncs it. The edit is durable once this returns."""
+        self._apply(edit)
+        if self.edits > MAX_EDITS:
+            self._rewrite()
+            return
+        with open(self.filename, "a", encoding="utf-8") as f:
+            f.write(json.dumps(edit) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _rewrite(self):
+        """Collapses the log into ONE edit that adds every live table (written atomically)."""
+        snapshot = {
+            "add": [[level, file] + meta for level, files in self.levels.items() for file, meta in files.items()],
+            "next_file_number": self.next_file_number,
+            "log_number": self.log_number,
+            "last_sequence": self.last_sequence,
+        }
+        tmp = self.filename + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(json.dumps(snapshot) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.filename)
+        self.edits = 1
+
+    def live_files(self):
+        return {file for files in self.levels.values() for file in files}
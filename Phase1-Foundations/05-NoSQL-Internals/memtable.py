@@ -0,0 +1,112 @@
+import random
+
+from sstable import MISSING
+
+MAX_HEIGHT = 16  # Plenty for millions of keys with P = 0.25
+P = 0.25         # Chance a node is promoted one level up
+
+
+class _Node:
+    __slots__ = ("key", "value", "next")
+
+    def __init__(self, key, value, height):
+        self.key = key
+        self.value = value
+        self.next = [None] * height
+
+
+class SkipList:
+    """
+    A sorted map. Inserts and lookups are O(log n), and the keys are
+    always in order, so a flush needs no sort and a scan can start anywhere.
+
+    New nodes are linked bottom-up, each link a single assignment, so a
+    reader walking the list never sees a half-inserted node.
+    """
+
+    def __init__(self):
+        self.head = _Node(None, None, MAX_HEIGHT)
+        self.height = 1
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def _random_height(self):
+        height = 1
+        while height < MAX_HEIGHT and random.random() < P:
+            height += 1
+        return height
+
+    def _find_greater_or_equal(self, key, prev=None):
+        """First node with node.key >= key. Fills prev[i] with the last node before it on level i."""
+        x = self.head
+        for i in range(self.height - 1, -1, -1):
+            nxt = x.next[i]
+            while nxt is not None and nxt.key < key:
+                x = nxt
+                nxt = x.next[i]
+            if prev is not None:
+                prev[i] = x
+        return x.next[0]
+
+    def __setitem__(self, key, value):
+        prev = [self.head] * MAX_HEIGHT
+        node = self._find_greater_or_equal(key, prev)
+        if node is not None and node.key == key:
+            node.value = value  # Overwrite in place
+            return
+
+        height = self._random_height()
+        if height > self.height:
+            self.height = height  # prev[] above the old height is already self.head
+        node = _Node(key, value, height)
+        for i in range(height):
+            node.next[i] = prev[i].next[i]
+            prev[i].next[i] = node  # Publish level by level, bottom first
+        self.size += 1
+
+    def get(self, key, default=MISSING):
+        node = self._find_greater_or_equal(key)
+        if node is not None and node.key == key:
+            return node.value
+        return default
+
+    def __contains__(self, key):
+        return self.get(key) is not MISSING
+
+    def items(self, start=None):
+        """Yields (key, value) in key order, from the first key >= start."""
+        node = self.head.next[0] if start is None else self._find_greater_or_equal(start)
+        while node is not None:
+            yield node.key, node.value
+            node = node.next[0]
+
+
+class MemTable:
+    """
+    Every version of every key, as a SkipList ordered by (key ASC, seq DESC):
+    writes never overwrite, so a reader at an older sequence number still
+    finds the value that was current for it.
+    """
+
+    def __init__(self):
+        self.entries = SkipList()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def put(self, key, seq, value):
+        self.entries[(key, -seq)] = value
+
+    def get(self, key, seq):
+        """Newest value of key with a sequence number <= seq (None = deleted), or MISSING."""
+        node = self.entries._find_greater_or_equal((key, -seq))
+        if node is not None and node.key[0] == key:
+            return node.value
+        return MISSING
+
+    def items(self, start=None):
+        """Yields (key, seq, value) in (key ASC, seq DESC) order, from the first key >= start."""
+        for (key, neg_seq), value in self.entries.items(None if start is None else (start, -float("inf"))):
+            yield key, -neg_seq, value
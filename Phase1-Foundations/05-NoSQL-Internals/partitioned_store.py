@@ -0,0 +1,255 @@
+import bisect
+import heapq
+import itertools
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+import zlib
+
+from lsm_demo import LSMTree, WriteBatch, with_ttl
+
+PARTITIONING_FILE = "PARTITIONING"
+
+
+class HashPartitioner:
+    """Spreads keys evenly over n shards. crc32, not hash(): it must agree across processes and restarts."""
+
+    name = "hash"
+
+    def __init__(self, num_shards):
+        self.num_shards = num_shards
+
+    def shard_for(self, key):
+        return zlib.crc32(key.encode("utf-8")) % self.num_shards
+
+    def describe(self):
+        return {"scheme": self.name, "shards": self.num_shards}
+
+
+class RangePartitioner:
+    """
+    Shard i holds keys in [split_keys[i-1], split_keys[i]). Keeps neighbouring
+    keys together, so a range scan only visits the shards it overlaps, but a
+    hot key range lands on ONE shard (the "hot partition" problem).
+    """
+
+    name = "range"
+
+    def __init__(self, split_keys):
+        self.split_keys = sorted(split_keys)
+        self.num_shards = len(self.split_keys) + 1
+
+    def shard_for(self, key):
+        return bisect.bisect_right(self.split_keys, key)
+
+    def shards_for_range(self, start=None, end=None):
+        first = 0 if start is None else self.shard_for(start)
+        last = self.num_shards - 1 if end is None else self.shard_for(end)
+        return range(first, last + 1)
+
+    def describe(self):
+        return {"scheme": self.name, "shards": self.num_shards, "split_keys": self.split_keys}
+
+
+def _serve(conn, data_dir, options):
+    """Shard worker: owns one LSMTree (its own WAL, flusher and compactor) and answers requests."""
+    db = LSMTree(data_dir=data_dir, verbose=False, **options)
+    while True:
+        op, args = conn.recv()
+        try:
+            if op == "write_batch":
+                batch = WriteBatch()
+                batch.ops = args
+                result = db.write_batch(batch)
+            elif op == "multi_get":
+                result = db.multi_get(args)
+            elif op == "scan":
+                start, end, limit = args
+                result = list(itertools.islice(db.scan(start, end), limit))
+            elif op == "flush":
+                db.flush_to_disk()
+                db.wait_for_compactions()
+                result = None
+            elif op == "stats":
+                result = {"amplification": db.amplification(), "wal": dict(db.wal.stats),
+                          "cache": db.cache_stats()}
+            elif op == "close":
+                db.close()
+                result = None
+            else:
+                raise ValueError(f"unknown op {op!r}")
+        except Exception as e:
+            conn.send((False, e))
+            continue
+        conn.send((True, result))
+        if op == "close":
+            return
+
+
+class _Shard:
+    def __init__(self, ctx, data_dir, options):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_serve, args=(child, data_dir, options), daemon=True)
+        self.process.start()
+        child.close()
+        self.lock = threading.Lock()  # One request in flight per shard connection
+
+
+class PartitionedLSM:
+    """
+    N LSMTree shards, each in its own worker process, behind one client.
+
+    Every call is routed by key: the client groups the keys of a batch by
+    shard, sends each shard ONE request, and only then waits for the
+    replies, so the shards work in parallel on separate cores (no GIL
+    shared between them).
+
+    A WriteBatch is atomic per shard, not across shards.
+    """
+
+    def __init__(self, num_shards=4, data_dir="lsm_shards", partitioning="hash", **lsm_options):
+        if partitioning == "hash":
+            self.partitioner = HashPartitioner(num_shards)
+        elif partitioning == "range":
+            raise ValueError("range partitioning needs its split keys: pass partitioning=[...]")
+        else:
+            self.partitioner = RangePartitioner(partitioning)
+        self.num_shards = self.partitioner.num_shards
+        self.data_dir = data_dir
+        self._check_layout()
+
+        # "spawn": a fresh interpreter per shard, nothing inherited from this process's threads
+        ctx = multiprocessing.get_context("spawn")
+        self.shards = [_Shard(ctx, os.path.join(data_dir, f"shard_{i:03d}"), lsm_options)
+                       for i in range(self.num_shards)]
+
+    def _check_layout(self):
+        """Keys were placed by the partitioning a store was created with; reopening with another would lose them."""
+        os.makedirs(self.data_dir, exist_ok=True)
+        path = os.path.join(self.data_dir, PARTITIONING_FILE)
+        layout = self.partitioner.describe()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                existing = json.load(f)
+            if existing != layout:
+                raise ValueError(f"{self.data_dir} was created with {existing}, not {layout}")
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(layout, f)
+
+    def _call(self, requests):
+        """
+        Sends each shard in `requests` ({shard: (op, args)}) its request, THEN
+        collects the replies. Locks are taken in shard order, so concurrent
+        callers can never deadlock each other.
+        """
+        order = sorted(requests)
+        for i in order:
+            self.shards[i].lock.acquire()
+        try:
+            for i in order:
+                self.shards[i].conn.send(requests[i])
+            replies = {i: self.shards[i].conn.recv() for i in order}
+        finally:
+            for i in order:
+                self.shards[i].lock.release()
+        results = {}
+        for i, (ok, result) in replies.items():
+            if not ok:
+                raise result
+            results[i] = result
+        return results
+
+    def _group(self, keys):
+        groups = {}
+        for key in keys:
+            groups.setdefault(self.partitioner.shard_for(key), []).append(key)
+        return groups
+
+    def write(self, key, value, ttl=None):
+        self._call({self.partitioner.shard_for(key): ("write_batch", [(key, with_ttl(value, ttl))])})
+
+    def delete(self, key):
+        self._call({self.partitioner.shard_for(key): ("write_batch", [(key, None)])})
+
+    def write_batch(self, batch):
+        """Splits the batch by shard: one WAL record per shard, all shards writing at once."""
+        groups = {}
+        for key, value in batch.ops:
+            groups.setdefault(self.partitioner.shard_for(key), []).append((key, value))
+        self._call({i: ("write_batch", ops) for i, ops in groups.items()})
+
+    def read(self, key):
+        return self.multi_get([key])[key]
+
+    def multi_get(self, keys):
+        results = {}
+        for found in self._call({i: ("multi_get", group) for i, group in self._group(keys).items()}).values():
+            results.update(found)
+        return {key: results.get(key) for key in keys}
+
+    def scan(self, start=None, end=None, limit=1000):
+        """
+        The first `limit` (key, value) pairs with start <= key < end, in key order.
+        Range partitioning only asks the shards the range overlaps; hash
+        partitioning has to ask every shard and merge.
+        """
+        if isinstance(self.partitioner, RangePartitioner):
+            shards = self.partitioner.shards_for_range(start, end)
+        else:
+            shards = range(self.num_shards)
+        replies = self._call({i: ("scan", (start, end, limit)) for i in shards})
+        return list(itertools.islice(heapq.merge(*(replies[i] for i in sorted(replies))), limit))
+
+    def flush(self):
+        """Flushes every shard and waits for its compactions."""
+        self._call({i: ("flush", None) for i in range(self.num_shards)})
+
+    def stats(self):
+        """Per-shard amplification, WAL and block cache counters."""
+        replies = self._call({i: ("stats", None) for i in range(self.num_shards)})
+        return [replies[i] for i in range(self.num_shards)]
+
+    def close(self):
+        self._call({i: ("close", None) for i in range(self.num_shards)})
+        for shard in self.shards:
+            shard.process.join()
+            shard.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# --- Simulation ---
+if __name__ == "__main__":
+    DATA_DIR = "lsm_shards"
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
+
+    print("--- 🧩 Hash-Partitioned Store: 4 shard processes ---")
+    with PartitionedLSM(num_shards=4, data_dir=DATA_DIR, memtable_limit=100) as store:
+        batch = WriteBatch()
+        for i in range(1000):
+            batch.put(f"user:{i:04d}", f"User {i}")
+        store.write_batch(batch) # One request per shard, all four writing at once
+        keys = ["user:0001", "user:0500", "user:0999", "user:5000"]
+        print(f"Shards: {[store.partitioner.shard_for(k) for k in keys]}")
+        print(f"multi_get: {store.multi_get(keys)}")
+        print(f"scan: {store.scan('user:0100', limit=3)}") # Merged across all 4 shards
+        store.flush()
+        print(f"Tables per shard: {[s['amplification']['tables'] for s in store.stats()]}")
+    shutil.rmtree(DATA_DIR)
+
+    print("\n--- 📏 Range-Partitioned Store: 3 shards ---")
+    with PartitionedLSM(data_dir=DATA_DIR, partitioning=["user:0400", "user:0800"], memtable_limit=100) as store:
+        store.write_batch(batch)
+        print(f"Shards: {[store.partitioner.shard_for(k) for k in keys]}")
+        print(f"scan: {store.scan('user:0398', 'user:0402')}") # Only shards 0 and 1 are asked
+
+    print("\n--- 🧹 Cleanup ---")
+    shutil.rmtree(DATA_DIR)
+    print(f"Deleted {DATA_DIR}/")
@@ -0,0 +1,476 @@
+import bisect
+import bz2
+import lzma
+import math
+import mmap
+import os
+import struct
+import threading
+import zlib
+from collections import namedtuple
+
+from block_cache import DATA, FILTER, INDEX
+from bloom_filter import BloomFilter
+
+# Target size of one data block. A point read only ever touches one block.
+BLOCK_SIZE = 4 * 1024
+
+# Default Bloom filter size. 10 bits/key gives roughly a 1% false-positive rate.
+BITS_PER_KEY = 10
+
+# Returned by SSTable.get when the key is not in the table.
+MISSING = object()
+
+# Reading "as of" this sequence number sees every write
+MAX_SEQUENCE = (1 << 64) - 1
+
+# Fixed-size binary records (little-endian)
+MAGIC = b"LSMSST04"
+FOOTER = struct.Struct("<QIQId8s")  # index offset/length, filter offset/length, max expiry, magic
+ENTRY = struct.Struct("<IIQ")       # key length, value length (TOMBSTONE = deleted), sequence number
+BLOCK_HANDLE = struct.Struct("<QI")  # block offset, block length
+U32 = struct.Struct("<I")
+TOMBSTONE = 0xFFFFFFFF
+EXPIRES = 0x80000000                # Value length flag: an EXPIRY sits between the key and the value
+EXPIRY = struct.Struct("<d")        # Unix time the value expires at
+
+# Per-block compression (stdlib codecs). Each block ends with ONE byte naming its codec,
+# so a table can mix compressed blocks with ones that did not shrink enough to bother.
+COMPRESSION_CODECS = {"none": 0, "zlib": 1, "bz2": 2, "lzma": 3}
+COMPRESS = {1: zlib.compress, 2: bz2.compress, 3: lzma.compress}
+DECOMPRESS = {1: zlib.decompress, 2: bz2.decompress, 3: lzma.decompress}
+MIN_SAVINGS = 1 / 8  # Keep a block raw unless compression saves at least 12.5%
+
+
+class Expiring(namedtuple("Expiring", ["value", "expire_at"])):
+    """A value written with a TTL. From expire_at (Unix time) on, reads treat the key as deleted."""
+    __slots__ = ()
+
+
+def unexpired(value, now):
+    """What a reader at time `now` sees: the plain value, or None if it is deleted or expired."""
+    if type(value) is Expiring:
+        return value.value if value.expire_at > now else None
+    return value
+
+
+def unwrap(value):
+    """The stored string, expired or not (None for a tombstone)."""
+    return value.value if type(value) is Expiring else value
+
+
+def _finish_block(buf, offsets, codec):
+    """
+    Appends the entry offsets + count, so a lookup can binary-search inside the block,
+    then compresses the whole block and appends the codec byte.
+    """
+    buf += struct.pack(f"<{len(offsets)}I", *offsets)
+    buf += U32.pack(len(offsets))
+    if codec:
+        compressed = COMPRESS[codec](bytes(buf))
+        if len(compressed) <= len(buf) * (1 - MIN_SAVINGS):
+            return compressed + bytes([codec])
+    return bytes(buf) + bytes([0])
+
+
+def write_sstable(filename, items, block_size=BLOCK_SIZE, bits_per_key=BITS_PER_KEY, cache=None,
+                  compression="none"):
+    """
+    Writes (key, seq, value) entries, sorted by key ASC then seq DESC, as a
+    binary SSTable and returns it opened. All versions of one key always land
+    in the same block, so a lookup still reads exactly one block. items must
+    not be empty (ValueError): a table always has a first and a last key.
+
+    Layout:
+        [data block 0]...[data block N][filter block][index block][footer]
+    Data block:  [key len][value len][seq][key]([expiry])[value] ... [entry offsets][count],
+                 compressed as a whole by `compression`, then [codec byte]
+    Filter:      Bloom filter over every key (empty if bits_per_key=0)
+    Index:       [count] then [key len][first key][offset][length] per block, then the last key
+    Footer:      where the index and filter live, the latest expiry of any entry
+                 (inf if any entry never expires), plus a magic number
+    """
+    if compression not in COMPRESSION_CODECS:
+        raise ValueError(f"compression must be one of {tuple(COMPRESSION_CODECS)}")
+    codec = COMPRESSION_CODECS[compression]
+    keys = []
+    index = []
+    offset = 0
+    max_expiry = 0.0
+    buf, entry_offsets, first_key, last_key = bytearray(), [], None, None
+
+    with open(filename, "wb") as f:
+        def close_block():
+            nonlocal offset, buf, entry_offsets
+            data = _finish_block(buf, entry_offsets, codec)
+            f.write(data)
+            index.append((first_key, offset, len(data)))
+            offset += len(data)
+            buf, entry_offsets = bytearray(), []
+
+        for key, seq, value in items:
+            k = key.encode("utf-8")
+            if k != last_key:
+                if len(buf) >= block_size:
+                    close_block()  # Only between keys, never between two versions of one key
+                keys.append(key)
+                last_key = k
+            if not entry_offsets:
+                first_key = k
+            entry_offsets.append(len(buf))
+            if value is None:
+                buf += ENTRY.pack(len(k), TOMBSTONE, seq) + k
+                max_expiry = math.inf  # Still shadows older data
+            elif type(value) is Expiring:
+                v = value.value.encode("utf-8")
+                buf += ENTRY.pack(len(k), len(v) | EXPIRES, seq) + k + EXPIRY.pack(value.expire_at) + v
+                max_expiry = max(max_expiry, value.expire_at)
+            else:
+                max_expiry = math.inf
+                v = value.encode("utf-8")
+                buf += ENTRY.pack(len(k), len(v), seq) + k + v
+        if last_key is None:
+            f.close()
+            os.remove(filename)
+            raise ValueError(f"cannot write an empty SSTable: {filename}")
+        if entry_offsets:
+            close_block()
+
+        bloom = BloomFilter.for_keys(keys, bits_per_key).to_bytes() if bits_per_key else b""
+        filter_offset = offset
+        f.write(bloom)
+
+        index_block = bytearray(U32.pack(len(index)))
+        for k, block_offset, length in index:
+            index_block += U32.pack(len(k)) + k + BLOCK_HANDLE.pack(block_offset, length)
+        index_block += U32.pack(len(last_key)) + last_key
+        f.write(index_block)
+
+        f.write(FOOTER.pack(filter_offset + len(bloom), len(index_block), filter_offset, len(bloom),
+                            max_expiry, MAGIC))
+        f.flush()
+        os.fsync(f.fileno())  # Durable BEFORE the MANIFEST points at it
+
+    return SSTable(filename, cache=cache)
+
+
+class SSTable:
+    """
+    An immutable sorted file, memory-mapped. Without a cache, the sparse
+    index and the Bloom filter are parsed once and kept in RAM, and data
+    blocks are read straight out of the mapping (struct.unpack_from +
+    memoryview), so a lookup copies only the keys it compares and the value
+    it returns.
+
+    With a shared BlockCache, the parsed index, the filter and copies of hot
+    data blocks all live in the cache instead, so the store's memory is
+    bounded by ONE number and a hot read never touches the file.
+
+    When the caller already knows the key range, size and max expiry (from
+    the MANIFEST), nothing is read until the first lookup, so opening a
+    store is cheap, and a table that has fully expired can be deleted
+    without ever being opened.
+    """
+
+    def __init__(self, filename, min_key=None, max_key=None, size=None, cache=None, max_expiry=math.inf):
+        self.filename = filename
+        self.cache = cache
+        self._mm = None
+        self._view = None
+        self._lock = threading.Lock()  # Only guards the lazy open; mmap reads need no lock
+        self._pinned_index = None
+        self._pinned_bloom = None
+
+        # How many Versions (sets of live tables) still reference this file
+        self.refs = 0
+        # Age rank within L0 (higher = newer); set by the LSMTree
+        self.order = None
+
+        # Filter counters: "negatives" are reads skipped without touching disk,
+        # "false_positives" are reads the filter let through for nothing.
+        self.bloom_negatives = 0
+        self.bloom_positives = 0
+        self.bloom_false_positives = 0
+
+        if min_key is None:
+            self._open()
+        else:
+            self.min_key, self.max_key, self.size, self.max_expiry = min_key, max_key, size, max_expiry
+
+    def _open(self):
+        with self._lock:
+            if self._mm is not None:
+                return
+            with open(self.filename, "rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)  # Outlives the file handle
+
+            # 1. Footer tells us where the index and filter live
+            index_offset, index_len, filter_offset, filter_len, max_expiry, magic = FOOTER.unpack_from(
+                mm, len(mm) - FOOTER.size)
+            if magic != MAGIC:
+                mm.close()
+                raise ValueError(f"{self.filename} is not an SSTable")
+            self._index_handle = (index_offset, index_len)
+            self._filter_handle = (filter_offset, filter_len)
+            self.size = len(mm)
+            self.max_expiry = max_expiry
+
+            # 2. Parse the index once for the key range; pin it (and the filter) only if there is no cache
+            first_keys, _, _, self.max_key = index = self._load_index(mm)
+            self.min_key = first_keys[0]
+            if self.cache is None:
+                self._pinned_index = index
+                self._pinned_bloom = self._load_filter(mm)
+            else:
+                self.cache.insert((self.filename, INDEX, index_offset), index, index_len)
+
+            self._view = memoryview(mm)
+            # Last: readers check "_mm is None" without the lock, so everything above must already be set
+            self._mm = mm
+
+    def _load_index(self, mm):
+        """(first_keys, offsets, lengths, last_key): one entry per block, not per key."""
+        index_offset = self._index_handle[0]
+        (count,) = U32.unpack_from(mm, index_offset)
+        pos = index_offset + U32.size
+        first_keys, offsets, lengths = [], [], []
+        for _ in range(count):
+            (klen,) = U32.unpack_from(mm, pos)
+            first_keys.append(mm[pos + U32.size:pos + U32.size + klen].decode("utf-8"))
+            pos += U32.size + klen
+            block_offset, length = BLOCK_HANDLE.unpack_from(mm, pos)
+            offsets.append(block_offset)
+            lengths.append(length)
+            pos += BLOCK_HANDLE.size
+        (klen,) = U32.unpack_from(mm, pos)
+        last_key = mm[pos + U32.size:pos + U32.size + klen].decode("utf-8")
+        return first_keys, offsets, lengths, last_key
+
+    def _load_filter(self, mm):
+        """The Bloom filter, or None if the table was written without one."""
+        filter_offset, filter_len = self._filter_handle
+        if not filter_len:
+            return None
+        return BloomFilter.from_bytes(mm[filter_offset:filter_offset + filter_len])
+
+    def _index(self):
+        if self.cache is None:
+            return self._pinned_index
+        key = (self.filename, INDEX, self._index_handle[0])
+        index = self.cache.get(key)
+        if index is None:
+            index = self._load_index(self._mm)
+            self.cache.insert(key, index, self._index_handle[1])
+        return index
+
+    def _filter(self):
+        if self.cache is None or not self._filter_handle[1]:
+            return self._pinned_bloom
+        key = (self.filename, FILTER, self._filter_handle[0])
+        bloom = self.cache.get(key)
+        if bloom is None:
+            bloom = self._load_filter(self._mm)
+            self.cache.insert(key, bloom, self._filter_handle[1])
+        return bloom
+
+    def _block(self, index, i, fill_cache=True):
+        """
+        (buffer, memoryview, start, length) of block i, uncompressed. An
+        uncompressed block read without the cache is the mmap itself; anything
+        else is a copy, which the cache keeps (decompressed) so a hit never
+        touches the file or pays for decompression again.
+        """
+        offset, length = index[1][i], index[2][i] - 1  # Minus the codec byte
+        codec = self._mm[offset + length]
+        use_cache = self.cache is not None and fill_cache
+        if not codec and not use_cache:
+            return self._mm, self._view, offset, length
+        key = (self.filename, DATA, offset)
+        block = self.cache.get(key) if use_cache else None
+        if block is None:
+            if codec:
+                block = DECOMPRESS[codec](self._view[offset:offset + length])
+            else:
+                block = self._mm[offset:offset + length]
+            if use_cache:
+                self.cache.insert(key, block, len(block))
+        return block, memoryview(block), 0, len(block)
+
+    @property
+    def first_keys(self):
+        if self._mm is None:
+            self._open()
+        return self._index()[0]
+
+    @property
+    def bloom(self):
+        """The Bloom filter, if this table is open and has one."""
+        return None if self._mm is None else self._filter()
+
+    @staticmethod
+    def _block_layout(buf, start, length):
+        """(where the entry offsets start, entry count) of one block. The entries end where the offsets start."""
+        end = start + length
+        (count,) = U32.unpack_from(buf, end - U32.size)
+        offsets_pos = end - U32.size - count * U32.size
+        return offsets_pos, count
+
+    @staticmethod
+    def _value(buf, view, pos, vlen):
+        """(value, end) of the value stored at pos: None (tombstone), a str, or an Expiring."""
+        if vlen == TOMBSTONE:
+            return None, pos
+        if vlen & EXPIRES:
+            (expire_at,) = EXPIRY.unpack_from(buf, pos)
+            pos += EXPIRY.size
+            end = pos + vlen - EXPIRES
+            return Expiring(str(view[pos:end], "utf-8"), expire_at), end
+        return str(view[pos:pos + vlen], "utf-8"), pos + vlen
+
+    def _entries(self, index, i, start_key=None):
+        """Decodes block i into (key, seq, value) entries, from the first key >= start_key."""
+        buf, view, pos, length = self._block(index, i, fill_cache=False)
+        end, _ = self._block_layout(buf, pos, length)
+        target = start_key.encode("utf-8") if start_key is not None else None
+        while pos < end:
+            klen, vlen, seq = ENTRY.unpack_from(buf, pos)
+            pos += ENTRY.size
+            key_end = pos + klen
+            if target is not None and buf[pos:key_end] < target:
+                if vlen == TOMBSTONE:
+                    pos = key_end
+                else:
+                    pos = key_end + (vlen - EXPIRES + EXPIRY.size if vlen & EXPIRES else vlen)
+                continue
+            target = None  # Sorted: every later key is >= start_key too
+            key = str(view[pos:key_end], "utf-8")
+            value, pos = self._value(buf, view, key_end, vlen)
+            yield key, seq, value
+
+    def might_contain(self, key):
+        """False only if the key is definitely not in this table."""
+        if not self.min_key <= key <= self.max_key:
+            return False
+        if self._mm is None:
+            self._open()
+        bloom = self._filter()
+        return bloom is None or bloom.might_contain(key)
+
+    def get(self, key, seq=MAX_SEQUENCE):
+        """
+        Ask the Bloom filter, bisect the index, binary-search ONE block.
+        Returns the newest value written at or before `seq` (None = deleted), or MISSING.
+        A value written with a TTL comes back as an Expiring, whether or not it has expired.
+        """
+        if self._mm is None:
+            self._open()
+        bloom = self._filter()
+        if bloom is not None:
+            if not bloom.might_contain(key):
+                self.bloom_negatives += 1
+                return MISSING  # Definitely not here: skip the block
+            self.bloom_positives += 1
+
+        value = self._search(key, seq)
+        if value is MISSING and bloom is not None:
+            self.bloom_false_positives += 1
+        return value
+
+    def multi_get(self, keys, seq=MAX_SEQUENCE):
+        """
+        Looks up many SORTED keys in one pass: each data block is fetched (and
+        decompressed) once, however many of the keys fall into it.
+        Returns {key: value} for the keys found as of `seq` (value None = deleted).
+        """
+        if self._mm is None:
+            self._open()
+        bloom = self._filter()
+        index = self._index()
+        found = {}
+        block_i, block = None, None
+        for key in keys:
+            if bloom is not None:
+                if not bloom.might_contain(key):
+                    self.bloom_negatives += 1
+                    continue
+                self.bloom_positives += 1
+            i = bisect.bisect_right(index[0], key) - 1
+            if i < 0:
+                value = MISSING
+            else:
+                if i != block_i:
+                    block_i, block = i, self._block(index, i)
+                value = self._search_block(block, key, seq)
+            if value is MISSING:
+                if bloom is not None:
+                    self.bloom_false_positives += 1
+            else:
+                found[key] = value
+        return found
+
+    def _search(self, key, seq):
+        index = self._index()
+        i = bisect.bisect_right(index[0], key) - 1
+        if i < 0:
+            return MISSING  # Smaller than the first key in the file
+        return self._search_block(self._block(index, i), key, seq)
+
+    def _search_block(self, block, key, seq):
+        """
+        Binary-searches one block (as returned by _block) through its entry
+        offsets for the first entry >= (key, seq) in (key ASC, seq DESC) order:
+        the newest version of key that `seq` can see.
+        """
+        buf, view, start, length = block
+        offsets_pos, count = self._block_layout(buf, start, length)
+        target = key.encode("utf-8")  # UTF-8 byte order == str order
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            (rel,) = U32.unpack_from(buf, offsets_pos + mid * U32.size)
+            pos = start + rel
+            klen, _, entry_seq = ENTRY.unpack_from(buf, pos)
+            k = buf[pos + ENTRY.size:pos + ENTRY.size + klen]
+            if k < target or (k == target and entry_seq > seq):
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == count:
+            return MISSING
+        (rel,) = U32.unpack_from(buf, offsets_pos + lo * U32.size)
+        pos = start + rel
+        klen, vlen, _ = ENTRY.unpack_from(buf, pos)
+        if buf[pos + ENTRY.size:pos + ENTRY.size + klen] != target:
+            return MISSING  # Not here, or only versions newer than seq
+        return self._value(buf, view, pos + ENTRY.size + klen, vlen)[0]
+
+    def __iter__(self):
+        return self.scan()
+
+    def scan(self, start=None):
+        """
+        Yields every (key, seq, value) entry in order from the first key >= start, one block at a time.
+        Scans bypass the block cache: one long scan (or a compaction) would otherwise
+        flush every hot block out of it.
+        """
+        if self._mm is None:
+            self._open()
+        index = self._index()
+        first = 0
+        if start is not None:
+            first = max(0, bisect.bisect_right(index[0], start) - 1)
+        for i in range(first, len(index[0])):
+            yield from self._entries(index, i, start if i == first else None)
+
+    def close(self):
+        with self._lock:
+            if self._mm is not None:
+                self._view.release()
+                self._mm.close()
+                self._mm = self._view = None
+
+    def delete(self):
+        """Closes the table and removes its file from disk."""
+        self.close()
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
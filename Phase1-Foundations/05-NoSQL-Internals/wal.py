@@ -0,0 +1,207 @@
+import os
+import struct
+import threading
+import zlib
+from contextlib import contextmanager
+
+from sstable import EXPIRY, Expiring
+
+# Record framing: [crc32 of payload][payload length][payload]
+RECORD_HEADER = struct.Struct("<II")
+# A payload starts with the sequence number of its first op; the rest follow consecutively
+SEQUENCE = struct.Struct("<Q")
+# One operation inside a payload: [op][key length][value length][key]([expiry])[value]
+OP_HEADER = struct.Struct("<BII")
+OP_PUT = 1
+OP_DELETE = 2
+OP_PUT_EXPIRING = 3  # A put with a TTL: the absolute expiry time is logged, so replay keeps it
+
+# Durability modes
+SYNC_NONE = "none"          # Hand the bytes to the OS; a power cut may lose them
+SYNC_BATCH = "batch"        # fsync once per group commit
+SYNC_INTERVAL = "interval"  # fsync at most every sync_interval seconds
+SYNC_MODES = (SYNC_NONE, SYNC_BATCH, SYNC_INTERVAL)
+
+
+def encode_ops(ops):
+    """(key, value) pairs -> one WAL payload. value=None is a delete (tombstone)."""
+    parts = []
+    for key, value in ops:
+        k = key.encode("utf-8")
+        if value is None:
+            parts.append(OP_HEADER.pack(OP_DELETE, len(k), 0) + k)
+        elif type(value) is Expiring:
+            v = value.value.encode("utf-8")
+            parts.append(OP_HEADER.pack(OP_PUT_EXPIRING, len(k), len(v)) + k + EXPIRY.pack(value.expire_at) + v)
+        else:
+            v = value.encode("utf-8")
+            parts.append(OP_HEADER.pack(OP_PUT, len(k), len(v)) + k + v)
+    return b"".join(parts)
+
+
+def decode_ops(payload):
+    ops, pos = [], 0
+    while pos < len(payload):
+        op, klen, vlen = OP_HEADER.unpack_from(payload, pos)
+        pos += OP_HEADER.size
+        key = payload[pos:pos + klen].decode("utf-8")
+        pos += klen
+        if op == OP_PUT_EXPIRING:
+            (expire_at,) = EXPIRY.unpack_from(payload, pos)
+            pos += EXPIRY.size
+            value = Expiring(payload[pos:pos + vlen].decode("utf-8"), expire_at)
+        else:
+            value = payload[pos:pos + vlen].decode("utf-8") if op == OP_PUT else None
+        pos += vlen
+        ops.append((key, value))
+    return ops
+
+
+def encode_record(seq, payload):
+    payload = SEQUENCE.pack(seq) + payload
+    return RECORD_HEADER.pack(zlib.crc32(payload), len(payload)) + payload
+
+
+def read_wal(filename):
+    """
+    Yields (first sequence number, [(key, value) ops]) for every intact record, in log order.
+    Stops at the first torn or corrupt record: that is where the crash happened.
+    """
+    with open(filename, "rb") as f:
+        data = f.read()
+    pos = 0
+    while pos + RECORD_HEADER.size <= len(data):
+        crc, length = RECORD_HEADER.unpack_from(data, pos)
+        payload = data[pos + RECORD_HEADER.size:pos + RECORD_HEADER.size + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            return
+        (seq,) = SEQUENCE.unpack_from(payload)
+        yield seq, decode_ops(payload[SEQUENCE.size:])
+        pos += RECORD_HEADER.size + length
+
+
+class WriteAheadLog:
+    """
+    A binary, checksummed, always-open log with GROUP COMMIT.
+
+    Concurrent writers queue their records. The first one in becomes the
+    "leader": it writes everything queued so far with ONE write() (and at
+    most one fsync), applies the records in log order, then wakes the
+    others. Under load, many writes share the cost of one syscall.
+
+    The leader also hands out sequence numbers, one per op, in log order.
+    """
+
+    def __init__(self, filename, sync_mode=SYNC_BATCH, sync_interval=0.1, last_sequence=0):
+        if sync_mode not in SYNC_MODES:
+            raise ValueError(f"sync_mode must be one of {SYNC_MODES}")
+        self.filename = filename
+        self.sync_mode = sync_mode
+        self.sync_interval = sync_interval
+        self._file = open(filename, "ab", buffering=0)
+        self.last_sequence = last_sequence  # Highest sequence number handed out
+
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._pending = []      # (payload, ops, apply) waiting for the next group commit
+        self._queued = 0        # Tickets handed out
+        self._committed = 0     # Tickets written AND applied
+        self._writing = False   # A leader (or exclusive()) owns the file
+        self._error = None
+        self._unsynced = False
+        self._file_lock = threading.Lock()  # The interval syncer vs rotate()
+
+        self.stats = {"records": 0, "batches": 0, "syncs": 0, "bytes": 0}
+
+        self._closed = threading.Event()
+        if sync_mode == SYNC_INTERVAL:
+            self._syncer = threading.Thread(target=self._sync_loop, daemon=True)
+            self._syncer.start()
+
+    def append(self, ops, apply):
+        """Durably logs ops, then calls apply(ops, first_seq). Returns once both are done."""
+        payload = encode_ops(ops)
+        with self._lock:
+            self._pending.append((payload, ops, apply))
+            self._queued += 1
+            ticket = self._queued
+            while self._committed < ticket and self._writing:
+                self._cond.wait()  # Someone else is writing; they may take our record
+            if self._error is not None:
+                raise self._error
+            if self._committed >= ticket:
+                return  # A leader already wrote and applied it for us
+
+            # We are the leader for everything queued so far
+            self._writing = True
+            batch, self._pending = self._pending, []
+            last_ticket = self._queued
+
+        data = b""
+        try:
+            records, seqs = [], []
+            for payload, batch_ops, _ in batch:
+                seqs.append(self.last_sequence + 1)
+                records.append(encode_record(seqs[-1], payload))
+                self.last_sequence += len(batch_ops)
+            data = b"".join(records)
+            self._file.write(data)
+            if self.sync_mode == SYNC_BATCH:
+                os.fsync(self._file.fileno())
+                self.stats["syncs"] += 1
+            else:
+                self._unsynced = True
+            for (_, batch_ops, batch_apply), seq in zip(batch, seqs):
+                batch_apply(batch_ops, seq)  # Memtable order == log order
+        except BaseException as e:
+            self._error = e  # A broken log is fatal: fail every later write too
+            raise
+        finally:
+            with self._lock:
+                self.stats["records"] += len(batch)
+                self.stats["batches"] += 1
+                self.stats["bytes"] += len(data)
+                self._committed = last_ticket
+                self._writing = False
+                self._cond.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        """Holds off group commits, e.g. while the memtable is swapped and the log reset."""
+        with self._lock:
+            while self._writing:
+                self._cond.wait()
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._writing = False
+                self._cond.notify_all()
+
+    def rotate(self, filename):
+        """Switches to a fresh log file (the old one stays until its memtable is flushed). Call inside exclusive()."""
+        with self._file_lock:
+            if self._unsynced:
+                os.fsync(self._file.fileno())
+            self._file.close()
+            self.filename = filename
+            self._file = open(filename, "ab", buffering=0)
+            self._unsynced = False
+
+    def _sync_loop(self):
+        while not self._closed.wait(self.sync_interval):
+            with self._file_lock:
+                if self._unsynced:
+                    self._unsynced = False
+                    os.fsync(self._file.fileno())
+                    self.stats["syncs"] += 1
+
+    def close(self):
+        self._closed.set()
+        if self.sync_mode == SYNC_INTERVAL:
+            self._syncer.join()
+        with self.exclusive():
+            if self._unsynced:
+                os.fsync(self._file.fileno())
+            self._file.close()